@@ -5,17 +5,13 @@ import os
 from collections import deque
 import time
 
-from searchNearestOnly import search_only_nearest
-from searchBFS import bfs_search
-from searchDFS import dfs_search
-from searchAStar import astar_search
-from searchSimulatedAnnealing import simulated_annealing_search
-from searchNondeterministic import nondeterministic_search
-from searchBacktrackingWithFowardChecking import backtracking_with_forward_checking
-from searchQLearning import qlearning_search
 from animations import AnimationManager
 from assets import load_assets, load_sounds
-from map_handler import load_map_from_file, place_random_objects
+from map_handler import load_map_from_file, place_random_objects, ObjectIndex, compile_map
+from planner_cache import PlannerCache
+from planner_registry import PlannerSet, planner_names, BATTLE
+from combo_rules import BAG_SIZE, find_combo
+from seeding import parse_seed
 
 # Khởi tạo pygame
 pygame.init()
@@ -30,18 +26,14 @@ PANEL_WIDTH = 200
 SCREEN_WIDTH = WIDTH + PANEL_WIDTH * 3
 SCREEN_HEIGHT = HEIGHT + INFO_HEIGHT
 
-# Quy tắc combo
-COMBO_RULES = {
-    0: (2, 200),
-    1: (3, 300),
-    2: (4, 400),
-    3: (5, 500),
-    4: (6, 600)
-}
-BAG_SIZE = 7
-
 pygame.mixer.init()
 
+# --- SEED (xem seeding.py) ---
+# python battleAI.py --seed N: các lần thả bánh, phân xử tranh chấp và các planner ngẫu nhiên
+# dùng chung một random.Random có seed, nên cùng lựa chọn AI thì trận đấu diễn ra giống hệt
+SEED = parse_seed()
+rng = random.Random(SEED)
+
 # --- KHỞI TẠO MÀN HÌNH ---
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Battle AI Players")
@@ -177,15 +169,20 @@ class ScrollablePathPanel:
         self.rect = pygame.Rect(x, y, width, height)
         self.font = pygame.font.SysFont(None, font_size)
         self.path_steps = []
+        self.header_lines = 1
         self.scroll_y = 0
         self.line_height = font_size + 4
         self.visible_lines = height // self.line_height
         self.scrollbar_width = 15
         self.dragging = False
         
-    def set_path(self, path, cal_time=0.0):
+    def set_path(self, path, cal_time=0.0, info_lines=()):
         self.path_steps = []
         self.path_steps.append(f"Time: {cal_time:.6f} s")
+        self.header_lines = 1
+        # Các dòng thông tin thêm: số lần trúng/trượt cache, thống kê tìm kiếm (SearchResult.stats_lines)
+        self.path_steps.extend(info_lines)
+        self.header_lines = 1 + len(info_lines)
         
         for i, (direction, pos) in enumerate(path):
             x, y = pos
@@ -217,7 +214,7 @@ class ScrollablePathPanel:
         for i, step in enumerate(self.path_steps):
             y_pos = i * self.line_height - self.scroll_y + 2
             if -self.line_height <= y_pos < content_rect.height:
-                if i == 0:  # First line is the time
+                if i < self.header_lines:  # First lines are the time / cache
                     text = self.font.render(step, True, (0, 0, 150))
                 else:
                     text = self.font.render(step, True, (0, 0, 0))
@@ -403,7 +400,7 @@ speed_options = ["Slow", "Normal", "Fast", "Instant"]
 game_speed_dropdown = DropdownMenu(370, HEIGHT + 190, 100, 40, speed_options)
 
 # Dropdown cho thuật toán của từng AI
-ai_algo_options = ["No play","Nearest", "BFS", "DFS", "A_Star", "Simulated_Annealing", "Nondeterministic", "BTwForwardChecking", "QLearning"]
+ai_algo_options = ["No play"] + planner_names(BATTLE)
 # Thay đổi vị trí X cho mỗi dropdown
 ai_algorithm_dropdowns = [
     DropdownMenu(550 + i * 100, HEIGHT + 18 + i * 60, 170, 40, ai_algo_options) for i in range(3)
@@ -433,25 +430,33 @@ def draw_controls():
 
 def check_combos(bag):
     global scores, animations
-    removed = False
-    for obj, (need, points) in COMBO_RULES.items():
-        if len(bag) < need:
-            continue
-        for i in range(len(bag) - need + 1):
-            segment = bag[i:i+need]
-            if all(x == obj for x in segment):
-                # Tạo animation trước khi xóa vật phẩm
-                positions = list(range(i, i + need))
-                animation_manager.add_combo_animation(obj, positions, points)
-                
-                # Xóa vật phẩm khỏi túi
-                del bag[i:i+need]
-                return True, points
-    return False, 0
+    # Tra combo đầu tiên trong túi theo luật chung (combo_rules)
+    combo = find_combo(bag)
+    if combo is None:
+        return False, 0
+    obj, i, need, points = combo
+    # Tạo animation trước khi xóa vật phẩm
+    positions = list(range(i, i + need))
+    animation_manager.add_combo_animation(obj, positions, points)
+    
+    # Xóa vật phẩm khỏi túi
+    del bag[i:i+need]
+    return True, points
 
 # --- KHỞI TẠO GAME ---
 map_file = "map_design.txt"
 map_tiles = load_map_from_file(map_file, GRID_SIZE)
+# Chỉ mục vật phẩm theo loại, cập nhật khi thả và khi nhặt vật phẩm (không phải quét lại map mỗi frame)
+object_index = ObjectIndex(map_tiles)
+# Bố cục tường của map (khóa của planner_cache), không đổi trong cả trận
+map_layout = compile_map(map_tiles).layout
+# Cache kết quả tìm đường theo (thuật toán, bố cục tường, vật phẩm trên map, vị trí, túi), dùng chung cho 3 AI
+planner_cache = PlannerCache()
+# Thời hạn suy nghĩ (ms) cho mỗi lần gọi ARA*
+ARA_DEADLINE_MS = 50
+# Các planner của từng AI (xem planner_registry.py): planner có trạng thái (D* Lite giữ cây tìm
+# kiếm, Scheduler giữ lịch nhiều combo) không được dùng chung giữa các AI
+ai_planners = [PlannerSet(deadline_ms=ARA_DEADLINE_MS, rng=rng) for _ in range(3)]
 
 path_panels = [
     ScrollablePathPanel(
@@ -512,31 +517,23 @@ def calculate_ai_path(ai_id):
         path_panels[ai_id].set_path([], 0.0)
         return []
     
-    # Tạo bản sao của map để AI phân tích
-    map_copy = [row[:] for row in map_tiles]
-    
     # Lấy vị trí hiện tại của AI
     x, y = player_positions[ai_id]
     
     start_time = time.time()
     
-    # Gọi hàm tìm đường dựa trên thuật toán được chọn
-    if algorithm == "Nearest":
-        path = search_only_nearest(map_copy, (x, y))
-    elif algorithm == "BFS":
-        path = bfs_search(map_copy, (x, y), bags[ai_id])
-    elif algorithm == "DFS":
-        path = dfs_search(map_copy, (x, y), bags[ai_id])
-    elif algorithm == "A_Star":
-        path = astar_search(map_copy, (x, y), bags[ai_id])
-    elif algorithm == "Simulated_Annealing":
-        path = simulated_annealing_search(map_copy, (x, y), bags[ai_id])
-    elif algorithm == "Nondeterministic":
-        path = nondeterministic_search(map_copy, (x, y), bags[ai_id])
-    elif algorithm == "BTwForwardChecking":
-        path = backtracking_with_forward_checking(map_copy, (x, y), bags[ai_id])
-    elif algorithm == "QLearning":
-        path = qlearning_search(map_copy, (x, y), bags[ai_id])
+    # Tra cache trước: cùng map, vị trí và túi thì thuật toán tất định cho cùng đường đi
+    info_lines = []
+    path = planner_cache.get(algorithm, map_layout, object_index, (x, y), bags[ai_id])
+    if path is None:
+        # Tạo bản sao của map để AI phân tích
+        map_copy = [row[:] for row in map_tiles]
+        
+        # Gọi planner của thuật toán được chọn (xem planner_registry.py)
+        path = ai_planners[ai_id].plan(algorithm, map_copy, (x, y), bags[ai_id], object_index)
+        planner_cache.put(algorithm, map_layout, object_index, (x, y), bags[ai_id], path)
+        # Thống kê tìm kiếm của planner (SearchResult); lần trúng cache thì không có
+        info_lines = path.stats_lines()
     
     end_time = time.time()
     calculation_time = end_time - start_time
@@ -549,7 +546,7 @@ def calculate_ai_path(ai_id):
     current_path_indices[ai_id] = 0
     
     # Cập nhật path panel tương ứng cho AI
-    path_panels[ai_id].set_path(path, current_calculation_times[ai_id])
+    path_panels[ai_id].set_path(path, current_calculation_times[ai_id], [planner_cache.stats_text()] + info_lines)
         
     return path
             
@@ -559,7 +556,7 @@ running = True
 fps_timer = pygame.time.Clock()
 
 # Đặt vài vật phẩm ban đầu
-place_random_objects(map_tiles, GRID_SIZE, player_positions)
+place_random_objects(map_tiles, GRID_SIZE, player_positions, object_index, rng)
 
 while running:
     # Điều chỉnh tốc độ dựa trên lựa chọn từ dropdown
@@ -630,6 +627,8 @@ while running:
                     current_path_indices = [0, 0, 0]
                     for i, panel in enumerate(path_panels):
                         panel.set_path([], 0.0)
+                    for planners in ai_planners:
+                        planners.reset()
                     
                     # Reset vị trí AI về vị trí ban đầu
                     player_positions = [
@@ -647,9 +646,10 @@ while running:
                     
                     # Khôi phục map về trạng thái ban đầu
                     map_tiles = [row[:] for row in original_map_tiles]
+                    object_index = ObjectIndex(map_tiles)
                     
                     # Đặt vật phẩm 
-                    place_random_objects(map_tiles, GRID_SIZE, player_positions)
+                    place_random_objects(map_tiles, GRID_SIZE, player_positions, object_index, rng)
                     
                     animation_manager.clear()
                     
@@ -672,16 +672,11 @@ while running:
                 drop_interval = 50
 
             # Đếm số vật hiện có trên map
-            item_count = sum(
-                1 
-                for row in map_tiles 
-                for cell in row 
-                if isinstance(cell, int)
-            )
+            item_count = object_index.count()
 
             # Nếu đã đủ bước và map chưa có đủ 20 vật hoặc còn dưới 5 vật phẩm thì thả thêm
             if (step_counter >= drop_interval and item_count < 20) or item_count <= 5:
-                place_random_objects(map_tiles, GRID_SIZE, player_positions)
+                place_random_objects(map_tiles, GRID_SIZE, player_positions, object_index, rng)
                 
                 # Thêm text animation khi thả vật phẩm
                 animation_manager.add_text_animation(
@@ -769,7 +764,7 @@ while running:
                     chosen_ai_id = ai_ids[0]  # Mặc định chọn AI đầu tiên
                     # Random cộng thêm 1 phần rất nhỏ thời gian tránh trường hợp 2,3 cái đều cùng 0.000000s hoặc cùng thời gian
                     for ai_id in ai_ids:
-                        temp = current_calculation_times[ai_id] + (random.uniform(0, 99)/1000000000)
+                        temp = current_calculation_times[ai_id] + (rng.uniform(0, 99)/1000000000)
                         if  temp < min_calculation_time:
                             min_calculation_time = temp
                             chosen_ai_id = ai_id          
@@ -788,6 +783,7 @@ while running:
                 animation_manager.add_collect_animation(new_x, new_y, obj)
                 sound_assets["collect"].play()
                 map_tiles[new_y][new_x] = " "
+                object_index.remove((new_x, new_y), obj)
                 
                 # Kiểm tra combo
                 has_combo, combo_points = check_combos(bags[chosen_ai_id])
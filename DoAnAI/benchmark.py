@@ -0,0 +1,193 @@
+import argparse
+import contextlib
+import csv
+import glob
+import json
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool
+
+from map_handler import (load_map_from_file, place_random_objects, ObjectIndex, MapLoadError, map_size,
+                         start_position)
+from combo_rules import collect
+from planner_registry import PlannerSet, planner_names, SINGLE
+
+# --- BENCHMARK CÁC PLANNER KHÔNG CẦN CỬA SỔ PYGAME ---
+# Trước đây chỉ so sánh được các thuật toán qua tên file GIF do playAI5.py ghi lại
+# (A_Star_time0.525429_steps192_*.gif). Công cụ này chơi trọn ván như playAI5.py nhưng không vẽ:
+#   - nạp từng map_design*.txt (hoặc các map --maps kích thước bất kỳ), đặt vật phẩm ngẫu nhiên
+#     với seed cố định (cùng seed -> cùng ván cho mọi planner, kể cả các lựa chọn ngẫu nhiên của
+#     planner), người chơi bắt đầu ở giữa bản đồ (map_handler.start_position)
+#   - gọi planner khi đi hết đường, đi từng bước, nhặt vật phẩm theo combo_rules.collect
+#     (cùng luật túi/combo với check_combos của front-end), dừng khi hết vật phẩm
+#   - đo thời gian từng lần gọi planner: tổng, p50 / p95 / max; cùng số bước, điểm, số nút đã
+#     mở rộng (SearchResult.expanded)
+# Kết quả in ra dạng JSON (mặc định) hoặc CSV, mỗi dòng là một ván (planner, map, seed).
+# Có thể chạy song song các ván trên nhiều tiến trình (--jobs).
+#
+# Ví dụ:
+#   python benchmark.py --planners BFS A_Star --seeds 0 1 2 --jobs 3 --format csv
+
+DEFAULT_MAX_STEPS = 2000       # Chặn số bước của một ván (planner kẹt đi vòng mãi)
+ARA_DEADLINE_MS = 50           # Thời hạn suy nghĩ của ARA*, như playAI5.py
+
+CSV_FIELDS = ["planner", "map", "size", "seed", "finished", "steps", "score", "calls",
+              "think_time", "p50_ms", "p95_ms", "max_ms", "expanded"]
+
+
+def _percentile(sorted_values, q):
+    """
+    Phân vị q (0..100) theo hạng gần nhất của list đã sắp xếp (0 nếu list rỗng).
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-q * len(sorted_values) // 100))  # ceil(q * n / 100)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def play_game(planner_name, map_file, seed, max_steps=DEFAULT_MAX_STEPS):
+    """
+    Chơi trọn một ván bằng planner_name, không vẽ.
+
+    Tham số:
+        planner_name: tên planner đã đăng ký (planner_registry.py)
+        map_file: file thiết kế map
+        seed: seed của ván (đặt vật phẩm và các planner ngẫu nhiên)
+        max_steps: số bước tối đa của ván
+
+    Trả về:
+        dict kết quả ván (các khóa như CSV_FIELDS)
+    """
+    map_tiles = load_map_from_file(map_file)
+    cols, rows = map_size(map_tiles)
+    object_index = ObjectIndex(map_tiles)
+    # Một random.Random riêng cho cả ván: cách đặt bánh và các planner ngẫu nhiên đều theo seed
+    rng = random.Random(seed)
+    place_random_objects(map_tiles, object_index=object_index, rng=rng)
+
+    # Mỗi ván một PlannerSet mới: planner có trạng thái không mang gì từ ván trước sang
+    planners = PlannerSet(deadline_ms=ARA_DEADLINE_MS, rng=rng)
+    player_x, player_y = start_position(map_tiles)
+    bag = []
+    score = steps = expanded = 0
+    latencies = []
+    path = []
+    path_index = 0
+
+    while object_index.has() and steps < max_steps:
+        if path_index >= len(path):
+            # Tính lại đường đi trên bản sao map như calculate_ai_path của playAI5.py
+            map_copy = [row[:] for row in map_tiles]
+            start = time.perf_counter()
+            # Một số planner (QLearning) in thông báo mỗi lần gọi: đẩy sang stderr để kết quả
+            # JSON/CSV in ra stdout không bị lẫn
+            with contextlib.redirect_stdout(sys.stderr):
+                path = planners.plan(planner_name, map_copy, (player_x, player_y), bag, object_index)
+            latencies.append(time.perf_counter() - start)
+            expanded += getattr(path, "expanded", 0)
+            path_index = 0
+            if not path:
+                break  # Planner không tìm được đường, ván kết thúc ở đây
+
+        _, (player_x, player_y) = path[path_index]
+        path_index += 1
+        steps += 1
+        cell = map_tiles[player_y][player_x]
+        if isinstance(cell, int):
+            new_bag, points = collect(bag, cell)
+            bag = list(new_bag)
+            score += points
+            map_tiles[player_y][player_x] = " "
+            object_index.remove((player_x, player_y), cell)
+
+    latencies.sort()
+    return {
+        "planner": planner_name,
+        "map": os.path.basename(map_file),
+        "size": f"{cols}x{rows}",
+        "seed": seed,
+        "finished": not object_index.has(),
+        "steps": steps,
+        "score": score,
+        "calls": len(latencies),
+        "think_time": round(sum(latencies), 6),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        "expanded": expanded,
+    }
+
+
+def _play_task(task):
+    # Hàm cấp module để Pool gửi được sang tiến trình con
+    return play_game(*task)
+
+
+def run_benchmark(planners, map_files, seeds, max_steps=DEFAULT_MAX_STEPS, jobs=1):
+    """
+    Chơi mọi tổ hợp (planner, map, seed), song song trên jobs tiến trình nếu jobs > 1.
+
+    Trả về:
+        list dict kết quả theo thứ tự planner, map, seed
+    """
+    tasks = [(name, map_file, seed, max_steps)
+             for name in planners for map_file in map_files for seed in seeds]
+    if jobs > 1:
+        with Pool(jobs) as pool:
+            return pool.map(_play_task, tasks)
+    return [_play_task(task) for task in tasks]
+
+
+def write_results(rows, fmt, out):
+    """
+    Ghi kết quả dạng "json" hoặc "csv" ra luồng out.
+    """
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        json.dump(rows, out, indent=2)
+        out.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark các planner trên các map, không cần pygame")
+    parser.add_argument("--planners", nargs="+", choices=planner_names(SINGLE), default=planner_names(SINGLE),
+                        help="các planner cần đo (mặc định: tất cả planner của playAI5)")
+    parser.add_argument("--maps", nargs="+", default=None,
+                        help="các file map, kích thước bất kỳ (mặc định: map_design*.txt trong thư mục này)")
+    parser.add_argument("--seeds", "--seed", nargs="+", type=int, default=[0],
+                        help="seed của các ván (xem seeding.py), mỗi seed một ván trên mỗi map")
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS,
+                        help="số bước tối đa của một ván")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="số tiến trình chạy song song")
+    parser.add_argument("--format", choices=("json", "csv"), default="json")
+    parser.add_argument("--output", default=None,
+                        help="file kết quả (mặc định: in ra màn hình)")
+    args = parser.parse_args(argv)
+
+    map_files = args.maps
+    if map_files is None:
+        here = os.path.dirname(os.path.abspath(__file__))
+        map_files = sorted(glob.glob(os.path.join(here, "map_design*.txt")))
+    # Kiểm tra các map trước khi chạy để báo lỗi file ngay thay vì giữa chừng trong tiến trình con
+    for map_file in map_files:
+        try:
+            load_map_from_file(map_file)
+        except MapLoadError as e:
+            parser.error(str(e))
+
+    rows = run_benchmark(args.planners, map_files, args.seeds, args.max_steps, args.jobs)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            write_results(rows, args.format, f)
+    else:
+        write_results(rows, args.format, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
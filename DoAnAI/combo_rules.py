@@ -0,0 +1,138 @@
+# --- LUẬT COMBO DÙNG CHUNG ---
+# Một chỗ duy nhất định nghĩa COMBO_RULES và cách kiểm tra combo cho cả các thuật toán
+# tìm kiếm (search*.py) lẫn các front-end (main.py, playAI5.py, battleAI.py).
+#
+# Túi chứa tối đa BAG_SIZE vật phẩm thuộc 5 loại nên chỉ có chưa tới 100k túi khác nhau:
+#   - is_combo_goal(bag_code): kiểm tra goal của các thuật toán tìm combo, tra theo túi
+#     đã nén (search_state.pack_bag) trong một bảng bytearray, mỗi túi chỉ tính một lần
+#   - find_combo(bag): tìm combo đầu tiên trong túi cho front-end (ghi nhớ theo tuple túi)
+#   - collect(bag, obj): mô phỏng một lần nhặt như front-end (thêm, tràn túi, xóa combo)
+
+from search_state import BAG_SIZE, BAG_BITS, unpack_bag
+
+# Loại vật phẩm -> (số lượng liên tiếp cần có, điểm thưởng)
+COMBO_RULES = {
+    0: (2, 200),
+    1: (3, 300),
+    2: (4, 400),
+    3: (5, 500),
+    4: (6, 600),
+}
+
+# Theo số ô trống trong túi: các loại vật phẩm còn có thể tạo combo
+# (loại cần need vật phẩm chỉ được xét khi túi còn ít nhất need ô trống)
+ALLOWED_COMBO_OBJS = tuple(
+    tuple(obj for obj, (need, _) in COMBO_RULES.items() if need <= empty_slots)
+    for empty_slots in range(BAG_SIZE + 1)
+)
+
+# Kết quả goal theo túi đã nén: 0 = chưa tính, 1 = không phải goal, 2 = goal
+_GOAL_TABLE = bytearray(1 << BAG_BITS)
+# Kết quả find_combo theo tuple túi
+_COMBO_CACHE = {}
+
+
+def allowed_combo_objs(empty_slots):
+    """
+    Dựa trên số ô trống trong túi, trả về tuple các obj có thể tạo combo:
+    - empty >=6: (0,1,2,3,4)
+    - empty ==5: (0,1,2,3)
+    - empty ==4: (0,1,2)
+    - empty ==3: (0,1)
+    - empty ==2: (0,)
+    - else: ()
+    """
+    if empty_slots < 0:
+        return ()
+    return ALLOWED_COMBO_OBJS[min(empty_slots, BAG_SIZE)]
+
+
+def has_combo(bag, allowed_objs):
+    """
+    Kiểm tra xem bag (tuple/list) có chứa segment combo hợp lệ cho bất kỳ obj nào trong allowed_objs.
+    Trả về True ngay khi tìm thấy.
+    """
+    n = len(bag)
+    for obj in allowed_objs:
+        need, _ = COMBO_RULES[obj]
+        if n < need:
+            continue
+        # Duyệt các segment độ dài need
+        for i in range(n - need + 1):
+            if all(bag[i + j] == obj for j in range(need)):
+                return True
+    return False
+
+
+def is_combo_goal(bag_code):
+    """
+    Goal của các thuật toán tìm combo: túi có combo của một loại còn được phép
+    theo số ô trống (allowed_combo_objs(BAG_SIZE - len(bag))).
+
+    Tham số:
+        bag_code: túi đã nén bằng search_state.pack_bag
+
+    Trả về:
+        bool: True nếu túi đạt goal
+    """
+    known = _GOAL_TABLE[bag_code]
+    if known:
+        return known == 2
+    bag = unpack_bag(bag_code)
+    result = has_combo(bag, ALLOWED_COMBO_OBJS[BAG_SIZE - len(bag)])
+    _GOAL_TABLE[bag_code] = 2 if result else 1
+    return result
+
+
+def find_combo(bag):
+    """
+    Tìm combo đầu tiên trong túi theo thứ tự COMBO_RULES, segment ở vị trí nhỏ nhất trước.
+
+    Tham số:
+        bag: túi hiện tại (list/tuple)
+
+    Trả về:
+        (obj, start, need, points) nếu có combo, ngược lại None
+    """
+    key = tuple(bag)
+    if key in _COMBO_CACHE:
+        return _COMBO_CACHE[key]
+    result = None
+    n = len(key)
+    for obj, (need, points) in COMBO_RULES.items():
+        if n < need:
+            continue
+        for i in range(n - need + 1):
+            if all(key[i + j] == obj for j in range(need)):
+                result = (obj, i, need, points)
+                break
+        if result is not None:
+            break
+    _COMBO_CACHE[key] = result
+    return result
+
+
+def collect(bag, obj):
+    """
+    Mô phỏng việc nhặt một vật phẩm như front-end: thêm vào cuối túi, bỏ món đầu nếu vượt
+    BAG_SIZE, rồi xóa lần lượt các combo (find_combo) và cộng điểm.
+
+    Tham số:
+        bag: túi hiện tại (list/tuple)
+        obj: loại vật phẩm vừa nhặt
+
+    Trả về:
+        (túi mới dạng tuple, số điểm nhận được)
+    """
+    new_bag = list(bag)
+    new_bag.append(obj)
+    if len(new_bag) > BAG_SIZE:
+        new_bag.pop(0)
+    points = 0
+    combo = find_combo(new_bag)
+    while combo is not None:
+        _, i, need, gained = combo
+        del new_bag[i:i + need]
+        points += gained
+        combo = find_combo(new_bag)
+    return tuple(new_bag), points
@@ -0,0 +1,356 @@
+# --- TRƯỜNG KHOẢNG CÁCH (WAVEFRONT) CHO CÁC TRUY VẤN "VẬT PHẨM GẦN NHẤT" ---
+# Thay vì mỗi lần fallback lại chạy BFS/A* bằng vòng lặp Python, ta lan sóng đồng thời từ
+# TẤT CẢ các ô mục tiêu bằng NumPy: mỗi bước sóng là vài phép dịch mảng boolean trên cả lưới.
+# Kết quả là trường khoảng cách: số bước ngắn nhất từ mỗi ô tới mục tiêu gần nhất
+# (ô tường và ô chứa vật phẩm không phải mục tiêu bị chặn như khi tìm đường).
+#
+# Lưới được đệm thêm một viền ô chặn và trải phẳng (chỉ số p = (y + 1) * (cols + 2) + x + 1),
+# nên 4 ô kề chỉ là các lát cắt lệch ±1, ±(cols + 2) của cùng một mảng.
+#
+# Sóng được lan dần: mỗi truy vấn chỉ lan tới lớp chứa ô xuất phát, phần còn lại được lan tiếp
+# khi truy vấn sau cần. Đường đi được lấy bằng cách "xuống dốc" từ ô xuất phát: mỗi bước sang ô kề
+# có khoảng cách nhỏ hơn đúng 1. Trường được lưu cache theo (bố cục tường, vật phẩm trên map,
+# loại mục tiêu) nên các AI cùng tìm trên một map (battleAI) dùng chung một lần lan sóng.
+#
+# TypeDistanceFields / SearchFields: trường "khoảng cách tới vật phẩm gần nhất loại k" (k = 0..4)
+# cho heuristic của A*, Simulated Annealing và AND-OR. Mỗi trường là phép lấy min theo phần tử
+# các hàng của bảng DistanceTable, nên khi bớt một vật phẩm chỉ các ô nhận nó là gần nhất được tính
+# lại, khi thêm vật phẩm chỉ cần một phép np.minimum. Heuristic chỉ còn là một phép tra mảng.
+
+import numpy as np
+
+from map_handler import OBJECT_TYPES, UNREACHABLE
+from search_state import DIRECTION_NAMES
+
+_FIELD_CACHE = {}
+_FIELD_CACHE_SIZE = 32
+
+
+class DistanceField:
+    """
+    Trường khoảng cách tới vật phẩm gần nhất có loại thuộc một tập mục tiêu, lan dần theo yêu cầu.
+
+    Thuộc tính:
+        rows, cols: kích thước map
+        width: độ rộng lưới đã đệm (cols + 2)
+        dist: numpy.ndarray int32 phẳng trên lưới đã đệm, UNREACHABLE ở ô chưa tới (hoặc không tới được)
+        radius: khoảng cách của lớp sóng đã lan xong
+    """
+
+    __slots__ = ("rows", "cols", "width", "dist", "radius", "_open", "_frontier", "_grow")
+
+    def __init__(self, cmap, target_vals):
+        rows, cols = cmap.rows, cmap.cols
+        width = cols + 2
+        self.rows = rows
+        self.cols = cols
+        self.width = width
+
+        walkable = np.frombuffer(cmap.walkable, dtype=np.uint8).reshape(rows, cols).astype(bool)
+        obj_type = np.frombuffer(cmap.obj_type, dtype=np.int8).reshape(rows, cols)
+        is_target = np.zeros((rows + 2, width), dtype=bool)
+        is_target[1:-1, 1:-1] = np.isin(obj_type, list(target_vals))
+        # Ô đi qua được: không phải tường và không chứa vật phẩm khác loại mục tiêu
+        passable = np.zeros((rows + 2, width), dtype=bool)
+        passable[1:-1, 1:-1] = walkable & (obj_type < 0)
+        passable |= is_target
+
+        frontier = is_target.ravel()
+        self.dist = np.full(frontier.size, UNREACHABLE, dtype=np.int32)
+        self.dist[frontier] = 0
+        self.radius = 0
+        self._open = passable.ravel() & ~frontier
+        self._frontier = frontier
+        self._grow = np.zeros_like(frontier)
+
+    def _expand(self):
+        """
+        Lan thêm một lớp sóng; trả về False nếu sóng đã dừng.
+        """
+        frontier = self._frontier
+        if not frontier.any():
+            return False
+        w = self.width
+        grow = self._grow
+        # 4 ô kề của toàn bộ frontier cùng lúc (viền đệm không bao giờ đi được)
+        np.logical_or(frontier[w - 1:-w - 1], frontier[w + 1:-w + 1], out=grow[w:-w])
+        grow[w:-w] |= frontier[:-2 * w]
+        grow[w:-w] |= frontier[2 * w:]
+        frontier = grow & self._open
+        self._open &= ~frontier
+        self.radius += 1
+        self.dist[frontier] = self.radius
+        self._frontier = frontier
+        return True
+
+    def padded(self, cell):
+        """
+        Chỉ số trên lưới đã đệm của ô cell = y * cols + x.
+        """
+        return cell + self.width + 1 + 2 * (cell // self.cols)
+
+    def reach(self, cell):
+        """
+        Lan sóng cho tới khi ô cell có khoảng cách (hoặc sóng dừng), trả về khoảng cách đó.
+        """
+        p = self.padded(cell)
+        dist = self.dist
+        while dist[p] == UNREACHABLE and self._expand():
+            pass
+        return int(dist[p])
+
+    def grid(self):
+        """
+        Trường khoảng cách đầy đủ dạng numpy.ndarray (rows, cols).
+        """
+        while self._expand():
+            pass
+        return self.dist.reshape(self.rows + 2, self.width)[1:-1, 1:-1]
+
+
+def wavefront(cmap, target_vals):
+    """
+    Lấy (từ cache hoặc tạo mới) trường khoảng cách tới vật phẩm gần nhất có loại thuộc target_vals.
+
+    Tham số:
+        cmap: map đã biên dịch (map_handler.compile_map)
+        target_vals: các loại vật phẩm mục tiêu
+
+    Trả về:
+        DistanceField dùng chung cho mọi truy vấn trên cùng map và cùng tập mục tiêu
+    """
+    key = (cmap.layout, bytes(cmap.obj_type), frozenset(target_vals))
+    field = _FIELD_CACHE.get(key)
+    if field is None:
+        if len(_FIELD_CACHE) >= _FIELD_CACHE_SIZE:
+            _FIELD_CACHE.clear()
+        field = DistanceField(cmap, target_vals)
+        _FIELD_CACHE[key] = field
+    return field
+
+
+def descend(cmap, field, start_pos, order=None, rng=None, max_steps=None):
+    """
+    Dựng đường đi từ start_pos tới mục tiêu gần nhất bằng cách xuống dốc trên trường khoảng cách.
+
+    Tham số:
+        cmap: map đã biên dịch
+        field: DistanceField từ wavefront()
+        start_pos: vị trí xuất phát (x, y)
+        order: thứ tự ưu tiên mã hướng khi có nhiều ô kề cùng tốt (mặc định theo DIRECTIONS)
+        rng: nếu có (vd. module random), chọn ngẫu nhiên giữa các ô kề cùng tốt
+        max_steps: nếu đường đi dài hơn thì trả về []
+
+    Trả về:
+        list các (direction, (x, y)), [] nếu không tới được mục tiêu nào
+    """
+    cols = cmap.cols
+    neighbors = cmap.neighbors
+    cell = cmap.cell_of(start_pos)
+    d = field.reach(cell)
+    if d == UNREACHABLE:
+        # Ô xuất phát có thể không nằm trong vùng sóng (vd. đang đứng trên vật phẩm khác loại)
+        field.grid()
+        d = min((int(field.dist[field.padded(ncell)]) for _, ncell in neighbors[cell]),
+                default=UNREACHABLE)
+        if d == UNREACHABLE:
+            return []
+        d += 1
+    if max_steps is not None and d > max_steps:
+        return []
+
+    flat = field.dist.tolist()
+    padded = field.padded
+    rank = None
+    if order is not None:
+        rank = {code: i for i, code in enumerate(order)}
+    path = []
+    while d > 0:
+        d -= 1
+        candidates = [(code, ncell) for code, ncell in neighbors[cell] if flat[padded(ncell)] == d]
+        if rng is not None and len(candidates) > 1:
+            code, cell = rng.choice(candidates)
+        elif rank is not None:
+            code, cell = min(candidates, key=lambda c: rank[c[0]])
+        else:
+            code, cell = candidates[0]
+        path.append((DIRECTION_NAMES[code], (cell % cols, cell // cols)))
+    return path
+
+
+def nearest_target_path(cmap, start_pos, target_vals, order=None, rng=None, max_steps=None):
+    """
+    Đường đi ngắn nhất tới vật phẩm gần nhất thuộc target_vals, không đi qua vật phẩm khác loại.
+    """
+    return descend(cmap, wavefront(cmap, target_vals), start_pos, order, rng, max_steps)
+
+
+class TypeDistanceFields:
+    """
+    Trường khoảng cách tới vật phẩm gần nhất của từng loại trên các ô đi được, cập nhật tăng dần.
+
+    Khoảng cách là đường đi thật chỉ tránh tường (giống DistanceTable), chỉ số theo distances.index.
+
+    Thuộc tính:
+        distances: DistanceTable của bố cục
+        members: dict loại -> set chỉ số ô các vật phẩm loại đó
+        fields: dict loại -> numpy.ndarray uint16 (count,), UNREACHABLE nếu không còn vật phẩm loại đó
+    """
+
+    __slots__ = ("distances", "members", "fields")
+
+    def __init__(self, distances, cells_by_type=None):
+        self.distances = distances
+        self.members = {}
+        self.fields = {}
+        for obj_type in OBJECT_TYPES:
+            cells = set(cells_by_type.get(obj_type, ())) if cells_by_type else set()
+            self.members[obj_type] = cells
+            self.fields[obj_type] = self._min_rows(cells)
+
+    def row(self, cell):
+        """
+        Khoảng cách từ ô cell tới mọi ô đi được (một hàng của DistanceTable, không copy).
+        """
+        return np.frombuffer(self.distances.row(cell), dtype=np.uint16)
+
+    def _min_rows(self, cells, at=None):
+        """
+        Min theo phần tử các hàng của cells (chỉ tại các vị trí at nếu có).
+        """
+        result = np.full(self.distances.count if at is None else len(at), UNREACHABLE, dtype=np.uint16)
+        for cell in cells:
+            row = self.row(cell)
+            np.minimum(result, row if at is None else row[at], out=result)
+        return result
+
+    def add(self, cell, obj_type):
+        """
+        Thêm vật phẩm: mỗi ô chỉ có thể gần hơn, một phép np.minimum.
+        """
+        self.members[obj_type].add(cell)
+        field = self.fields[obj_type]
+        np.minimum(field, self.row(cell), out=field)
+
+    def remove(self, cell, obj_type):
+        """
+        Bớt vật phẩm: chỉ các ô nhận vật phẩm này là gần nhất được tính lại từ các vật phẩm còn lại.
+        """
+        members = self.members[obj_type]
+        if cell not in members:
+            return
+        members.discard(cell)
+        field = self.fields[obj_type]
+        affected = np.flatnonzero(field == self.row(cell))
+        if affected.size:
+            field[affected] = self._min_rows(members, affected)
+
+    def dist(self, cell, obj_type):
+        """
+        Khoảng cách từ ô cell tới vật phẩm loại obj_type gần nhất (UNREACHABLE nếu không có).
+        """
+        idx = self.distances.index[cell]
+        if idx < 0:
+            return UNREACHABLE
+        return int(self.fields[obj_type][idx])
+
+
+class SearchFields:
+    """
+    Trường khoảng cách theo loại cho các trạng thái của MỘT lần tìm combo (objects là bitmask của codec).
+
+    Trường của một tập vật phẩm (loại k, các bit còn lại) được suy ra từ trường của tập có thêm
+    một vật phẩm bằng TypeDistanceFields.remove-style cập nhật, và được ghi nhớ theo tập đó,
+    nên việc nhặt vật phẩm dọc một nhánh tìm kiếm không phải dựng lại trường từ đầu.
+
+    Tham số khởi tạo:
+        codec: StateCodec của lần tìm kiếm
+        distances: DistanceTable của bố cục
+        base: TypeDistanceFields của game (nếu có và khớp tập vật phẩm ban đầu thì dùng lại)
+    """
+
+    __slots__ = ("codec", "fields", "index", "type_bits", "_memo", "_penalty")
+
+    def __init__(self, codec, distances, base=None):
+        self.codec = codec
+        self.type_bits = {obj_type: 0 for obj_type in OBJECT_TYPES}
+        cells_by_type = {obj_type: set() for obj_type in OBJECT_TYPES}
+        for slot, (cell, val) in enumerate(zip(codec.obj_cells, codec.obj_vals)):
+            self.type_bits[val] |= 1 << slot
+            cells_by_type[val].add(cell)
+        if base is None or base.distances is not distances or base.members != cells_by_type:
+            base = TypeDistanceFields(distances, cells_by_type)
+        self.fields = base
+        self.index = distances.index
+        # (loại, bit còn lại của loại đó) -> (ndarray, list) ; list dùng cho phép tra nhanh
+        self._memo = {}
+        for obj_type, bits in self.type_bits.items():
+            field = base.fields[obj_type]
+            self._memo[(obj_type, bits)] = (field, field.tolist())
+        self._penalty = {}
+
+    def _field(self, obj_type, key):
+        entry = self._memo.get((obj_type, key))
+        if entry is not None:
+            return entry
+        # Suy ra từ tập có thêm vật phẩm (bit thấp nhất đã bị nhặt) rồi bớt vật phẩm đó
+        missing = self.type_bits[obj_type] & ~key
+        low = missing & -missing
+        parent = self._field(obj_type, key | low)[0]
+        fields = self.fields
+        obj_cells = self.codec.obj_cells
+        field = parent.copy()
+        affected = np.flatnonzero(field == fields.row(obj_cells[low.bit_length() - 1]))
+        if affected.size:
+            remaining = []
+            rest = key
+            while rest:
+                bit = rest & -rest
+                rest ^= bit
+                remaining.append(obj_cells[bit.bit_length() - 1])
+            field[affected] = fields._min_rows(remaining, affected)
+        entry = (field, field.tolist())
+        self._memo[(obj_type, key)] = entry
+        return entry
+
+    def nearest(self, obj_type, objects):
+        """
+        List theo chỉ số ô đi được: khoảng cách tới vật phẩm loại obj_type gần nhất trong objects.
+        """
+        return self._field(obj_type, objects & self.type_bits[obj_type])[1]
+
+    def penalty(self, obj_type, objects):
+        """
+        List theo chỉ số ô đi được: tổng 10 / (d + 1) của các vật phẩm loại obj_type trong objects
+        ở khoảng cách d < 3 (phạt đi sát vật phẩm khác loại trong heuristic AND-OR).
+        Bớt vật phẩm chỉ trừ đi phần đóng góp của nó.
+        """
+        key = objects & self.type_bits[obj_type]
+        entry = self._penalty.get((obj_type, key))
+        if entry is not None:
+            return entry[1]
+        fields = self.fields
+        obj_cells = self.codec.obj_cells
+        full = self.type_bits[obj_type]
+        if key == full:
+            values = np.zeros(fields.distances.count, dtype=np.float64)
+            rest = key
+        else:
+            missing = full & ~key
+            low = missing & -missing
+            self.penalty(obj_type, key | low)
+            values = self._penalty[(obj_type, key | low)][0].copy()
+            rest = low
+        while rest:
+            bit = rest & -rest
+            rest ^= bit
+            row = fields.row(obj_cells[bit.bit_length() - 1])
+            near = np.flatnonzero(row < 3)
+            contribution = 10.0 / (row[near] + 1.0)
+            if key == full:
+                values[near] += contribution
+            else:
+                values[near] -= contribution
+        entry = (values, values.tolist())
+        self._penalty[(obj_type, key)] = entry
+        return entry[1]
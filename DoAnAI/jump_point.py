@@ -0,0 +1,171 @@
+# --- JUMP POINT SEARCH (JPS) TRÊN LƯỚI 4 HƯỚNG CHO TRUY VẤN "VẬT PHẨM GẦN NHẤT" ---
+# Các map chủ yếu là sàn trống, vật cản thưa, chi phí mỗi bước bằng nhau: A* thường phải đẩy vào
+# hàng đợi gần như mọi ô của các vùng trống. JPS chỉ đẩy các "điểm nhảy" (jump point), các đoạn
+# thẳng giữa chúng được quét bằng vòng lặp đơn giản không dùng hàng đợi.
+#
+# Thứ tự chuẩn (canonical): trong các đường ngắn nhất, chọn đường rẽ dọc càng sớm càng tốt.
+# Đổi chỗ một bước ngang rồi dọc (a -> a+ngang -> a+ngang+dọc) thành dọc rồi ngang chỉ không làm
+# được khi ô a+dọc bị chặn, nên đường chuẩn chỉ rẽ từ ngang sang dọc tại ô có "láng giềng bắt
+# buộc" (ô kề dọc đi được nhưng ô kề dọc của ô phía sau bị chặn). Từ đó:
+#   - nhảy ngang: đi thẳng tới khi gặp mục tiêu, ô có láng giềng bắt buộc, hoặc bị chặn (bỏ nhánh)
+#   - nhảy dọc: đi thẳng, mỗi ô thử nhảy ngang hai phía; ô nào nhảy ngang tới được điểm nhảy
+#     (hoặc là mục tiêu) thì là điểm nhảy
+#   - tới điểm nhảy theo chiều dọc: đi tiếp dọc và ngang hai phía; theo chiều ngang: đi tiếp ngang
+#     và rẽ dọc về phía có láng giềng bắt buộc
+# Ô tường và ô chứa vật phẩm không phải mục tiêu bị chặn (giống nearest_target_path trong
+# distance_field.py). Heuristic: khoảng cách Manhattan tới mục tiêu gần nhất (chấp nhận được).
+# Kết quả được trải lại thành từng bước đơn vị [(direction, (x, y)), ...].
+
+import heapq
+
+from map_handler import OBJECT_TYPES
+from search_state import DIRECTION_NAMES
+
+# Mã hướng (theo DIRECTION_NAMES): dọc, ngang và hướng ngược lại
+_VERTICAL = (0, 1)
+_HORIZONTAL = (2, 3)
+_OPPOSITE = (1, 0, 3, 2)
+
+
+def jps_nearest_path(cmap, start_pos, target_vals, stats=None):
+    """
+    Đường đi ngắn nhất tới vật phẩm gần nhất thuộc target_vals bằng Jump Point Search,
+    không đi qua vật phẩm khác loại.
+
+    Tham số:
+        cmap: map đã biên dịch (map_handler.compile_map)
+        start_pos: vị trí xuất phát (x, y)
+        target_vals: các loại vật phẩm mục tiêu
+        stats: SearchResult (nếu có) để cộng số điểm nhảy sinh/mở rộng, kích thước heap và bảng g
+
+    Trả về:
+        list các (direction, (x, y)), [] nếu không tới được mục tiêu nào (hoặc đang đứng trên mục tiêu)
+    """
+    cols = cmap.cols
+    step = cmap.step
+    targets = frozenset(target_vals)
+
+    # Ô vật phẩm theo loại (tìm bằng bytes.find thay vì duyệt từng ô bằng Python)
+    raw = bytes(cmap.obj_type)
+    goals, blocked = [], []
+    for obj_type in OBJECT_TYPES:
+        cells = goals if obj_type in targets else blocked
+        i = raw.find(obj_type)
+        while i >= 0:
+            cells.append(i)
+            i = raw.find(obj_type, i + 1)
+    start = cmap.cell_of(start_pos)
+    goal_set = frozenset(goals)
+    if not goals or start in goal_set:
+        return []
+    goal_xy = [(cell % cols, cell // cols) for cell in goals]
+
+    # Bảng ô kề riêng cho truy vấn: cạnh đi vào ô có vật phẩm khác loại mục tiêu bị cắt
+    nstep = step[:]
+    for cell in blocked:
+        for code in range(4):
+            ncell = step[cell * 4 + code]
+            if ncell >= 0:
+                nstep[ncell * 4 + _OPPOSITE[code]] = -1
+
+    def forced(cell, behind):
+        # Các hướng dọc có láng giềng bắt buộc khi tới cell theo chiều ngang từ ô behind
+        return [v for v in _VERTICAL if nstep[cell * 4 + v] >= 0 and nstep[behind * 4 + v] < 0]
+
+    # Kết quả nhảy ngang được ghi nhớ theo (ô, hướng), vì mỗi lần nhảy dọc quét lại các hàng
+    h_memo = {}
+
+    def jump_horizontal(cell, code):
+        key = cell * 4 + code
+        result = h_memo.get(key)
+        if result is None:
+            result = -1
+            while True:
+                ncell = nstep[cell * 4 + code]
+                if ncell < 0:
+                    break
+                # Mục tiêu, hoặc láng giềng bắt buộc (ô kề dọc mở nhưng ô kề dọc phía sau bị chặn)
+                n4, c4 = ncell * 4, cell * 4
+                if (ncell in goal_set or (nstep[n4] >= 0 and nstep[c4] < 0)
+                        or (nstep[n4 + 1] >= 0 and nstep[c4 + 1] < 0)):
+                    result = ncell
+                    break
+                cell = ncell
+            h_memo[key] = result
+        return result
+
+    def jump_vertical(cell, code):
+        while True:
+            ncell = nstep[cell * 4 + code]
+            if ncell < 0:
+                return -1
+            if ncell in goal_set or jump_horizontal(ncell, 2) >= 0 or jump_horizontal(ncell, 3) >= 0:
+                return ncell
+            cell = ncell
+
+    def heuristic(cell):
+        x, y = cell % cols, cell // cols
+        return min(abs(x - gx) + abs(y - gy) for gx, gy in goal_xy)
+
+    # Nút tìm kiếm là (ô, hướng tới ô); hướng -1 cho ô xuất phát
+    start_key = (start, -1)
+    best_g = {start_key: 0}
+    parent = {start_key: None}
+    open_heap = [(heuristic(start), 0, start, -1)]
+    goal_key = None
+    generated = expanded = peak_frontier = 0
+    while open_heap:
+        if len(open_heap) > peak_frontier:
+            peak_frontier = len(open_heap)
+        f, g, cell, arrived = heapq.heappop(open_heap)
+        key = (cell, arrived)
+        if g > best_g[key]:
+            continue
+        if cell in goal_set:
+            goal_key = key
+            break
+        expanded += 1
+
+        # Các hướng đi tiếp đã được cắt tỉa theo hướng tới ô
+        if arrived < 0:
+            codes = (0, 1, 2, 3)
+        elif arrived in _VERTICAL:
+            codes = (arrived,) + _HORIZONTAL
+        else:
+            codes = [arrived] + forced(cell, step[cell * 4 + _OPPOSITE[arrived]])
+
+        for code in codes:
+            if code in _VERTICAL:
+                ncell = jump_vertical(cell, code)
+            else:
+                ncell = jump_horizontal(cell, code)
+            if ncell < 0:
+                continue
+            new_g = g + abs(ncell % cols - cell % cols) + abs(ncell // cols - cell // cols)
+            new_key = (ncell, code)
+            if new_g >= best_g.get(new_key, new_g + 1):
+                continue
+            best_g[new_key] = new_g
+            parent[new_key] = key
+            heapq.heappush(open_heap, (new_g + heuristic(ncell), new_g, ncell, code))
+            generated += 1
+
+    if stats is not None:
+        stats.record(generated, expanded, peak_frontier, len(best_g))
+    if goal_key is None:
+        return []
+
+    # Trải các đoạn thẳng giữa các điểm nhảy thành từng bước đơn vị
+    jumps = []
+    key = goal_key
+    while key is not None:
+        jumps.append(key)
+        key = parent[key]
+    jumps.reverse()
+    path = []
+    cell = start
+    for target, code in jumps[1:]:
+        while cell != target:
+            cell = step[cell * 4 + code]
+            path.append((DIRECTION_NAMES[code], (cell % cols, cell // cols)))
+    return path
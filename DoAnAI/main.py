@@ -5,7 +5,9 @@ import os
 
 from animations import AnimationManager
 from map_handler import load_map_from_file, place_random_objects
+from combo_rules import COMBO_RULES, BAG_SIZE, find_combo
 from assets import load_assets, load_sounds
+from seeding import parse_seed
 
 pygame.init()
 
@@ -17,16 +19,6 @@ INFO_HEIGHT = 120
 SCREEN_WIDTH = WIDTH
 SCREEN_HEIGHT = HEIGHT + INFO_HEIGHT
 
-# Quy tắc combo
-COMBO_RULES = {
-    0: (2, 200),
-    1: (3, 300),
-    2: (4, 400),
-    3: (5, 500),
-    4: (6, 600)
-}
-BAG_SIZE = 7
-
 pygame.mixer.init()
 
 # --- KHỞI TẠO MÀN HÌNH ---
@@ -246,30 +238,28 @@ help_screen = HelpScreen(SCREEN_WIDTH, SCREEN_HEIGHT)
 def check_combos(bag):
     global score, animations
     removed = False
-    for obj, (need, points) in COMBO_RULES.items():
-        if len(bag) < need:
-            continue
-        for i in range(len(bag) - need + 1):
-            segment = bag[i:i+need]
-            if all(x == obj for x in segment):
-                # Tạo animation trước khi xóa vật phẩm
-                positions = list(range(i, i + need))
-                animation_manager.add_combo_animation(obj, positions, points)
-                
-                # Phát âm thanh combo
-                sound_assets["combo"].play()
-                
-                # Xóa vật phẩm khỏi túi
-                del bag[i:i+need]
-                score += points
-                removed = True
-                return removed
+    # Tra combo đầu tiên trong túi theo luật chung (combo_rules)
+    combo = find_combo(bag)
+    if combo is not None:
+        obj, i, need, points = combo
+        # Tạo animation trước khi xóa vật phẩm
+        positions = list(range(i, i + need))
+        animation_manager.add_combo_animation(obj, positions, points)
+        
+        # Phát âm thanh combo
+        sound_assets["combo"].play()
+        
+        # Xóa vật phẩm khỏi túi
+        del bag[i:i+need]
+        score += points
+        removed = True
     return removed
 
 # --- KHỞI TẠO GAME ---
 map_file = "map_design.txt"
 map_tiles = load_map_from_file(map_file, GRID_SIZE)
-place_random_objects(map_tiles, GRID_SIZE)
+# python main.py --seed N: cùng cách đặt bánh mỗi lần chơi (xem seeding.py)
+place_random_objects(map_tiles, GRID_SIZE, rng=random.Random(parse_seed()))
 
 player_x, player_y = GRID_SIZE // 2, GRID_SIZE // 2
 animation_manager = AnimationManager(assets, TILE_SIZE, HEIGHT, sound_assets)
@@ -0,0 +1,200 @@
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+import numpy as np
+
+# --- MAP ĐÃ BIÊN DỊCH LƯU TRÊN ĐĨA (MEMORY-MAPPED) ---
+# menu.py mở main.py, playAI5.py, battleAI.py thành các tiến trình riêng, nên mỗi tiến trình phải
+# tự dựng lại bảng ô kề và bảng khoảng cách của map (map 25x25: ~0.13 giây BFS cho mọi cặp ô; map
+# 100x100: gần một phút nếu cần đủ mọi hàng). compile_map (map_handler.py) lưu các bảng này một lần
+# vào một file nhị phân có phiên bản trong CACHE_DIR và các tiến trình sau chỉ việc đọc lại:
+#   - tên file là hash của bố cục tường (kích thước + ô đi được), nên sửa tường trong file .txt thì
+#     tự động dựng file mới; đổi ký tự trang trí (W -> B) không làm dựng lại
+#   - bảng khoảng cách được mở bằng numpy.memmap chỉ đọc: các tiến trình cùng lúc dùng chung trang
+#     nhớ của hệ điều hành, mỗi tiến trình chỉ sao ra các hàng nó thực sự dùng (LRU của DistanceTable)
+#   - file được ghi vào file tạm rồi đổi tên (os.replace), nên tiến trình khác không bao giờ thấy
+#     file ghi dở; file hỏng / sai phiên bản / không khớp bố cục thì bị bỏ qua và dựng lại
+#   - map nhỏ (bảng khoảng cách tính sẵn, xem _DIST_EAGER_LIMIT) được lưu đủ bảng khoảng cách tự
+#     động; map lớn chỉ lưu bảng ô kề, bảng khoảng cách đầy đủ được biên dịch trước bằng:
+#         python map_artifact.py map_gen_open_100x100_d0.15_s0.txt ...
+#     (tối đa MAX_DIST_BYTES; map lớn hơn vẫn tính từng hàng khi cần như trước)
+#
+# Định dạng file (little-endian, các phần căn theo 8 byte):
+#   header  : MAGIC, VERSION, rows, cols, count (số ô đi được), has_dist
+#   walkable: uint8[rows * cols]
+#   step    : int32[rows * cols * 4] (như CompiledMap.step)
+#   dist    : uint16[count * count] nếu has_dist (hàng i là khoảng cách từ ô đi được thứ i)
+
+MAGIC = b"CAKEMAP\0"
+VERSION = 1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "__mapcache__")
+MAX_DIST_BYTES = 256 * 1024 * 1024   # Bảng khoảng cách lớn nhất được lưu (count ~ 11500 ô)
+MAX_FILES = 64                       # Số file giữ lại trong CACHE_DIR, bỏ các file lâu không dùng
+
+_HEADER = struct.Struct("<8sIIIII")
+_ALIGN = 8
+
+
+class MapArtifact:
+    """
+    Nội dung một file map đã biên dịch.
+
+    Thuộc tính:
+        step: array('i') như CompiledMap.step
+        distances: numpy.memmap uint16 (count, count) chỉ đọc, None nếu file không có bảng khoảng cách
+    """
+
+    __slots__ = ("step", "distances")
+
+    def __init__(self, step, distances):
+        self.step = step
+        self.distances = distances
+
+
+def _aligned(offset):
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def artifact_path(rows, cols, walkable, cache_dir=None):
+    """
+    Đường dẫn file của bố cục tường (walkable: bytearray theo ô như CompiledMap.walkable).
+    """
+    digest = hashlib.sha1(struct.pack("<II", rows, cols) + bytes(walkable)).hexdigest()
+    return os.path.join(cache_dir or CACHE_DIR, digest + ".cmap")
+
+
+def load_artifact(rows, cols, walkable, cache_dir=None):
+    """
+    Mở file đã biên dịch của bố cục tường.
+
+    Trả về:
+        MapArtifact, hoặc None nếu chưa có file hoặc file không dùng được (cần dựng lại)
+    """
+    if sys.byteorder != "little":
+        return None
+    path = artifact_path(rows, cols, walkable, cache_dir)
+    try:
+        raw = np.memmap(path, dtype=np.uint8, mode="r")
+    except (OSError, ValueError):
+        return None
+    if raw.size < _HEADER.size:
+        return None
+    magic, version, f_rows, f_cols, count, has_dist = _HEADER.unpack(bytes(raw[:_HEADER.size]))
+    size = rows * cols
+    if magic != MAGIC or version != VERSION or (f_rows, f_cols) != (rows, cols):
+        return None
+    walk_at = _aligned(_HEADER.size)
+    step_at = _aligned(walk_at + size)
+    dist_at = _aligned(step_at + size * 16)
+    end = dist_at + (count * count * 2 if has_dist else 0)
+    if raw.size != end or bytes(raw[walk_at:walk_at + size]) != bytes(walkable):
+        return None
+
+    step = array("i")
+    step.frombytes(raw[step_at:step_at + size * 16])
+    distances = raw[dist_at:end].view(np.uint16).reshape(count, count) if has_dist else None
+    # Đánh dấu vừa dùng để không bị MAX_FILES dọn mất
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return MapArtifact(step, distances)
+
+
+def save_artifact(rows, cols, walkable, step, count, dist_rows=None, cache_dir=None):
+    """
+    Ghi file đã biên dịch của bố cục tường (bỏ qua nếu không ghi được, ví dụ thư mục chỉ đọc).
+
+    Tham số:
+        walkable, step: như CompiledMap.walkable, CompiledMap.step
+        count: số ô đi được
+        dist_rows: iterable count hàng khoảng cách (array('H')) theo thứ tự ô đi được, hoặc None
+                   để chỉ lưu bảng ô kề; bảng lớn hơn MAX_DIST_BYTES không được lưu
+
+    Trả về:
+        True nếu đã ghi file
+    """
+    if sys.byteorder != "little":
+        return False
+    if count * count * 2 > MAX_DIST_BYTES:
+        dist_rows = None
+    directory = cache_dir or CACHE_DIR
+    path = artifact_path(rows, cols, walkable, directory)
+    size = rows * cols
+    walk_at = _aligned(_HEADER.size)
+    step_at = _aligned(walk_at + size)
+    dist_at = _aligned(step_at + size * 16)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    except OSError:
+        return False
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, rows, cols, count, int(dist_rows is not None)))
+            f.seek(walk_at)
+            f.write(bytes(walkable))
+            f.seek(step_at)
+            f.write(step.tobytes())
+            f.seek(dist_at)
+            f.truncate()
+            if dist_rows is not None:
+                for row in dist_rows:
+                    f.write(row)
+        # mkstemp tạo file chỉ chủ sở hữu đọc được, file cache thì ai cũng đọc được
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except OSError:
+        # Ví dụ Windows không cho thay file đang được tiến trình khác memmap: giữ file cũ
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+    _prune(directory)
+    return True
+
+
+def _prune(directory):
+    """
+    Chỉ giữ MAX_FILES file dùng gần đây nhất trong thư mục.
+    """
+    try:
+        paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".cmap")]
+        if len(paths) <= MAX_FILES:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:-MAX_FILES]:
+            os.remove(path)
+    except OSError:
+        pass
+
+
+def main(argv=None):
+    import argparse
+    from map_handler import load_map_from_file, compile_map, MapLoadError
+
+    parser = argparse.ArgumentParser(description="Biên dịch trước các map (bảng ô kề và mọi khoảng cách)")
+    parser.add_argument("maps", nargs="+", help="các file map")
+    args = parser.parse_args(argv)
+
+    for map_file in args.maps:
+        try:
+            cmap = compile_map(load_map_from_file(map_file))
+        except MapLoadError as e:
+            parser.error(str(e))
+        distances = cmap.distances
+        if distances.count * distances.count * 2 > MAX_DIST_BYTES:
+            print(f"{map_file}: {distances.count} ô đi được, bảng khoảng cách quá lớn để lưu")
+        if cmap.layout.save(full=True):
+            print(f"{map_file}: {artifact_path(cmap.rows, cmap.cols, cmap.walkable)}")
+        else:
+            print(f"{map_file}: không ghi được vào {CACHE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import argparse
+import os
+import random
+from collections import deque
+
+from map_handler import parse_map, WALL_TILES
+
+# --- SINH MAP NGẪU NHIÊN CHO THÍ NGHIỆM THEO KÍCH THƯỚC ---
+# Chỉ có vài map vẽ tay (map_design*.txt) nên không đo được thời gian của các planner tăng thế nào
+# theo kích thước map và mật độ vật cản. Module này sinh map cùng định dạng ký tự với các file
+# map_design*.txt (viền "T", vật cản W/X/B/H/G, ô trống " "), đọc được bằng
+# map_handler.load_map_from_file:
+#   - style "open": các khối vật cản hình dạng bất kỳ (bước đi ngẫu nhiên) rải trên map thoáng
+#   - style "maze": mê cung (recursive backtracker) có hành lang rộng corridor ô, rồi phá bớt
+#     tường cho tới mật độ yêu cầu (tạo các vòng và lối tắt)
+#   - density: tỉ lệ ô vật cản trong phần bên trong viền (xấp xỉ, sai lệch do bước nối vùng)
+#   - mọi ô trống luôn liên thông 4 hướng: các vùng trống bị tách được nối vào vùng lớn nhất bằng
+#     đường ngắn nhất xuyên qua vật cản, nên mọi vật phẩm đặt ngẫu nhiên đều nhặt được
+#   - cùng seed (random.Random, xem seeding.py) thì cùng map
+#
+# Ví dụ:
+#   python map_generator.py --size 100x100 --density 0.2 --count 5 --seed 0 --out maps
+#   python benchmark.py --maps maps/map_gen_*.txt --planners A_Star Beam
+
+BORDER_CHAR = "T"
+MAZE_WALL_CHAR = "W"
+BLOB_CHARS = "WXBHG"
+BLOB_SIZE = (3, 12)            # Số bước đi ngẫu nhiên của một khối vật cản (style "open")
+MAX_DENSITY = 0.9              # Luôn chừa lại ô trống để đặt vật phẩm
+STYLES = ("open", "maze")
+CONNECT_ROUNDS = 4             # Số lượt rải bù vật cản sau khi nối vùng
+
+_STEPS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+def _add_blobs(grid, cols, rows, target, rng):
+    """
+    Rải các khối vật cản (bước đi ngẫu nhiên) lên các ô trống cho tới khi có target ô vật cản
+    bên trong viền. Trả về số ô vật cản.
+    """
+    free = [(x, y) for y in range(1, rows - 1) for x in range(1, cols - 1) if grid[y][x] == " "]
+    walls = (cols - 2) * (rows - 2) - len(free)
+    # Mỗi khối bắt đầu từ một ô còn trống (theo thứ tự ngẫu nhiên) nên map dày vẫn sinh nhanh
+    rng.shuffle(free)
+    for x, y in free:
+        if walls >= target:
+            break
+        if grid[y][x] != " ":
+            continue
+        char = rng.choice(BLOB_CHARS)
+        for _ in range(rng.randint(*BLOB_SIZE)):
+            if grid[y][x] == " ":
+                grid[y][x] = char
+                walls += 1
+                if walls >= target:
+                    break
+            dx, dy = rng.choice(_STEPS)
+            # Giữ khối bên trong viền
+            x = min(max(x + dx, 1), cols - 2)
+            y = min(max(y + dy, 1), rows - 2)
+    return walls
+
+
+def _remove_walls(grid, cols, rows, target, rng):
+    """
+    Phá ngẫu nhiên các ô vật cản bên trong viền cho tới khi chỉ còn target ô.
+    """
+    walls = [(x, y) for y in range(1, rows - 1) for x in range(1, cols - 1) if grid[y][x] != " "]
+    rng.shuffle(walls)
+    for x, y in walls[:max(0, len(walls) - target)]:
+        grid[y][x] = " "
+
+
+def _carve_maze(grid, cols, rows, corridor, rng):
+    """
+    Đào mê cung bằng recursive backtracker (dùng stack, không đệ quy) vào grid toàn tường.
+    Mỗi "phòng" của mê cung là một khối corridor x corridor ô, cách nhau tường dày 1 ô.
+    """
+    step = corridor + 1
+    nx = (cols - 1) // step
+    ny = (rows - 1) // step
+
+    def open_block(x0, y0, w, h):
+        for y in range(y0, y0 + h):
+            for x in range(x0, x0 + w):
+                grid[y][x] = " "
+
+    if nx == 0 or ny == 0:
+        return
+    visited = [[False] * nx for _ in range(ny)]
+    start = (rng.randrange(nx), rng.randrange(ny))
+    visited[start[1]][start[0]] = True
+    open_block(1 + start[0] * step, 1 + start[1] * step, corridor, corridor)
+    stack = [start]
+    while stack:
+        cx, cy = stack[-1]
+        neighbors = [(cx + dx, cy + dy) for dx, dy in _STEPS
+                     if 0 <= cx + dx < nx and 0 <= cy + dy < ny and not visited[cy + dy][cx + dx]]
+        if not neighbors:
+            stack.pop()
+            continue
+        nx_, ny_ = rng.choice(neighbors)
+        visited[ny_][nx_] = True
+        # Phòng mới và bức tường giữa hai phòng
+        x0, y0 = 1 + nx_ * step, 1 + ny_ * step
+        open_block(x0, y0, corridor, corridor)
+        if nx_ != cx:
+            open_block(1 + max(cx, nx_) * step - 1, y0, 1, corridor)
+        else:
+            open_block(x0, 1 + max(cy, ny_) * step - 1, corridor, 1)
+        stack.append((nx_, ny_))
+
+
+def _connect(grid, cols, rows):
+    """
+    Nối mọi vùng ô trống (liên thông 4 hướng) vào vùng lớn nhất.
+
+    BFS nhiều nguồn từ vùng lớn nhất đi qua mọi ô bên trong viền (kể cả vật cản); khi gặp ô trống
+    của một vùng khác thì đào đường ngắn nhất theo cây BFS về vùng đã nối, rồi thêm cả vùng đó vào
+    làm nguồn. Mỗi ô được duyệt một lần nên chạy trong O(cols * rows).
+
+    Trả về:
+        số ô vật cản đã đào (0 nếu map đã liên thông)
+    """
+    # Gán nhãn các vùng trống, components[i] là list các ô của vùng i
+    label = [[-1] * cols for _ in range(rows)]
+    components = []
+    for y in range(1, rows - 1):
+        for x in range(1, cols - 1):
+            if grid[y][x] != " " or label[y][x] >= 0:
+                continue
+            comp = len(components)
+            label[y][x] = comp
+            cells = [(x, y)]
+            for px, py in cells:  # list tăng dần trong lúc duyệt: BFS không cần deque
+                for dx, dy in _STEPS:
+                    qx, qy = px + dx, py + dy
+                    if grid[qy][qx] == " " and label[qy][qx] < 0:
+                        label[qy][qx] = comp
+                        cells.append((qx, qy))
+            components.append(cells)
+    if len(components) <= 1:
+        return 0
+
+    parent = {}
+    joined = [False] * len(components)
+    queue = deque()
+
+    def join(comp):
+        # Đưa mọi ô của vùng comp vào làm nguồn BFS
+        joined[comp] = True
+        for cell in components[comp]:
+            parent[cell] = None
+            queue.append(cell)
+
+    carved = 0
+    join(max(range(len(components)), key=lambda i: len(components[i])))
+    while queue:
+        px, py = queue.popleft()
+        for dx, dy in _STEPS:
+            qx, qy = px + dx, py + dy
+            if not (0 < qx < cols - 1 and 0 < qy < rows - 1) or (qx, qy) in parent:
+                continue
+            parent[(qx, qy)] = (px, py)
+            comp = label[qy][qx]
+            if comp >= 0 and not joined[comp]:
+                # Đào đường từ ô trước đó về vùng đã nối
+                cell = (px, py)
+                while cell is not None and grid[cell[1]][cell[0]] != " ":
+                    grid[cell[1]][cell[0]] = " "
+                    carved += 1
+                    cell = parent[cell]
+                join(comp)
+            else:
+                queue.append((qx, qy))
+    return carved
+
+
+def generate_map(cols, rows, density=0.15, style="open", corridor=1, rng=None):
+    """
+    Sinh một map ngẫu nhiên có mọi ô trống liên thông.
+
+    Tham số:
+        cols, rows: kích thước map (kể cả viền), tối thiểu 3 x 3
+        density: tỉ lệ ô vật cản mong muốn bên trong viền (0 .. MAX_DENSITY)
+        style: "open" (khối vật cản rải rác) hoặc "maze" (mê cung)
+        corridor: độ rộng hành lang của mê cung (ô), chỉ dùng cho style "maze"
+        rng: random.Random của game (mặc định: module random)
+
+    Trả về:
+        list các dòng (chuỗi) theo định dạng map_design*.txt
+    """
+    if cols < 3 or rows < 3:
+        raise ValueError(f"Map phải có kích thước tối thiểu 3x3, nhận {cols}x{rows}")
+    if style not in STYLES:
+        raise ValueError(f"Style không hợp lệ: '{style}' (chọn một trong {', '.join(STYLES)})")
+    if corridor < 1:
+        raise ValueError(f"Độ rộng hành lang phải >= 1, nhận {corridor}")
+    rng = rng or random
+    density = min(max(density, 0.0), MAX_DENSITY)
+    # Luôn còn ít nhất một ô trống
+    target = min(int(round(density * (cols - 2) * (rows - 2))), (cols - 2) * (rows - 2) - 1)
+
+    if style == "maze":
+        grid = [[MAZE_WALL_CHAR] * cols for _ in range(rows)]
+        _carve_maze(grid, cols, rows, corridor, rng)
+    else:
+        grid = [[" "] * cols for _ in range(rows)]
+    for x in range(cols):
+        grid[0][x] = grid[rows - 1][x] = BORDER_CHAR
+    for y in range(rows):
+        grid[y][0] = grid[y][cols - 1] = BORDER_CHAR
+
+    # Đưa số ô vật cản về target: mê cung thường nhiều tường hơn, map thoáng thì rải thêm khối
+    if _add_blobs(grid, cols, rows, target, rng) > target:
+        _remove_walls(grid, cols, rows, target, rng)
+    # Bước nối vùng đào bớt vật cản; rải bù rồi nối lại vài lượt để mật độ gần target hơn
+    # (lượt cuối luôn là _connect nên map trả về luôn liên thông)
+    _connect(grid, cols, rows)
+    for _ in range(CONNECT_ROUNDS):
+        _add_blobs(grid, cols, rows, target, rng)
+        if not _connect(grid, cols, rows):
+            break
+    return ["".join(row) for row in grid]
+
+
+def wall_density(lines):
+    """
+    Tỉ lệ ô vật cản bên trong viền của map (list dòng).
+    """
+    inner = [line[1:-1] for line in lines[1:-1]]
+    cells = sum(len(line) for line in inner)
+    return sum(1 for line in inner for ch in line if ch in WALL_TILES) / cells if cells else 0.0
+
+
+def write_map(lines, filename):
+    """
+    Ghi map (list dòng) ra file theo định dạng map_design*.txt.
+    """
+    with open(filename, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _parse_size(text):
+    # "COLSxROWS" hoặc "N" (map vuông)
+    try:
+        parts = [int(v) for v in text.lower().split("x")]
+    except ValueError:
+        parts = []
+    if len(parts) == 1:
+        parts *= 2
+    if len(parts) != 2:
+        raise argparse.ArgumentTypeError(f"Kích thước không hợp lệ: '{text}' (dạng 100x60 hoặc 100)")
+    return tuple(parts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sinh map ngẫu nhiên cùng định dạng map_design*.txt")
+    parser.add_argument("--size", type=_parse_size, default=(25, 25),
+                        help="kích thước COLSxROWS hoặc N cho map vuông (mặc định 25x25)")
+    parser.add_argument("--density", type=float, default=0.15,
+                        help="tỉ lệ ô vật cản bên trong viền (mặc định 0.15)")
+    parser.add_argument("--style", choices=STYLES, default="open")
+    parser.add_argument("--corridor", type=int, default=1,
+                        help="độ rộng hành lang của style maze")
+    parser.add_argument("--count", type=int, default=1,
+                        help="số map cần sinh, map thứ i dùng seed + i")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed của map đầu tiên (mặc định: ngẫu nhiên, ghi trong tên file)")
+    parser.add_argument("--out", default=".",
+                        help="thư mục ghi map")
+    args = parser.parse_args(argv)
+
+    cols, rows = args.size
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 31)
+    os.makedirs(args.out, exist_ok=True)
+    for i in range(args.count):
+        try:
+            lines = generate_map(cols, rows, args.density, args.style, args.corridor, random.Random(seed + i))
+        except ValueError as e:
+            parser.error(str(e))
+        filename = os.path.join(args.out, f"map_gen_{args.style}_{cols}x{rows}_d{args.density:g}_s{seed + i}.txt")
+        write_map(lines, filename)
+        parse_map(lines, filename)  # Kiểm tra map đọc lại được như load_map_from_file
+        print(f"{filename}: mật độ vật cản {wall_density(lines):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,87 @@
 #map_handler.py
 import os
-import sys
 import random
+from array import array
+from collections import OrderedDict
 
-def load_map_from_file(filename, GRID_SIZE):
+from search_state import DIRECTIONS
+import map_artifact
+
+# Các ký tự tường/chướng ngại trong file thiết kế map
+WALL_TILES = ("T", "W", "X", "B", "H", "G")
+# Các loại vật phẩm
+OBJECT_TYPES = (0, 1, 2, 3, 4)
+
+class MapLoadError(ValueError):
     """
-    Đọc và tải bản đồ từ file thiết kế
+    File thiết kế map không đọc được hoặc sai định dạng (thay cho việc thoát chương trình).
+
+    Thuộc tính:
+        filename: file map
+        line: số dòng gây lỗi (bắt đầu từ 1), None nếu lỗi không thuộc dòng nào
+        reason: mô tả lỗi
+    """
+
+    def __init__(self, filename, reason, line=None):
+        self.filename = filename
+        self.line = line
+        self.reason = reason
+        where = f"{filename}:{line}" if line is not None else filename
+        super().__init__(f"{where}: {reason}")
+
+
+def load_map_from_file(filename, GRID_SIZE=None):
+    """
+    Đọc và tải bản đồ từ file thiết kế. Map là hình chữ nhật kích thước bất kỳ: số dòng là số
+    hàng, độ dài mỗi dòng là số cột (mọi dòng phải dài bằng nhau; dòng trống cuối file bị bỏ qua).
     
     Tham số:
         filename: Tên file thiết kế map
-        GRID_SIZE: Kích thước lưới (25x25)
+        GRID_SIZE: nếu có, map phải đúng GRID_SIZE x GRID_SIZE ô
     
     Trả về:
-        design_map: Ma trận 2D chứa thông tin bản đồ
+        design_map: Ma trận 2D chứa thông tin bản đồ (kích thước xem map_size)
+
+    Lỗi:
+        MapLoadError nếu file không tồn tại, rỗng, các dòng không đều hoặc sai kích thước GRID_SIZE
     """
     if not os.path.exists(filename):
-        print(f"File {filename} không tồn tại. Vui lòng tạo file thiết kế trước.")
-        sys.exit()
+        raise MapLoadError(filename, "file không tồn tại, vui lòng tạo file thiết kế trước")
 
     with open(filename, "r", encoding="utf-8") as f:
-        lines = f.readlines()
+        lines = [line.rstrip("\r\n") for line in f]
+    return parse_map(lines, filename, GRID_SIZE)
+
+
+def parse_map(lines, filename="<map>", GRID_SIZE=None):
+    """
+    Chuyển các dòng thiết kế map (định dạng như file map_design*.txt) thành ma trận map.
+
+    Tham số:
+        lines: list các dòng (không có ký tự xuống dòng)
+        filename: tên nguồn để ghi trong MapLoadError
+        GRID_SIZE: nếu có, map phải đúng GRID_SIZE x GRID_SIZE ô
+
+    Trả về:
+        design_map: Ma trận 2D chứa thông tin bản đồ
+    """
+    lines = list(lines)
+    while lines and not lines[-1]:
+        lines.pop()
 
-    if len(lines) != GRID_SIZE:
-        print("File map không đúng kích thước 25 dòng. Mỗi dòng cần 25 ký tự.")
-        sys.exit()
+    if not lines:
+        raise MapLoadError(filename, "file map rỗng")
+    cols = len(lines[0])
+    if GRID_SIZE is not None and (len(lines) != GRID_SIZE or cols != GRID_SIZE):
+        raise MapLoadError(filename, f"map {cols}x{len(lines)}, cần đúng {GRID_SIZE}x{GRID_SIZE} ô")
 
     design_map = []
-    for line in lines:
-        row = list(line.rstrip("\n"))
-        if len(row) != GRID_SIZE:
-            print("Một dòng không đủ 25 ký tự.", row)
-            sys.exit()
+    for number, line in enumerate(lines, 1):
+        if len(line) != cols:
+            raise MapLoadError(filename, f"dòng dài {len(line)} ký tự, các dòng trước dài {cols}", number)
         new_row = []
-        for ch in row:
-            if ch in ["T", "W", "X", "B", "H", "G"]:
+        for ch in line:
+            if ch in WALL_TILES:
                 new_row.append(ch)
             elif ch in ["0", "1", "2", "3", "4"]:
                 new_row.append(int(ch))
@@ -43,7 +91,171 @@ def load_map_from_file(filename, GRID_SIZE):
 
     return design_map
 
-def place_random_objects(map_tiles, GRID_SIZE, player_positions=None):
+
+def map_size(map_tiles):
+    """
+    Kích thước map (số cột, số hàng).
+    """
+    return (len(map_tiles[0]) if map_tiles else 0), len(map_tiles)
+
+
+def start_position(map_tiles):
+    """
+    Vị trí xuất phát của người chơi: ô giữa map, hoặc ô không phải tường gần ô giữa nhất nếu ô
+    giữa là tường (map tự sinh). Trả về (x, y).
+    """
+    cols, rows = map_size(map_tiles)
+    cx, cy = cols // 2, rows // 2
+    best = (cx, cy)
+    best_dist = None
+    for y, row in enumerate(map_tiles):
+        for x, tile in enumerate(row):
+            if tile in WALL_TILES:
+                continue
+            dist = abs(x - cx) + abs(y - cy)
+            if best_dist is None or dist < best_dist:
+                best, best_dist = (x, y), dist
+                if dist == 0:
+                    return best
+    return best
+
+
+# --- THẢ VẬT PHẨM NGẪU NHIÊN ---
+# Mỗi lần thả đặt PLACEMENTS vật phẩm vào các ô trống, mỗi vật phẩm được chọn đều ngẫu nhiên trong
+# các ô trống chưa bị chặn; ô vừa đặt và 8 ô xung quanh bị chặn (các vật phẩm cách nhau ít nhất
+# 1 ô), ô người chơi và xung quanh cũng bị chặn. Thay vì lọc lại danh sách ô hợp lệ cho từng vật
+# phẩm (bình phương theo số ô trống), các ô trống được giữ trong FreeCells: lấy mẫu O(1), chặn
+# một ô O(1) bằng swap-remove, các ô bị chặn tạm được trả lại sau khi thả. ObjectIndex giữ sẵn
+# FreeCells của map và cập nhật nó cùng add/remove, nên một lần thả trong game chỉ tốn O(số vật phẩm).
+
+# Số vật phẩm mỗi loại trong một lần thả
+PLACEMENTS = {
+    0: 2,
+    1: 3,
+    2: 4,
+    3: 5,
+    4: 6
+}
+
+# 8 ô xung quanh một ô (dx, dy)
+_AROUND = (
+    (-1, -1), (0, -1), (1, -1),
+    (-1, 0),           (1, 0),
+    (-1, 1),  (0, 1),  (1, 1)
+)
+
+
+class FreeCells:
+    """
+    Tập các ô trống (chỉ số y * cols + x) có chỉ mục: mảng các ô và vị trí của từng ô trong mảng,
+    nên thêm, xóa (đổi chỗ với ô cuối rồi bỏ ô cuối) và lấy mẫu ngẫu nhiên đều là O(1).
+
+    Thuộc tính:
+        rows, cols: kích thước map
+        cells: array các ô trong tập (thứ tự tùy ý)
+        slot: array vị trí của từng ô trong cells (-1 nếu không có trong tập)
+    """
+
+    __slots__ = ("rows", "cols", "cells", "slot")
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.cells = array("i")
+        self.slot = array("i", [-1]) * (rows * cols)
+
+    @classmethod
+    def from_map(cls, map_tiles):
+        """
+        Tập các ô " " của map_tiles.
+        """
+        rows = len(map_tiles)
+        cols = len(map_tiles[0]) if rows else 0
+        free = cls(rows, cols)
+        for y, row in enumerate(map_tiles):
+            for x, tile in enumerate(row):
+                if tile == " ":
+                    free.add(y * cols + x)
+        return free
+
+    def add(self, cell):
+        if self.slot[cell] < 0:
+            self.slot[cell] = len(self.cells)
+            self.cells.append(cell)
+
+    def discard(self, cell):
+        """
+        Bỏ cell khỏi tập; trả về True nếu cell có trong tập.
+        """
+        i = self.slot[cell]
+        if i < 0:
+            return False
+        last = self.cells.pop()
+        if last != cell:
+            self.cells[i] = last
+            self.slot[last] = i
+        self.slot[cell] = -1
+        return True
+
+    def sample(self, rng):
+        """
+        Một ô ngẫu nhiên (đều) trong tập; tập không được rỗng.
+        """
+        return self.cells[rng.randrange(len(self.cells))]
+
+    def __contains__(self, cell):
+        return self.slot[cell] >= 0
+
+    def __len__(self):
+        return len(self.cells)
+
+
+def _place_batch(map_tiles, free, player_positions, rng):
+    """
+    Chọn vị trí cho một lần thả PLACEMENTS trong các ô của free (không ghi vào map_tiles).
+    Ô đã chọn bị bỏ khỏi free; các ô chỉ bị chặn tạm (quanh vật phẩm, quanh người chơi) được
+    trả lại free trước khi trả về.
+
+    Trả về:
+        list (x, y, loại vật phẩm) theo thứ tự đặt
+    """
+    rows, cols = free.rows, free.cols
+    blocked = []
+
+    def block(x, y):
+        if 0 <= x < cols and 0 <= y < rows and free.discard(y * cols + x):
+            blocked.append(y * cols + x)
+
+    # Chặn vị trí của tất cả người chơi và các ô xung quanh
+    for player_x, player_y in player_positions:
+        block(player_x, player_y)
+        for dx, dy in _AROUND:
+            block(player_x + dx, player_y + dy)
+
+    placed = []
+    for obj_type, count in PLACEMENTS.items():
+        placed_type = 0
+        while placed_type < count:
+            if not free:
+                print(f"Không đủ ô trống để chèn vật thể loại {obj_type}")
+                break
+            cell = free.sample(rng)
+            free.discard(cell)
+            y, x = divmod(cell, cols)
+            if map_tiles[y][x] != " ":
+                continue  # Ô đã bị chiếm mà chỉ mục chưa biết (map bị sửa ngoài ObjectIndex)
+            placed.append((x, y, obj_type))
+            placed_type += 1
+            # Chặn các ô xung quanh vật phẩm vừa đặt
+            for dx, dy in _AROUND:
+                block(x + dx, y + dy)
+
+    for cell in blocked:
+        free.add(cell)
+    return placed
+
+
+def place_random_objects(map_tiles, GRID_SIZE=None, player_positions=None, object_index=None, rng=None):
     """
     Chèn các vật thể vào map theo số lượng:
       - 2 vật thể loại 0
@@ -57,75 +269,447 @@ def place_random_objects(map_tiles, GRID_SIZE, player_positions=None):
     
     Tham số:
         map_tiles: Ma trận 2D chứa thông tin bản đồ
-        GRID_SIZE: Kích thước lưới
+        GRID_SIZE: không còn dùng (kích thước được lấy từ map_tiles), giữ để tương thích
         player_positions: Danh sách các vị trí người chơi [(x1, y1), (x2, y2), ...]
+        object_index: ObjectIndex của game (nếu có) để ghi nhận các vật phẩm vừa đặt; các ô trống
+                      được lấy từ chỉ mục của nó thay vì quét lại map
+        rng: random.Random dùng để chọn vị trí (mặc định module random); cùng seed cho cùng cách đặt
     """
-    # Định nghĩa số lượng cho từng loại vật thể
-    placements = {
-        0: 2,
-        1: 3,
-        2: 4,
-        3: 5,
-        4: 6
-    }
-    
-    # Khởi tạo player_positions nếu không được cung cấp
-    if player_positions is None:
-        player_positions = []
-    
-    # Tìm tất cả các vị trí ô trống ban đầu
-    valid_positions = []
-    for i in range(GRID_SIZE):
-        for j in range(GRID_SIZE):
-            if map_tiles[i][j] == " ":  # Ô trống
-                valid_positions.append((i, j))
-    
-    # Danh sách vị trí đã bị chặn (bao gồm vật thể và các ô xung quanh)
-    blocked_positions = set()
-    
-    # Hướng di chuyển để kiểm tra các ô lân cận (8 hướng)
-    directions = [
-        (-1, -1), (-1, 0), (-1, 1),
-        (0, -1),           (0, 1),
-        (1, -1),  (1, 0),  (1, 1)
-    ]
-    
-    # Thêm vị trí của tất cả người chơi và các ô xung quanh vào danh sách bị chặn
-    for player_pos in player_positions:
-        player_x, player_y = player_pos
-        player_pos_grid = (player_y, player_x)  # Chuyển từ (x, y) sang (hàng, cột)
-        
-        blocked_positions.add(player_pos_grid)
-        for di, dj in directions:
-            ni, nj = player_pos_grid[0] + di, player_pos_grid[1] + dj
-            if 0 <= ni < GRID_SIZE and 0 <= nj < GRID_SIZE:
-                blocked_positions.add((ni, nj))
-    
-    # Với mỗi loại vật thể, chèn số lượng theo yêu cầu
-    for obj_type, count in placements.items():
-        placed = 0
-        while placed < count and valid_positions:
-            # Lọc ra các vị trí hợp lệ (không bị chặn)
-            current_valid = [pos for pos in valid_positions if pos not in blocked_positions]
-            
-            if not current_valid:
-                print(f"Không đủ ô trống để chèn vật thể loại {obj_type}")
-                break
-                
-            # Chọn ngẫu nhiên một vị trí hợp lệ
-            pos = random.choice(current_valid)
-            i, j = pos
-            
-            # Đặt vật thể
-            map_tiles[i][j] = obj_type
-            placed += 1
-            
-            # Loại bỏ vị trí đã chọn khỏi danh sách các vị trí hợp lệ
-            valid_positions.remove(pos)
-            
-            # Đánh dấu vị trí đã đặt và các ô lân cận là đã bị chặn
-            blocked_positions.add(pos)
-            for di, dj in directions:
-                ni, nj = i + di, j + dj
-                if 0 <= ni < GRID_SIZE and 0 <= nj < GRID_SIZE:
-                    blocked_positions.add((ni, nj)) 
\ No newline at end of file
+    if rng is None:
+        rng = random
+    if object_index is not None:
+        free = object_index.free_cells(map_tiles)
+    else:
+        free = FreeCells.from_map(map_tiles)
+
+    for x, y, obj_type in _place_batch(map_tiles, free, player_positions or (), rng):
+        # Đặt vật thể (object_index.add bỏ ô khỏi chỉ mục ô trống của nó)
+        map_tiles[y][x] = obj_type
+        if object_index is not None:
+            object_index.add((x, y), obj_type)
+
+
+def generate_layouts(map_tiles, count, player_positions=None, rng=None):
+    """
+    Sinh count cách thả vật phẩm độc lập trên cùng một map mà không sửa map_tiles (vd. tạo sẵn
+    nhiều ván cho huấn luyện Q-learning hoặc benchmark). Chỉ mục ô trống chỉ được dựng một lần,
+    mỗi cách thả tốn O(số vật phẩm).
+
+    Tham số:
+        map_tiles: map gốc (các ô " " là ô có thể thả)
+        count: số cách thả cần sinh
+        player_positions: vị trí người chơi cần tránh [(x, y), ...]
+        rng: random.Random (mặc định module random)
+
+    Trả về:
+        list các cách thả, mỗi cách thả là list (x, y, loại vật phẩm)
+    """
+    if rng is None:
+        rng = random
+    free = FreeCells.from_map(map_tiles)
+    layouts = []
+    for _ in range(count):
+        placed = _place_batch(map_tiles, free, player_positions or (), rng)
+        # Trả các ô đã đặt lại cho tập ô trống trước khi sinh cách thả tiếp theo
+        for x, y, _obj in placed:
+            free.add(y * free.cols + x)
+        layouts.append(placed)
+    return layouts
+
+# --- CHỈ MỤC VẬT PHẨM ---
+class ObjectIndex:
+    """
+    Chỉ mục các vật phẩm đang có trên map theo loại, được cập nhật tăng dần khi nhặt
+    hoặc thả vật phẩm thay vì quét lại toàn bộ map_tiles.
+
+    Thuộc tính:
+        positions: dict loại vật phẩm -> set các vị trí (x, y)
+        version: tăng lên mỗi khi chỉ mục thay đổi
+        signature: chữ ký của tập vật phẩm (XOR hash từng (vị trí, loại)), cập nhật O(1),
+                   hai map có cùng vật phẩm thì cùng chữ ký (dùng làm khóa cache)
+    """
+
+    def __init__(self, map_tiles=None):
+        self.positions = {obj_type: set() for obj_type in OBJECT_TYPES}
+        self.version = 0
+        self.signature = 0
+        # Trường khoảng cách theo loại (distance_field.TypeDistanceFields), dựng khi cần lần đầu
+        self._fields = None
+        self._fields_cols = 0
+        # Các ô trống để thả vật phẩm (FreeCells) của map _free_map, dựng khi cần lần đầu
+        self._free = None
+        self._free_map = None
+        if map_tiles is not None:
+            self.rebuild(map_tiles)
+
+    def rebuild(self, map_tiles):
+        """
+        Dựng lại chỉ mục từ map_tiles (dùng khi map được thay mới hoàn toàn).
+        """
+        for cells in self.positions.values():
+            cells.clear()
+        self.signature = 0
+        for y, row in enumerate(map_tiles):
+            for x, cell in enumerate(row):
+                if isinstance(cell, int):
+                    self.positions[cell].add((x, y))
+                    self.signature ^= hash(((x, y), cell))
+        self.version += 1
+        self._fields = None
+        self._free = None
+
+    def add(self, pos, obj_type):
+        cells = self.positions[obj_type]
+        if pos not in cells:
+            cells.add(pos)
+            self.signature ^= hash((pos, obj_type))
+        self.version += 1
+        if self._fields is not None:
+            self._fields.add(pos[1] * self._fields_cols + pos[0], obj_type)
+        if self._free is not None:
+            self._free.discard(pos[1] * self._free.cols + pos[0])
+
+    def remove(self, pos, obj_type):
+        cells = self.positions[obj_type]
+        if pos in cells:
+            cells.discard(pos)
+            self.signature ^= hash((pos, obj_type))
+        self.version += 1
+        if self._fields is not None:
+            self._fields.remove(pos[1] * self._fields_cols + pos[0], obj_type)
+        if self._free is not None:
+            self._free.add(pos[1] * self._free.cols + pos[0])
+
+    def distance_fields(self, cmap):
+        """
+        Trường khoảng cách tới vật phẩm gần nhất theo loại cho bố cục của cmap
+        (distance_field.TypeDistanceFields). Dựng lần đầu khi được gọi, sau đó được
+        cập nhật tăng dần cùng add/remove thay vì tính lại ở mỗi bước game.
+        """
+        from distance_field import TypeDistanceFields
+
+        distances = cmap.distances
+        if self._fields is None or self._fields.distances is not distances:
+            cells_by_type = {
+                obj_type: [y * cmap.cols + x for x, y in cells]
+                for obj_type, cells in self.positions.items()
+            }
+            self._fields = TypeDistanceFields(distances, cells_by_type)
+            self._fields_cols = cmap.cols
+        return self._fields
+
+    def free_cells(self, map_tiles):
+        """
+        Các ô trống của map_tiles (FreeCells) để thả vật phẩm. Dựng lần đầu khi được gọi (hoặc khi
+        map được thay bằng list khác), sau đó được cập nhật cùng add/remove: ô nhặt xong vật phẩm
+        trở lại tập ô trống.
+        """
+        if self._free is None or self._free_map is not map_tiles:
+            self._free = FreeCells.from_map(map_tiles)
+            self._free_map = map_tiles
+        return self._free
+
+    def count(self, obj_type=None):
+        """
+        Số vật phẩm loại obj_type (hoặc tất cả nếu None) còn trên map.
+        """
+        if obj_type is None:
+            return sum(len(cells) for cells in self.positions.values())
+        return len(self.positions.get(obj_type, ()))
+
+    def has(self, obj_type=None):
+        """
+        True nếu map còn vật phẩm loại obj_type (hoặc bất kỳ nếu None).
+        """
+        if obj_type is None:
+            return any(self.positions.values())
+        return bool(self.positions.get(obj_type))
+
+    def positions_of(self, obj_type=None):
+        """
+        Danh sách vị trí (x, y) các vật phẩm loại obj_type (hoặc tất cả nếu None).
+        """
+        if obj_type is None:
+            return [pos for cells in self.positions.values() for pos in cells]
+        return list(self.positions.get(obj_type, ()))
+
+    def __len__(self):
+        return self.count()
+
+
+# --- MAP ĐÃ BIÊN DỊCH CHO CÁC THUẬT TOÁN TÌM ĐƯỜNG ---
+# Bố cục tường không đổi trong suốt một ván chơi, nên bảng ô đi được, bảng ô kề và bảng
+# khoảng cách chỉ được tính một lần cho mỗi bố cục (lưu cache theo bố cục tường). Chỉ
+# mảng loại vật phẩm được cập nhật lại theo map_tiles hiện tại mỗi lần biên dịch.
+_LAYOUT_CACHE = {}
+_LAYOUT_CACHE_SIZE = 16
+
+# Giá trị khoảng cách khi hai ô không thông nhau
+UNREACHABLE = 0xFFFF
+# Số ô đi được tối đa để tính sẵn toàn bộ bảng khoảng cách (1024^2 * 2 byte = 2MB),
+# map lớn hơn thì mỗi hàng được tính khi cần lần đầu
+_DIST_EAGER_LIMIT = 1024
+# Bộ nhớ tối đa cho các hàng đã tính của một bảng khoảng cách. Bảng đầy đủ tốn count^2 * 2 byte
+# (map 250x250: ~6GB), nên map lớn chỉ giữ các hàng dùng gần đây (LRU), hàng bị bỏ được tính lại
+# khi cần; map nhỏ luôn giữ đủ mọi hàng
+_DIST_ROW_BUDGET = 64 * 1024 * 1024
+
+
+class DistanceTable:
+    """
+    Khoảng cách đường đi ngắn nhất thật (chỉ tránh tường) giữa mọi cặp ô đi được.
+
+    Các ô đi được được đánh lại chỉ số liên tục 0..count-1; mỗi hàng (khoảng cách từ một ô tới mọi
+    ô đi được) là một array('H') count phần tử, tính bằng BFS khi cần lần đầu (hoặc sao ra từ bảng
+    matrix đã biên dịch trên đĩa, xem map_artifact.py); dist(a, b) là một phép tra O(1) khi hàng
+    của a đã có.
+    """
+
+    __slots__ = ("count", "index", "neighbors", "max_rows", "matrix", "_rows")
+
+    def __init__(self, walkable, neighbors, matrix=None):
+        self.index = array("i", [-1]) * len(walkable)
+        count = 0
+        for cell, ok in enumerate(walkable):
+            if ok:
+                self.index[cell] = count
+                count += 1
+        self.count = count
+        self.neighbors = neighbors
+        # numpy.memmap (count, count) của map đã biên dịch, None nếu phải tự tính bằng BFS
+        self.matrix = matrix
+        self.max_rows = max(1, min(count, _DIST_ROW_BUDGET // (2 * max(count, 1))))
+        # chỉ số hàng -> array('H'), theo thứ tự dùng gần đây khi phải bỏ bớt hàng
+        self._rows = OrderedDict()
+        if count <= _DIST_EAGER_LIMIT and matrix is None:
+            for cell, idx in enumerate(self.index):
+                if idx >= 0:
+                    self._rows[idx] = self._fill_row(cell, idx)
+
+    def _fill_row(self, source, src_idx):
+        """
+        BFS từ source (hoặc sao từ matrix nếu có), trả về hàng khoảng cách của nó.
+        """
+        if self.matrix is not None:
+            row = array("H")
+            row.frombytes(self.matrix[src_idx].tobytes())
+            return row
+        index = self.index
+        neighbors = self.neighbors
+        row = array("H", [UNREACHABLE]) * self.count
+        row[src_idx] = 0
+        frontier = [source]
+        d = 0
+        while frontier:
+            d += 1
+            next_frontier = []
+            for cell in frontier:
+                for _, ncell in neighbors[cell]:
+                    pos = index[ncell]
+                    if row[pos] == UNREACHABLE:
+                        row[pos] = d
+                        next_frontier.append(ncell)
+            frontier = next_frontier
+        return row
+
+    def row(self, cell):
+        """
+        Hàng khoảng cách từ cell tới mọi ô đi được (theo index), tính nếu chưa có; None nếu là tường.
+        """
+        idx = self.index[cell]
+        if idx < 0:
+            return None
+        rows = self._rows
+        row = rows.get(idx)
+        if row is None:
+            row = self._fill_row(cell, idx)
+            rows[idx] = row
+            if len(rows) > self.max_rows:
+                rows.popitem(last=False)
+        elif self.max_rows < self.count:
+            rows.move_to_end(idx)
+        return row
+
+    def complete(self):
+        """
+        True nếu đã có đủ mọi hàng (trong bộ nhớ hoặc trong matrix).
+        """
+        return self.matrix is not None or len(self._rows) == self.count
+
+    def all_rows(self):
+        """
+        Mọi hàng theo thứ tự chỉ số; hàng chưa có được tính nhưng không giữ lại (để ghi ra đĩa).
+        """
+        for cell, idx in enumerate(self.index):
+            if idx >= 0:
+                row = self._rows.get(idx)
+                yield row if row is not None else self._fill_row(cell, idx)
+
+    def dist(self, a, b):
+        """
+        Khoảng cách giữa ô a và ô b (số bước), UNREACHABLE nếu không thông nhau.
+        """
+        row = self.row(a)
+        idx = self.index[b]
+        if row is None or idx < 0:
+            return UNREACHABLE
+        return row[idx]
+
+
+class _Layout:
+    """
+    Các bảng phụ thuộc riêng vào bố cục tường, dùng chung giữa các lần biên dịch.
+
+    Bảng ô kề (và bảng khoảng cách nếu có) được đọc từ file đã biên dịch trên đĩa khi có
+    (map_artifact.py); nếu chưa có thì được dựng rồi lưu lại cho các tiến trình sau.
+    """
+
+    __slots__ = ("rows", "cols", "walkable", "neighbors", "step", "_matrix", "_distances")
+
+    def __init__(self, rows, cols, walkable):
+        self.rows = rows
+        self.cols = cols
+        self.walkable = walkable
+        self._distances = None
+        artifact = map_artifact.load_artifact(rows, cols, walkable)
+        if artifact is not None:
+            self.step = artifact.step
+            self.neighbors = _neighbors_from_step(self.step)
+            self._matrix = artifact.distances
+            return
+        self.neighbors, self.step = _build_layout(rows, cols, walkable)
+        self._matrix = None
+        if sum(walkable) > _DIST_EAGER_LIMIT:
+            # Map lớn: bảng khoảng cách không tự lưu (xem map_artifact.py), chỉ lưu bảng ô kề
+            self.save()
+
+    @property
+    def distances(self):
+        # Bảng khoảng cách chỉ được dựng khi có thuật toán cần tới
+        if self._distances is None:
+            self._distances = DistanceTable(self.walkable, self.neighbors, self._matrix)
+            if self._matrix is None and self._distances.complete():
+                # Map nhỏ: bảng đã tính đủ, lưu lại để tiến trình sau khỏi tính
+                self.save(full=True)
+        return self._distances
+
+    def save(self, full=False):
+        """
+        Lưu bố cục ra file đã biên dịch; full=True thì kèm mọi hàng khoảng cách.
+
+        Trả về:
+            True nếu đã ghi file
+        """
+        count = sum(self.walkable)
+        dist_rows = self.distances.all_rows() if full else None
+        return map_artifact.save_artifact(self.rows, self.cols, self.walkable, self.step, count, dist_rows)
+
+
+class CompiledMap:
+    """
+    Dạng biên dịch của map_tiles, đánh chỉ số ô theo cell = y * cols + x.
+
+    Thuộc tính:
+        rows, cols, size: kích thước map
+        walkable: bytearray, 1 nếu ô đi được (ô trống hoặc có vật phẩm)
+        neighbors: tuple theo ô -> tuple các (mã hướng, ô kề đi được), theo thứ tự DIRECTIONS
+        step: array phẳng step[cell * 4 + mã hướng] -> ô kề, -1 nếu bị chặn
+        obj_type: array theo ô -> loại vật phẩm (0..4), -1 nếu không có
+        distances: DistanceTable của bố cục (dựng khi dùng lần đầu)
+    """
+
+    __slots__ = ("rows", "cols", "size", "walkable", "neighbors", "step", "obj_type", "layout")
+
+    def cell_of(self, pos):
+        x, y = pos
+        return y * self.cols + x
+
+    def pos_of(self, cell):
+        return (cell % self.cols, cell // self.cols)
+
+    @property
+    def distances(self):
+        return self.layout.distances
+
+    def dist(self, a, b):
+        """
+        Khoảng cách đường đi thật giữa hai ô a, b (chỉ số ô), UNREACHABLE nếu không thông nhau.
+        """
+        return self.layout.distances.dist(a, b)
+
+
+def _build_layout(rows, cols, walkable):
+    """
+    Tính bảng ô kề cho một bố cục tường.
+    """
+    size = rows * cols
+    step = array("i", [-1]) * (size * 4)
+    neighbors = []
+    for cell in range(size):
+        x, y = cell % cols, cell // cols
+        adj = []
+        if walkable[cell]:
+            for code, (_, (dx, dy)) in enumerate(DIRECTIONS):
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < cols and 0 <= ny < rows:
+                    ncell = ny * cols + nx
+                    if walkable[ncell]:
+                        step[cell * 4 + code] = ncell
+                        adj.append((code, ncell))
+        neighbors.append(tuple(adj))
+    return tuple(neighbors), step
+
+
+def _neighbors_from_step(step):
+    """
+    Dựng lại bảng ô kề (theo thứ tự DIRECTIONS) từ bảng step.
+    """
+    directions = range(len(DIRECTIONS))
+    neighbors = []
+    for base in range(0, len(step), 4):
+        neighbors.append(tuple((code, step[base + code]) for code in directions if step[base + code] >= 0))
+    return tuple(neighbors)
+
+
+def compile_map(map_tiles):
+    """
+    Biên dịch map_tiles thành CompiledMap dùng chung cho các thuật toán tìm đường.
+
+    Tham số:
+        map_tiles: Ma trận 2D chứa thông tin bản đồ
+
+    Trả về:
+        CompiledMap (bảng ô kề, bảng khoảng cách dùng chung với các map cùng bố cục tường)
+    """
+    rows = len(map_tiles)
+    cols = len(map_tiles[0])
+    walkable = bytearray(rows * cols)
+    obj_type = array("b", [-1]) * (rows * cols)
+    cell = 0
+    for row in map_tiles:
+        for tile in row:
+            if isinstance(tile, int):
+                walkable[cell] = 1
+                obj_type[cell] = tile
+            elif tile == " ":
+                walkable[cell] = 1
+            cell += 1
+
+    key = (cols, bytes(walkable))
+    layout = _LAYOUT_CACHE.get(key)
+    if layout is None:
+        if len(_LAYOUT_CACHE) >= _LAYOUT_CACHE_SIZE:
+            _LAYOUT_CACHE.clear()
+        layout = _Layout(rows, cols, walkable)
+        _LAYOUT_CACHE[key] = layout
+
+    cmap = CompiledMap()
+    cmap.rows = rows
+    cmap.cols = cols
+    cmap.size = rows * cols
+    cmap.layout = layout
+    cmap.walkable = layout.walkable
+    cmap.neighbors = layout.neighbors
+    cmap.step = layout.step
+    cmap.obj_type = obj_type
+    return cmap
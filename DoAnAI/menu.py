@@ -4,9 +4,14 @@ import subprocess  # For launching the game file
 import os
 import threading
 
+from seeding import parse_seed, seed_args
+
 pygame.init()
 pygame.mixer.init()
 
+# python menu.py --seed N: chuyển seed sang các chế độ chơi được mở từ menu (xem seeding.py)
+SEED = parse_seed()
+
 # Screen settings
 SCREEN_WIDTH = 675
 SCREEN_HEIGHT = 760
@@ -247,7 +252,7 @@ def start_game():
     try:
         pygame.display.quit()
         
-        subprocess.run([sys.executable, "main.py"], check=True)
+        subprocess.run([sys.executable, "main.py"] + seed_args(SEED), check=True)
         
         pygame.init()
         pygame.mixer.init()
@@ -264,7 +269,7 @@ def start_ai_game():
     try:
         pygame.display.quit()
         
-        subprocess.run([sys.executable, "playAI5.py"], check=True)
+        subprocess.run([sys.executable, "playAI5.py"] + seed_args(SEED), check=True)
         
         pygame.init()
         pygame.mixer.init()
@@ -281,7 +286,7 @@ def start_battle_ai():
     try:
         pygame.display.quit()
         
-        subprocess.run([sys.executable, "battleAI.py"], check=True)
+        subprocess.run([sys.executable, "battleAI.py"] + seed_args(SEED), check=True)
         
         pygame.init()
         pygame.mixer.init()
@@ -0,0 +1,104 @@
+# --- CACHE KẾT QUẢ TÌM ĐƯỜNG ---
+# Các front-end (playAI5.py, battleAI.py) tìm đường lại sau mỗi lần đi hết đường, thả vật phẩm
+# hay bị lấy mất vật phẩm, và rất hay lặp lại đúng truy vấn cũ (sau Reset, sau các lần bấm Step).
+# PlannerCache ghi nhớ kết quả theo (thuật toán, bố cục tường, chữ ký vật phẩm trên map, vị trí,
+# túi):
+#   - chữ ký là ObjectIndex.signature, được cập nhật O(1) mỗi lần thêm/bớt vật phẩm, nên map
+#     thay đổi thì khóa tự khác đi (không cần xóa cache thủ công), map quay về trạng thái cũ
+#     (Reset) thì lại trúng cache
+#   - chữ ký là XOR các hash nên hai tập vật phẩm khác nhau có thể trùng chữ ký: mỗi mục lưu kèm
+#     tập vật phẩm lúc tính và chỉ được dùng khi tập đó đúng bằng tập hiện tại
+#   - bố cục tường là compile_map(map_tiles).layout (dùng chung cho mọi map cùng bố cục tường),
+#     front-end biên dịch một lần khi nạp map rồi truyền vào, nên đường đi của map này không bao
+#     giờ bị trả cho map khác mà mỗi lần tra không phải quét lại map
+#   - chỉ các thuật toán tất định mới được cache (SA, AND-OR có ngẫu nhiên, Q-learning phụ thuộc
+#     Q-table trên đĩa)
+#   - số mục giới hạn, bỏ mục ít được dùng gần đây nhất (LRU) khi đầy
+
+from collections import OrderedDict
+
+from planner_registry import deterministic_names
+
+# Các thuật toán cho cùng kết quả với cùng đầu vào (khả năng deterministic trong planner_registry.py)
+DETERMINISTIC_ALGORITHMS = deterministic_names()
+
+
+class PlannerCache:
+    """
+    Cache LRU kết quả tìm đường theo (thuật toán, bố cục tường, ObjectIndex.signature, vị trí, túi).
+
+    Thuộc tính:
+        maxsize: số mục tối đa
+        hits: số lần tra trúng cache
+        misses: số lần tra trượt (chỉ tính các thuật toán được cache)
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def cacheable(algorithm):
+        return algorithm in DETERMINISTIC_ALGORITHMS
+
+    @staticmethod
+    def _objects(object_index):
+        return frozenset((pos, obj_type) for obj_type, cells in object_index.positions.items() for pos in cells)
+
+    @staticmethod
+    def _same_objects(objects, object_index):
+        # Tập vật phẩm đã lưu có đúng bằng tập hiện tại không (không dựng lại frozenset)
+        positions = object_index.positions
+        return len(objects) == object_index.count() and all(pos in positions[obj_type] for pos, obj_type in objects)
+
+    def get(self, algorithm, layout, object_index, pos, bag):
+        """
+        Tra đường đi đã tính cho truy vấn.
+
+        Tham số:
+            algorithm: tên thuật toán
+            layout: bố cục tường của map đang chơi (compile_map(map_tiles).layout)
+            object_index: ObjectIndex của game (trạng thái vật phẩm hiện tại)
+            pos: vị trí (x, y) của người chơi
+            bag: túi hiện tại
+
+        Trả về:
+            list (direction, (x, y)) mới nếu trúng cache, None nếu trượt hoặc thuật toán không được cache
+        """
+        if not self.cacheable(algorithm):
+            return None
+        key = (algorithm, layout, object_index.signature, pos, tuple(bag))
+        entry = self._entries.get(key)
+        if entry is None or not self._same_objects(entry[0], object_index):
+            # Trượt, hoặc trùng chữ ký với một tập vật phẩm khác
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return list(entry[1])
+
+    def put(self, algorithm, layout, object_index, pos, bag, path):
+        """
+        Lưu đường đi vừa tính cho truy vấn (bỏ qua nếu thuật toán không được cache).
+        """
+        if not self.cacheable(algorithm):
+            return
+        key = (algorithm, layout, object_index.signature, pos, tuple(bag))
+        self._entries[key] = (self._objects(object_index), tuple(path))
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Xóa toàn bộ cache (playAI5 dùng khi nạp map khác để giải phóng các mục của map cũ).
+        """
+        self._entries.clear()
+
+    def stats_text(self):
+        return f"Cache: {self.hits} hit / {self.misses} miss"
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,188 @@
+import importlib
+
+# --- DANH SÁCH PLANNER (REGISTRY) ---
+# Mỗi thuật toán tìm đường được đăng ký một lần ở đây: tên (như trong dropdown), module và hàm /
+# lớp tạo ra nó, cùng các khả năng. Các front-end (playAI5.py, battleAI.py, savedGIF.py), cache
+# đường đi và công cụ benchmark đều lấy danh sách thuật toán từ đây thay vì tự liệt kê và tự
+# rẽ nhánh if/elif theo tên.
+#   - module chỉ được import khi planner được tạo lần đầu (importlib), nên các module nặng
+#     (searchQLearning: numpy, đọc Q-table bằng pickle) chỉ được nạp khi thực sự được chọn
+#   - mọi planner được gọi cùng một kiểu: planner.plan(map_tiles, start_pos, bag, object_index)
+#     và có reset() (planner có trạng thái bỏ trạng thái khi đổi map / Reset ván)
+#
+# Khả năng của một planner:
+#   - deterministic: cùng đầu vào cho cùng đường đi (được PlannerCache cache)
+#   - stateful: giữ trạng thái giữa các lần gọi (mỗi người chơi cần một đối tượng riêng)
+#   - anytime: có thể dừng giữa chừng với đường tốt nhất đã có, gọi lại thì cải thiện tiếp
+#   - deadline: nhận tham số deadline_ms (giới hạn thời gian suy nghĩ)
+#   - randomized: có lựa chọn ngẫu nhiên, nhận tham số rng (random.Random của game, xem seeding.py)
+#   - modes: các front-end liệt kê planner ("single": playAI5, "battle": battleAI)
+
+SINGLE = "single"
+BATTLE = "battle"
+
+
+class PlannerSpec:
+    """
+    Mô tả một planner đã đăng ký.
+
+    Thuộc tính:
+        name: tên thuật toán (như trong dropdown)
+        module, attr: module và tên hàm tìm đường (hoặc lớp nếu stateful, nhận deadline_ms / rng
+                      qua hàm khởi tạo) trong module
+        deterministic, stateful, anytime, deadline, randomized: các khả năng (xem đầu file)
+        modes: frozenset các front-end liệt kê planner này
+    """
+
+    __slots__ = ("name", "module", "attr", "deterministic", "stateful", "anytime", "deadline", "randomized",
+                 "modes")
+
+    def __init__(self, name, module, attr, deterministic=False, stateful=False, anytime=False,
+                 deadline=False, randomized=False, modes=(SINGLE, BATTLE)):
+        self.name = name
+        self.module = module
+        self.attr = attr
+        self.deterministic = deterministic
+        self.stateful = stateful
+        self.anytime = anytime
+        self.deadline = deadline
+        self.randomized = randomized
+        self.modes = frozenset(modes)
+
+    def load(self):
+        """
+        Import module của planner (lần đầu) và trả về hàm / lớp đã đăng ký.
+        """
+        return getattr(importlib.import_module(self.module), self.attr)
+
+    def create(self, deadline_ms=None, rng=None):
+        """
+        Tạo một planner mới có plan(map_tiles, start_pos, bag, object_index) và reset().
+
+        Tham số:
+            deadline_ms: thời hạn suy nghĩ, chỉ truyền cho planner có khả năng deadline
+            rng: random.Random của game, chỉ truyền cho planner có khả năng randomized
+        """
+        factory = self.load()
+        options = {}
+        if self.deadline and deadline_ms is not None:
+            options["deadline_ms"] = deadline_ms
+        if self.randomized and rng is not None:
+            options["rng"] = rng
+        if self.stateful:
+            # Lớp planner nhận các tùy chọn qua hàm khởi tạo
+            return factory(**options)
+        return _FunctionPlanner(factory, options)
+
+
+class _FunctionPlanner:
+    """
+    Bọc hàm *_search (không trạng thái) thành planner cùng kiểu với các lớp có trạng thái.
+    """
+
+    __slots__ = ("func", "options")
+
+    def __init__(self, func, options):
+        self.func = func
+        self.options = options
+
+    def plan(self, map_tiles, start_pos, bag, object_index=None):
+        return self.func(map_tiles, start_pos, bag, object_index=object_index, **self.options)
+
+    def reset(self):
+        pass
+
+
+_REGISTRY = {}
+
+
+def register(spec):
+    """
+    Đăng ký một planner (thứ tự đăng ký là thứ tự hiện trong dropdown).
+    """
+    if spec.name in _REGISTRY:
+        raise ValueError(f"Planner '{spec.name}' đã được đăng ký")
+    _REGISTRY[spec.name] = spec
+    return spec
+
+
+def get_spec(name):
+    """
+    PlannerSpec theo tên; KeyError nếu chưa đăng ký.
+    """
+    try:
+        return _REGISTRY[name]
+    except KeyError:
+        raise KeyError(f"Không có planner '{name}'") from None
+
+
+def planner_names(mode=None):
+    """
+    Tên các planner theo thứ tự đăng ký (chỉ các planner của front-end mode nếu có).
+    """
+    return [name for name, spec in _REGISTRY.items() if mode is None or mode in spec.modes]
+
+
+def deterministic_names():
+    """
+    Tên các planner cho cùng kết quả với cùng đầu vào.
+    """
+    return frozenset(name for name, spec in _REGISTRY.items() if spec.deterministic)
+
+
+class PlannerSet:
+    """
+    Các planner của một người chơi (AI), tạo lười khi thuật toán được chọn lần đầu; planner có
+    trạng thái được giữ lại giữa các lần gọi.
+
+    Tham số khởi tạo:
+        deadline_ms: thời hạn suy nghĩ cho các planner có khả năng deadline
+        rng: random.Random của game cho các planner có khả năng randomized
+    """
+
+    def __init__(self, deadline_ms=None, rng=None):
+        self.deadline_ms = deadline_ms
+        self.rng = rng
+        self._planners = {}
+
+    def get(self, name):
+        planner = self._planners.get(name)
+        if planner is None:
+            planner = get_spec(name).create(self.deadline_ms, self.rng)
+            self._planners[name] = planner
+        return planner
+
+    def plan(self, name, map_tiles, start_pos, bag, object_index=None):
+        """
+        Tìm đường bằng planner name (SearchResult).
+        """
+        return self.get(name).plan(map_tiles, start_pos, bag, object_index)
+
+    def reset(self):
+        """
+        Bỏ trạng thái của mọi planner đã tạo (dùng khi đổi map hoặc Reset ván chơi).
+        """
+        for planner in self._planners.values():
+            planner.reset()
+
+
+# Nearest bỏ qua luật combo (người chơi không thành thạo), chỉ dùng làm đối thủ trong battleAI
+register(PlannerSpec("Nearest", "searchNearestOnly", "search_only_nearest", deterministic=True, modes=(BATTLE,)))
+register(PlannerSpec("BFS", "searchBFS", "bfs_search", deterministic=True))
+register(PlannerSpec("DFS", "searchDFS", "dfs_search", deterministic=True))
+register(PlannerSpec("A_Star", "searchAStar", "astar_search", deterministic=True))
+register(PlannerSpec("Simulated_Annealing", "searchSimulatedAnnealing", "simulated_annealing_search",
+                     randomized=True))
+register(PlannerSpec("Nondeterministic", "searchNondeterministic", "nondeterministic_search", randomized=True))
+register(PlannerSpec("BTwForwardChecking", "searchBacktrackingWithFowardChecking",
+                     "backtracking_with_forward_checking", deterministic=True))
+# Q-learning phụ thuộc Q-table trên đĩa nên không được cache
+register(PlannerSpec("QLearning", "searchQLearning", "qlearning_search", randomized=True))
+# D* Lite sửa cây tìm kiếm theo các thay đổi do AI khác gây ra, chỉ có ích trong trận đấu
+register(PlannerSpec("D_Star_Lite", "searchDStarLite", "IncrementalPlanner", stateful=True, modes=(BATTLE,)))
+# ARA* giữ các phiên tìm kiếm của từng người chơi để tiếp tục cải thiện ở lần gọi sau
+register(PlannerSpec("ARA_Star", "searchARAStar", "AnytimeAStar", stateful=True, anytime=True, deadline=True))
+register(PlannerSpec("IDA_Star", "searchIDAStar", "idastar_search", deterministic=True))
+register(PlannerSpec("Beam", "searchBeam", "beam_search", deterministic=True))
+register(PlannerSpec("Macro", "searchMacro", "macro_search", deterministic=True))
+register(PlannerSpec("Scheduler", "searchScheduler", "GameScheduler", stateful=True))
@@ -9,10 +9,15 @@ from searchBFS import bfs_search
 from animations import AnimationManager
 from assets import load_assets, load_sounds
 from map_handler import load_map_from_file, place_random_objects
+from seeding import parse_seed
 
 # Khởi tạo pygame
 pygame.init()
 
+# --- SEED (xem seeding.py) ---
+# python playAI2.py --seed N: bánh được đặt giống hệt mỗi lần chạy
+rng = random.Random(parse_seed())
+
 # --- CÀI ĐẶT MAP ---
 GRID_SIZE = 17             # Map thiết kế (17x17)
 TILE_SIZE = 37
@@ -406,7 +411,7 @@ map_file = "map_design_small.txt"
 map_tiles = load_map_from_file(map_file, GRID_SIZE)
 
 path_panel = ScrollablePathPanel(WIDTH, 0, PANEL_WIDTH, HEIGHT)
-place_random_objects(map_tiles, GRID_SIZE)
+place_random_objects(map_tiles, GRID_SIZE, rng=rng)
 original_map_tiles = [row[:] for row in map_tiles]  # Tạo bản sao sâu của map ban đầu
 
 player_x, player_y = GRID_SIZE // 2, GRID_SIZE // 2
@@ -10,10 +10,15 @@ from searchDFS import dfs_search
 from animations import AnimationManager
 from assets import load_assets, load_sounds
 from map_handler import load_map_from_file, place_random_objects
+from seeding import parse_seed
 
 # Khởi tạo pygame
 pygame.init()
 
+# --- SEED (xem seeding.py) ---
+# python playAI3.py --seed N: bánh được đặt giống hệt mỗi lần chạy
+rng = random.Random(parse_seed())
+
 # --- CÀI ĐẶT MAP ---
 GRID_SIZE = 25             # Map thiết kế (25x25)
 TILE_SIZE = 25
@@ -640,7 +645,7 @@ map_tiles = load_map_from_file(map_file, GRID_SIZE)
 
 path_panel = ScrollablePathPanel(WIDTH, 0, PANEL_WIDTH, HEIGHT)
 viz_panel = PathVisualizationPanel(WIDTH + PANEL_WIDTH, 0, PATH_PANEL_WIDTH, HEIGHT)
-place_random_objects(map_tiles, GRID_SIZE)
+place_random_objects(map_tiles, GRID_SIZE, rng=rng)
 original_map_tiles = [row[:] for row in map_tiles]  # Tạo bản sao sâu của map ban đầu
 
 player_x, player_y = GRID_SIZE // 2, GRID_SIZE // 2
@@ -9,11 +9,17 @@ from searchBFS import bfs_search
 from searchDFS import dfs_search
 from animations import AnimationManager
 from assets import load_assets, load_sounds
-from map_handler import load_map_from_file, place_random_objects
+from map_handler import load_map_from_file, place_random_objects, ObjectIndex
+from seeding import parse_seed
 
 # Khởi tạo pygame
 pygame.init()
 
+# --- SEED (xem seeding.py) ---
+# python playAI4.py --seed N: mỗi lần nạp map, bánh được đặt lại giống hệt
+SEED = parse_seed()
+rng = random.Random(SEED)
+
 # --- CÀI ĐẶT MAP ---
 GRID_SIZE = 25             # Map thiết kế (25x25)
 TILE_SIZE = 25
@@ -598,7 +604,7 @@ map_files = {
 map_dropdown = DropdownMenu(800, HEIGHT + 90, 120, 40, map_options)
 
 def load_selected_map():
-    global map_tiles, original_map_tiles, player_x, player_y, bag, score, ai_path, current_path_index, total_thinking_time, total_steps
+    global map_tiles, original_map_tiles, object_index, player_x, player_y, bag, score, ai_path, current_path_index, total_thinking_time, total_steps
     
     # Lấy map được chọn
     selected_map = map_dropdown.get_selected()
@@ -606,7 +612,10 @@ def load_selected_map():
     
     # Tải map mới
     map_tiles = load_map_from_file(map_file, GRID_SIZE)
-    place_random_objects(map_tiles, GRID_SIZE)
+    object_index = ObjectIndex(map_tiles)
+    if SEED is not None:
+        rng.seed(SEED)  # Cùng seed: cùng ván chơi dù đã chuyển map bao nhiêu lần
+    place_random_objects(map_tiles, GRID_SIZE, object_index=object_index, rng=rng)
     original_map_tiles = [row[:] for row in map_tiles]  # Tạo bản sao sâu của map ban đầu
     
     # Reset vị trí người chơi về giữa bản đồ
@@ -678,7 +687,9 @@ current_map_selection = 0
 
 path_panel = ScrollablePathPanel(WIDTH, 0, PANEL_WIDTH, HEIGHT)
 viz_panel = PathVisualizationPanel(WIDTH + PANEL_WIDTH, 0, PATH_PANEL_WIDTH, HEIGHT)
-place_random_objects(map_tiles, GRID_SIZE)
+# Chỉ mục vật phẩm theo loại, cập nhật khi đặt và khi nhặt vật phẩm
+object_index = ObjectIndex(map_tiles)
+place_random_objects(map_tiles, GRID_SIZE, object_index=object_index, rng=rng)
 original_map_tiles = [row[:] for row in map_tiles]  # Tạo bản sao sâu của map ban đầu
 
 player_x, player_y = GRID_SIZE // 2, GRID_SIZE // 2
@@ -717,10 +728,10 @@ def calculate_ai_path():
     
     # Gọi hàm tìm đường dựa trên thuật toán được chọn
     if algorithm == "BFS":
-        path = bfs_search(map_copy, (player_x, player_y), bag)
+        path = bfs_search(map_copy, (player_x, player_y), bag, object_index=object_index)
     elif algorithm == "DFS":
         # Giả sử bạn đã có một hàm dfs tìm đường
-        path = dfs_search(map_copy, (player_x, player_y), bag)
+        path = dfs_search(map_copy, (player_x, player_y), bag, object_index=object_index)
     elif algorithm == "Greedy":
         # Giả sử bạn đã có một hàm greedy tìm đường
         path = greedy_search(map_copy, (player_x, player_y))
@@ -741,13 +752,9 @@ def calculate_ai_path():
     return path
 
 # --- VÒNG LẶP GAME CHÍNH ---
-def has_items(map_tiles):
-    """Trả về True nếu còn cell kiểu int trong map_tiles."""
-    for row in map_tiles:
-        for cell in row:
-            if isinstance(cell, int):
-                return True
-    return False
+def has_items():
+    """Trả về True nếu map còn vật phẩm (tra trong chỉ mục vật phẩm)."""
+    return object_index.has()
 
 running = True
 fps_timer = pygame.time.Clock()
@@ -788,7 +795,7 @@ while running:
             if mouse_click and button.is_clicked(mouse_pos, True):
                 if name == "start":
                     # CHỈ start khi vẫn còn vật phẩm
-                    if has_items(map_tiles):
+                    if has_items():
                         ai_running = True
                         step_mode = False
                         if not ai_path or current_path_index >= len(ai_path):
@@ -804,16 +811,7 @@ while running:
                         calculate_ai_path()
                     elif current_path_index >= len(ai_path):
                         # Kiểm tra xem còn vật phẩm nào trên bản đồ không
-                        has_objects = False
-                        for row in map_tiles:
-                            for cell in row:
-                                if isinstance(cell, int):
-                                    has_objects = True
-                                    break
-                            if has_objects:
-                                break
-                                
-                        if has_objects:
+                        if has_items():
                             # Tính lại đường đi nếu còn vật phẩm
                             calculate_ai_path()
                 elif name == "reset":
@@ -837,6 +835,7 @@ while running:
     
                     # Khôi phục map về trạng thái ban đầu (KHÔNG tạo map mới)
                     map_tiles = [row[:] for row in original_map_tiles]
+                    object_index = ObjectIndex(map_tiles)
     
     # Xử lý di chuyển AI
     if (ai_running or (step_mode and do_step)) and ai_path and current_path_index < len(ai_path):
@@ -870,6 +869,7 @@ while running:
                 
             # Cập nhật map
             map_tiles[player_y][player_x] = " "
+            object_index.remove((player_x, player_y), cell)
             
             # Kiểm tra combo
             while check_combos(bag):
@@ -882,16 +882,7 @@ while running:
         # Nếu đã đi hết đường, tính toán lại nếu còn vật phẩm
         if current_path_index >= len(ai_path):
             # Kiểm tra xem còn vật phẩm nào trên bản đồ không
-            has_objects = False
-            for row in map_tiles:
-                for cell in row:
-                    if isinstance(cell, int):
-                        has_objects = True
-                        break
-                if has_objects:
-                    break
-                    
-            if has_objects and (ai_running or step_mode):
+            if has_items() and (ai_running or step_mode):
                 # Tính lại đường đi
                 calculate_ai_path()
         
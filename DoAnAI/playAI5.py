@@ -1,3 +1,4 @@
+import argparse
 import pygame
 import random
 import subprocess
@@ -8,24 +9,24 @@ import imageio
 import os
 import threading
 
-from searchBFS import bfs_search
-from searchDFS import dfs_search
-from searchAStar import astar_search
-from searchSimulatedAnnealing import simulated_annealing_search
-from searchNondeterministic import nondeterministic_search
-from searchBacktrackingWithFowardChecking import backtracking_with_forward_checking
-from searchQLearning import qlearning_search
 from animations import AnimationManager
 from assets import load_assets, load_sounds
-from map_handler import load_map_from_file, place_random_objects
+from map_handler import (load_map_from_file, place_random_objects, ObjectIndex, MapLoadError, map_size, start_position,
+                         compile_map)
+from planner_cache import PlannerCache
+from planner_registry import PlannerSet, planner_names, SINGLE
+from combo_rules import COMBO_RULES, BAG_SIZE, find_combo
+from seeding import parse_seed
 
 
 pygame.init()
 
 # --- CÀI ĐẶT MAP ---
-GRID_SIZE = 25             # Map thiết kế (25x25)
+# Map có kích thước bất kỳ (đọc từ file); màn hình chỉ vẽ khung nhìn VIEW_TILES x VIEW_TILES ô,
+# map lớn hơn thì camera đi theo người chơi (minimap bên phải vẫn hiện cả map)
+VIEW_TILES = 25
 TILE_SIZE = 25
-WIDTH, HEIGHT = TILE_SIZE * GRID_SIZE, TILE_SIZE * GRID_SIZE
+WIDTH, HEIGHT = TILE_SIZE * VIEW_TILES, TILE_SIZE * VIEW_TILES
 INFO_HEIGHT = 140
 
 PANEL_WIDTH = 200
@@ -33,18 +34,19 @@ PATH_PANEL_WIDTH = 500
 SCREEN_WIDTH = WIDTH + PANEL_WIDTH + PATH_PANEL_WIDTH
 SCREEN_HEIGHT = HEIGHT + INFO_HEIGHT
 
-# Quy tắc combo
-COMBO_RULES = {
-    0: (2, 200),
-    1: (3, 300),
-    2: (4, 400),
-    3: (5, 500),
-    4: (6, 600)
-}
-BAG_SIZE = 7
-
 pygame.mixer.init()
 
+# --- SEED (xem seeding.py) ---
+# python playAI5.py --seed N: mỗi lần nạp map, bánh được đặt lại giống hệt và các planner ngẫu
+# nhiên (SA, AND-OR, Q-learning) đi giống hệt, để so sánh các thuật toán trên cùng một ván
+SEED = parse_seed()
+rng = random.Random(SEED)
+
+# python playAI5.py --map FILE: thêm map FILE (kích thước bất kỳ, vd. 100x100) vào danh sách map
+_arg_parser = argparse.ArgumentParser(add_help=False)
+_arg_parser.add_argument("--map", default=None)
+CUSTOM_MAP = _arg_parser.parse_known_args()[0].map
+
 # --- KHỞI TẠO MÀN HÌNH ---
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Game AI Player")
@@ -54,6 +56,20 @@ clock = pygame.time.Clock()
 sound_assets = load_sounds()
 assets = load_assets(TILE_SIZE)
 
+# --- CAMERA ---
+# Góc trên trái (theo ô) của khung nhìn; map không lớn hơn khung nhìn thì luôn là (0, 0)
+camera_x, camera_y = 0, 0
+
+def update_camera():
+    """Đặt khung nhìn để người chơi ở giữa, không vượt ra ngoài map"""
+    global camera_x, camera_y
+    cols, rows = map_size(map_tiles)
+    camera_x = min(max(player_x - VIEW_TILES // 2, 0), max(cols - VIEW_TILES, 0))
+    camera_y = min(max(player_y - VIEW_TILES // 2, 0), max(rows - VIEW_TILES, 0))
+
+def in_view(x, y):
+    return camera_x <= x < camera_x + VIEW_TILES and camera_y <= y < camera_y + VIEW_TILES
+
 # --- HÀM VẼ CÁC THÀNH PHẦN ---
 def draw_grid():
     for x in range(0, WIDTH, TILE_SIZE):
@@ -62,9 +78,11 @@ def draw_grid():
         pygame.draw.line(screen, (200,200,200), (0,y), (WIDTH,y))
 
 def draw_map(map_tiles):
-    for i in range(GRID_SIZE):
-        for j in range(GRID_SIZE):
-            rect = pygame.Rect(j * TILE_SIZE, i * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+    # Chỉ vẽ các ô trong khung nhìn (map 250x250 có 62500 ô)
+    cols, rows = map_size(map_tiles)
+    for i in range(camera_y, min(camera_y + VIEW_TILES, rows)):
+        for j in range(camera_x, min(camera_x + VIEW_TILES, cols)):
+            rect = pygame.Rect((j - camera_x) * TILE_SIZE, (i - camera_y) * TILE_SIZE, TILE_SIZE, TILE_SIZE)
             
             screen.blit(assets["floor"], rect)
             
@@ -85,7 +103,7 @@ def draw_map(map_tiles):
                     pygame.draw.rect(screen, (255,255,255), rect)
 
 def draw_player(x, y):
-    rect = pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+    rect = pygame.Rect((x - camera_x) * TILE_SIZE, (y - camera_y) * TILE_SIZE, TILE_SIZE, TILE_SIZE)
     screen.blit(assets["player"], rect)
 
 def draw_path(path):
@@ -95,6 +113,9 @@ def draw_path(path):
         
     for _, pos in path:
         x, y = pos
+        if not in_view(x, y):
+            continue
+        x, y = x - camera_x, y - camera_y
         rect = pygame.Rect(x * TILE_SIZE + TILE_SIZE//4, y * TILE_SIZE + TILE_SIZE//4, TILE_SIZE//2, TILE_SIZE//2)
         pygame.draw.rect(screen, (255, 100, 100, 128), rect, border_radius=5)
 
@@ -170,16 +191,21 @@ class ScrollablePathPanel:
         self.font = pygame.font.SysFont(None, font_size)
         self.path_steps = []
         self.calculation_time = 0.0
+        self.header_lines = 1
         self.scroll_y = 0
         self.line_height = font_size + 4
         self.visible_lines = height // self.line_height
         self.scrollbar_width = 15
         self.dragging = False
         
-    def set_path(self, path, calc_time=0.0):
+    def set_path(self, path, calc_time=0.0, info_lines=()):
         self.path_steps = []
         self.calculation_time = calc_time
         self.path_steps.append(f"Time: {self.calculation_time:.6f} s")
+        self.header_lines = 1
+        # Các dòng thông tin thêm: số lần trúng/trượt cache, thống kê tìm kiếm (SearchResult.stats_lines)
+        self.path_steps.extend(info_lines)
+        self.header_lines = 1 + len(info_lines)
         
         for i, (direction, pos) in enumerate(path):
             x, y = pos
@@ -211,8 +237,8 @@ class ScrollablePathPanel:
         for i, step in enumerate(self.path_steps):
             y_pos = i * self.line_height - self.scroll_y + 2
             if -self.line_height <= y_pos < content_rect.height:
-                if i == 0 and self.calculation_time > 0:
-                    text = self.font.render(step, True, (0, 0, 150))  # Blue for time
+                if i < self.header_lines and (i > 0 or self.calculation_time > 0):
+                    text = self.font.render(step, True, (0, 0, 150))  # Blue for time / cache
                 else:
                     text = self.font.render(step, True, (0, 0, 0))
                 content_surface.blit(text, (5, y_pos))
@@ -288,7 +314,6 @@ class PathVisualizationPanel:
         self.font = pygame.font.SysFont(None, font_size)
         self.path = []
         self.current_index = 0
-        self.node_radius = 10
         self.font_node = pygame.font.SysFont(None, 15)  # Font nhỏ hơn cho chữ trong node
 
         self.legend_height = 100
@@ -296,13 +321,18 @@ class PathVisualizationPanel:
         self.map_margin_x = 10  # Left margin for minimap
         self.map_margin_y = 40  # Top margin for minimap
         
-        self.minimap_width = width - 2 * self.map_margin_x
-        self.minimap_height = height - self.map_margin_y - self.legend_height
-        
-        self.cell_size = min(self.minimap_width / GRID_SIZE, self.minimap_height / GRID_SIZE)
-        
-        self.minimap_width = self.cell_size * GRID_SIZE
-        self.minimap_height = self.cell_size * GRID_SIZE
+        # Vùng dành cho minimap; kích thước ô được tính lại theo kích thước map mỗi lần vẽ
+        self.area_width = width - 2 * self.map_margin_x
+        self.area_height = height - self.map_margin_y - self.legend_height
+        self.fit_map(VIEW_TILES, VIEW_TILES)
+
+    def fit_map(self, cols, rows):
+        """Chọn kích thước ô để cả map cols x rows vừa vùng minimap"""
+        self.cell_size = min(self.area_width / cols, self.area_height / rows)
+        self.minimap_width = self.cell_size * cols
+        self.minimap_height = self.cell_size * rows
+        # Map lớn: ô nhỏ thì nút cũng nhỏ, không vẽ lưới và số bước
+        self.node_radius = min(10, max(2, self.cell_size / 2))
         
     def set_path(self, path):
         self.path = path
@@ -312,6 +342,8 @@ class PathVisualizationPanel:
         self.current_index = current_index
 
     def draw(self, surface):
+        cols, rows = map_size(map_tiles)
+        self.fit_map(cols, rows)
         pygame.draw.rect(surface, (240, 240, 240), self.rect)
         pygame.draw.rect(surface, (0, 0, 0), self.rect, 2)
 
@@ -325,23 +357,29 @@ class PathVisualizationPanel:
         pygame.draw.rect(surface, (220, 220, 220), minimap_rect)
         pygame.draw.rect(surface, (0, 0, 0), minimap_rect, 1)
         
-        for i in range(GRID_SIZE + 1):
-            line_x = minimap_x + i * self.cell_size
-            pygame.draw.line(surface, (200, 200, 200), 
-                            (line_x, minimap_y), 
-                            (line_x, minimap_y + self.minimap_height))
-            
-            line_y = minimap_y + i * self.cell_size
-            pygame.draw.line(surface, (200, 200, 200), 
-                            (minimap_x, line_y), 
-                            (minimap_x + self.minimap_width, line_y))
-        
-        # Các vật cản là XX
-        for y_map in range(GRID_SIZE):
-            for x_map in range(GRID_SIZE):
+        small_cells = self.cell_size < 6
+        if not small_cells:
+            for i in range(cols + 1):
+                line_x = minimap_x + i * self.cell_size
+                pygame.draw.line(surface, (200, 200, 200), 
+                                (line_x, minimap_y), 
+                                (line_x, minimap_y + self.minimap_height))
+            for i in range(rows + 1):
+                line_y = minimap_y + i * self.cell_size
+                pygame.draw.line(surface, (200, 200, 200), 
+                                (minimap_x, line_y), 
+                                (minimap_x + self.minimap_width, line_y))
+        
+        # Các vật cản là XX (ô quá nhỏ thì tô đen cả ô)
+        for y_map in range(rows):
+            for x_map in range(cols):
                 # kiểm tra xem có phải vật cảncản
-                if (0 <= y_map < len(map_tiles) and 0 <= x_map < len(map_tiles[0]) and 
-                    map_tiles[y_map][x_map] in ["T", "W", "X", "B", "H", "G"]):
+                if map_tiles[y_map][x_map] in ["T", "W", "X", "B", "H", "G"]:
+                    if small_cells:
+                        pygame.draw.rect(surface, (0, 0, 0),
+                                         (minimap_x + x_map * self.cell_size, minimap_y + y_map * self.cell_size,
+                                          max(1, self.cell_size), max(1, self.cell_size)))
+                        continue
                     node_x = minimap_x + x_map * self.cell_size + self.cell_size/2
                     node_y = minimap_y + y_map * self.cell_size + self.cell_size/2
                     
@@ -352,6 +390,12 @@ class PathVisualizationPanel:
                     pygame.draw.line(surface, (0, 0, 0), 
                                 (node_x + x_size, node_y - x_size), 
                                 (node_x - x_size, node_y + x_size), 2)
+
+        # Khung nhìn của màn hình chính khi map lớn hơn khung nhìn
+        if cols > VIEW_TILES or rows > VIEW_TILES:
+            view_rect = pygame.Rect(minimap_x + camera_x * self.cell_size, minimap_y + camera_y * self.cell_size,
+                                    min(VIEW_TILES, cols) * self.cell_size, min(VIEW_TILES, rows) * self.cell_size)
+            pygame.draw.rect(surface, (70, 130, 180), view_rect, 2)
             
         if self.path:
             for i in range(1, len(self.path)):
@@ -396,6 +440,8 @@ class PathVisualizationPanel:
                 pygame.draw.circle(surface, (0, 0, 0), (node_x, node_y), self.node_radius, 1)
                 
                 # Draw step number inside the node
+                if small_cells:
+                    continue
                 step_text = str(i + 1)
                 step_surf = self.font_node.render(step_text, True, (0, 0, 0))
                 step_rect = step_surf.get_rect(center=(node_x, node_y))
@@ -561,7 +607,7 @@ ai_buttons = {
 ai_speed_options = ["Slow", "Normal", "Fast", "Instant"]
 ai_speed_dropdown = DropdownMenu(370, HEIGHT + 90, 100, 40, ai_speed_options)
 
-ai_algo_options = ["BFS", "DFS", "A_Star", "Simulated_Annealing", "Nondeterministic", "BTwForwardChecking", "QLearning"]
+ai_algo_options = planner_names(SINGLE)
 ai_algo_dropdown = DropdownMenu(480, HEIGHT + 90, 170, 40, ai_algo_options)
 
 map_options = ["Map 1", "Map 2", "Map 3"]
@@ -570,22 +616,36 @@ map_files = {
     "Map 2": "map_design2.txt",
     "Map 3": "map_design3.txt",
 }
+if CUSTOM_MAP:
+    map_options.append("Custom")
+    map_files["Custom"] = CUSTOM_MAP
 map_dropdown = DropdownMenu(800, HEIGHT + 90, 120, 40, map_options)
 
 def load_selected_map():
-    global map_tiles, original_map_tiles, player_x, player_y, bag, score, ai_path, current_path_index, total_thinking_time, total_steps
+    global map_tiles, map_layout, original_map_tiles, object_index, player_x, player_y, bag, score, ai_path, current_path_index, total_thinking_time, total_steps
     
     # Lấy map được chọn
     selected_map = map_dropdown.get_selected()
     map_file = map_files[selected_map]
     
-    # Tải map mới
-    map_tiles = load_map_from_file(map_file, GRID_SIZE)
-    place_random_objects(map_tiles, GRID_SIZE)
+    # Tải map mới (file lỗi thì giữ nguyên map đang chơi)
+    try:
+        new_map = load_map_from_file(map_file)
+    except MapLoadError as e:
+        print(f"Không tải được map: {e}")
+        return
+    map_tiles = new_map
+    map_layout = compile_map(map_tiles).layout
+    object_index = ObjectIndex(map_tiles)
+    planner_cache.clear()  # Bố cục tường thay đổi, đường đi đã cache không còn dùng được
+    planners.reset()
+    if SEED is not None:
+        rng.seed(SEED)  # Cùng seed: cùng ván chơi dù đã chuyển map bao nhiêu lần
+    place_random_objects(map_tiles, object_index=object_index, rng=rng)
     original_map_tiles = [row[:] for row in map_tiles]  # Tạo bản sao sâu của map ban đầu
     
     # Reset vị trí người chơi về giữa bản đồ
-    player_x, player_y = GRID_SIZE // 2, GRID_SIZE // 2
+    player_x, player_y = start_position(map_tiles)
     
     # Reset túi đồ và điểm số
     bag = []
@@ -626,37 +686,44 @@ def draw_ai_controls():
 def check_combos(bag):
     global score, animations
     removed = False
-    for obj, (need, points) in COMBO_RULES.items():
-        if len(bag) < need:
-            continue
-        for i in range(len(bag) - need + 1):
-            segment = bag[i:i+need]
-            if all(x == obj for x in segment):
-                # Tạo animation trước khi xóa vật phẩm
-                positions = list(range(i, i + need))
-                animation_manager.add_combo_animation(obj, positions, points)
-                
-                # Phát âm thanh combo
-                sound_assets["combo"].play()
-                
-                # Xóa vật phẩm khỏi túi
-                del bag[i:i+need]
-                score += points
-                removed = True
-                return removed
+    # Tra combo đầu tiên trong túi theo luật chung (combo_rules)
+    combo = find_combo(bag)
+    if combo is not None:
+        obj, i, need, points = combo
+        # Tạo animation trước khi xóa vật phẩm
+        positions = list(range(i, i + need))
+        animation_manager.add_combo_animation(obj, positions, points)
+        
+        # Phát âm thanh combo
+        sound_assets["combo"].play()
+        
+        # Xóa vật phẩm khỏi túi
+        del bag[i:i+need]
+        score += points
+        removed = True
     return removed
 
 # --- KHỞI TẠO GAME ---
 map_file = map_files["Map 1"]
-map_tiles = load_map_from_file(map_file, GRID_SIZE)
+map_tiles = load_map_from_file(map_file)
 current_map_selection = 0
 
 path_panel = ScrollablePathPanel(WIDTH, 0, PANEL_WIDTH, HEIGHT)
 viz_panel = PathVisualizationPanel(WIDTH + PANEL_WIDTH, 0, PATH_PANEL_WIDTH, HEIGHT)
-place_random_objects(map_tiles, GRID_SIZE)
+# Bố cục tường của map đang chơi (khóa của planner_cache), chỉ đổi khi nạp map khác
+map_layout = compile_map(map_tiles).layout
+# Chỉ mục vật phẩm theo loại, cập nhật khi đặt và khi nhặt vật phẩm
+object_index = ObjectIndex(map_tiles)
+# Cache kết quả tìm đường theo (thuật toán, bố cục tường, vật phẩm trên map, vị trí, túi)
+planner_cache = PlannerCache()
+# Các planner đã chọn (tạo khi chọn lần đầu); planner có trạng thái như Scheduler giữ lịch
+# giữa các lần tính lại đường. ARA* tìm trong thời hạn ARA_DEADLINE_MS mỗi lần gọi
+ARA_DEADLINE_MS = 50
+planners = PlannerSet(deadline_ms=ARA_DEADLINE_MS, rng=rng)
+place_random_objects(map_tiles, object_index=object_index, rng=rng)
 original_map_tiles = [row[:] for row in map_tiles]  # Tạo bản sao sâu của map ban đầu
 
-player_x, player_y = GRID_SIZE // 2, GRID_SIZE // 2
+player_x, player_y = start_position(map_tiles)
 animation_manager = AnimationManager(assets, TILE_SIZE, HEIGHT, sound_assets)
 bag = []
 score = 0
@@ -687,24 +754,18 @@ def calculate_ai_path():
     # Đo thời gian tính toán
     start_time = time.time()
     
-    # Tạo bản sao của map để AI phân tích
-    map_copy = [row[:] for row in map_tiles]
-    
-    # Gọi hàm tìm đường dựa trên thuật toán được chọn
-    if algorithm == "BFS":
-        path = bfs_search(map_copy, (player_x, player_y), bag)
-    elif algorithm == "DFS":
-        path = dfs_search(map_copy, (player_x, player_y), bag)
-    elif algorithm == "A_Star":
-        path = astar_search(map_copy, (player_x, player_y), bag)
-    elif algorithm == "Simulated_Annealing":
-        path = simulated_annealing_search(map_copy, (player_x, player_y), bag)
-    elif algorithm == "Nondeterministic":
-        path = nondeterministic_search(map_copy, (player_x, player_y), bag)
-    elif algorithm == "BTwForwardChecking":
-        path = backtracking_with_forward_checking(map_copy, (player_x, player_y), bag)
-    elif algorithm == "QLearning":
-        path = qlearning_search(map_copy, (player_x, player_y), bag)
+    # Tra cache trước: cùng map, vị trí và túi thì thuật toán tất định cho cùng đường đi
+    info_lines = []
+    path = planner_cache.get(algorithm, map_layout, object_index, (player_x, player_y), bag)
+    if path is None:
+        # Tạo bản sao của map để AI phân tích
+        map_copy = [row[:] for row in map_tiles]
+        
+        # Gọi planner của thuật toán được chọn (xem planner_registry.py)
+        path = planners.plan(algorithm, map_copy, (player_x, player_y), bag, object_index)
+        planner_cache.put(algorithm, map_layout, object_index, (player_x, player_y), bag, path)
+        # Thống kê tìm kiếm của planner (SearchResult); lần trúng cache thì không có
+        info_lines = path.stats_lines()
         
     # Tính thời gian và cộng vào tổng
     end_time = time.time()
@@ -713,7 +774,7 @@ def calculate_ai_path():
     
     ai_path = path
     current_path_index = 0
-    path_panel.set_path(path, thinking_time)
+    path_panel.set_path(path, thinking_time, [planner_cache.stats_text()] + info_lines)
     viz_panel.set_path(path)
 
     # Chụp hình khi tìm đường đi mới
@@ -748,7 +809,7 @@ def start_recording():
     global recording, frames, ai_running, recording_status, steps_since_last_capture
     
     # Kiểm tra xem có vật phẩm trên bản đồ không
-    if not has_items(map_tiles):
+    if not has_items():
         return False
     
     recording = True
@@ -816,7 +877,7 @@ def capture_frame():
 def trigger_save_gif():
     global recording, frames
     
-    if recording and not has_items(map_tiles):
+    if recording and not has_items():
         # Chụp một frame cuối cùng trước khi lưu
         capture_frame()
         
@@ -896,13 +957,9 @@ def open_saved_gif():
 
              
 # --- VÒNG LẶP GAME CHÍNH ---
-def has_items(map_tiles):
-    """Trả về True nếu còn cell kiểu int trong map_tiles."""
-    for row in map_tiles:
-        for cell in row:
-            if isinstance(cell, int):
-                return True
-    return False
+def has_items():
+    """Trả về True nếu map còn vật phẩm (tra trong chỉ mục vật phẩm)."""
+    return object_index.has()
 
 
 running = True
@@ -943,7 +1000,7 @@ while running:
             button.check_hover(mouse_pos)
     
             # Vô hiệu hóa nút record nếu đang lưu GIF hoặc không có vật phẩm
-            if name == "record" and (recording_status == "Saving" or (not recording and not has_items(map_tiles))):
+            if name == "record" and (recording_status == "Saving" or (not recording and not has_items())):
                 button.color = (150, 150, 150)  # Màu xám nhạt cho nút bị vô hiệu hóa
                 button.hover_color = (150, 150, 150)
             else:
@@ -960,14 +1017,14 @@ while running:
                 # Bỏ qua click nếu nút record bị vô hiệu hóa
                 if name == "record" and recording_status == "Saving":
                     continue
-                if name == "record" and not recording and not has_items(map_tiles):
+                if name == "record" and not recording and not has_items():
                     continue
         
         
             if mouse_click and button.is_clicked(mouse_pos, True):
                 if name == "start":
                     # CHỈ start khi vẫn còn vật phẩm
-                    if has_items(map_tiles):
+                    if has_items():
                         ai_running = True
                         step_mode = False
                         if not ai_path or current_path_index >= len(ai_path):
@@ -983,16 +1040,7 @@ while running:
                         calculate_ai_path()
                     elif current_path_index >= len(ai_path):
                         # Kiểm tra xem còn vật phẩm nào trên bản đồ không
-                        has_objects = False
-                        for row in map_tiles:
-                            for cell in row:
-                                if isinstance(cell, int):
-                                    has_objects = True
-                                    break
-                            if has_objects:
-                                break
-                                
-                        if has_objects:
+                        if has_items():
                             # Tính lại đường đi nếu còn vật phẩm
                             calculate_ai_path()
                 elif name == "reset":
@@ -1004,7 +1052,7 @@ while running:
                     path_panel.set_path([], 0.0)  # Xóa đường đi trong panel
                     viz_panel.set_path([])  # Also clear the path visualization panel    
                     # Reset vị trí người chơi về giữa bản đồ
-                    player_x, player_y = GRID_SIZE // 2, GRID_SIZE // 2
+                    player_x, player_y = start_position(original_map_tiles)
                     
                     # reset túi đồ và điểm số
                     bag = []
@@ -1016,10 +1064,11 @@ while running:
     
                     # Khôi phục map về trạng thái ban đầu (KHÔNG tạo map mới)
                     map_tiles = [row[:] for row in original_map_tiles]
+                    object_index = ObjectIndex(map_tiles)
                 
                 elif name == "record":
                     # Chỉ bắt đầu quay khi không có trạng thái ghi nào và có vật phẩm trên bản đồ
-                    if not recording and recording_status != "Saving" and has_items(map_tiles):
+                    if not recording and recording_status != "Saving" and has_items():
                         start_recording()
                     # Nếu đang quay, dừng mà không lưu khi nhấn lại
                     elif recording:
@@ -1055,7 +1104,7 @@ while running:
         cell = map_tiles[player_y][player_x]
         if isinstance(cell, int):
             # Thêm hiệu ứng thu thập
-            animation_manager.add_collect_animation(player_x, player_y, cell)
+            animation_manager.add_collect_animation(player_x - camera_x, player_y - camera_y, cell)
             sound_assets["collect"].play()
             
             # Thêm vào túi
@@ -1072,6 +1121,7 @@ while running:
                 
             # Cập nhật map
             map_tiles[player_y][player_x] = " "
+            object_index.remove((player_x, player_y), cell)
             
             # Kiểm tra combo
             while check_combos(bag):
@@ -1096,16 +1146,7 @@ while running:
         # Nếu đã đi hết đường, tính toán lại nếu còn vật phẩm
         if current_path_index >= len(ai_path):
             # Kiểm tra xem còn vật phẩm nào trên bản đồ không
-            has_objects = False
-            for row in map_tiles:
-                for cell in row:
-                    if isinstance(cell, int):
-                        has_objects = True
-                        break
-                if has_objects:
-                    break
-                    
-            if has_objects and (ai_running or step_mode):
+            if has_items() and (ai_running or step_mode):
                 # Tính lại đường đi
                 calculate_ai_path()
                 # Chụp hình khi tìm đường đi mới
@@ -1121,6 +1162,7 @@ while running:
     
     # Vẽ màn hình game
     screen.fill((255,255,255))
+    update_camera()
     draw_map(map_tiles)
     if ai_path and not ai_running:
         # Chỉ vẽ đường đi khi AI không chạy
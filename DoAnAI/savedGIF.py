@@ -7,6 +7,8 @@ import threading
 import time
 import numpy as np
 
+from planner_registry import planner_names, SINGLE
+
 class GifViewer:
     def __init__(self):
         pygame.init()
@@ -17,7 +19,8 @@ class GifViewer:
         self.font = pygame.font.SysFont(None, 28)
         self.small_font = pygame.font.SysFont(None, 21)
         
-        self.algorithms = ["Compare", "BFS", "DFS", "A_Star", "Simulated_Annealing", "Nondeterministic", "BTwForwardChecking", "QLearning"]  # Các thuật toán hỗ trợ
+        # Các thuật toán có thể ghi GIF (các planner của playAI5, lấy từ planner_registry.py)
+        self.algorithms = ["Compare"] + planner_names(SINGLE)
         self.current_algo_index = 0
         
         self.gif_frames = {}      # Lưu các frame của GIF
@@ -0,0 +1,285 @@
+import heapq
+import time
+
+from map_handler import ObjectIndex, compile_map
+from search_state import StateCodec, NodeStore, bag_len, bag_first, bag_push
+from combo_rules import BAG_SIZE, allowed_combo_objs, is_combo_goal
+from distance_field import SearchFields
+from searchAStar import _astar_nearest_target
+from search_result import SearchResult
+
+# --- ANYTIME A* (ARA*) CÓ HẠN THỜI GIAN ---
+# astar_search chạy tới khi xong, vòng lặp game phải chờ; trong battleAI thời gian suy nghĩ còn
+# quyết định AI nào giành được ô tranh chấp. ARA* (Anytime Repairing A*) tìm nhanh một đường combo
+# với heuristic được nhân trọng số epsilon > 1, rồi giảm dần epsilon và sửa lại cây tìm kiếm
+# (dùng lại OPEN/INCONS thay vì tìm lại từ đầu) để cải thiện đường đi:
+#   - hết hạn deadline_ms thì trả về đường combo tốt nhất đã có cùng cận dưới tối ưu
+#     bound = chi phí đường đi / cận dưới chi phí tối ưu (bound = 1 là tối ưu)
+#   - mỗi người chơi một AnytimeAStar (planner có trạng thái trong planner_registry.py): gọi lại
+#     với cùng truy vấn (vị trí, túi, ObjectIndex.signature) thì tiếp tục cải thiện từ chỗ đã dừng;
+#     reset() (Reset ván, đổi map) bỏ các phiên đang giữ
+#
+# Không gian trạng thái, luật nhặt và giới hạn max_depth giống _astar_find_combo (searchAStar.py).
+# Heuristic: chưa đạt combo thì phải nhặt thêm ít nhất một vật phẩm nhặt được, nên khoảng cách
+# tới vật phẩm nhặt được gần nhất (loại bag[0], hoặc loại được phép nếu túi rỗng) là chặn dưới
+# nhất quán; trạng thái goal có h = 0.
+
+INF = float('inf')
+
+# Số phiên tìm kiếm gần đây một planner giữ lại để lần gọi sau tiếp tục cải thiện
+_SESSIONS_SIZE = 8
+# Thời hạn suy nghĩ mặc định của một lần gọi (mili giây)
+DEFAULT_DEADLINE_MS = 50
+# Số lần mở rộng nút giữa hai lần kiểm tra đồng hồ
+_CLOCK_EVERY = 64
+
+
+class AnytimeSession:
+    """
+    Một phiên ARA* tìm đường tới trạng thái có combo, có thể dừng và tiếp tục.
+
+    Tham số khởi tạo:
+        map_tiles, start_pos, bag, max_depth, object_index: như astar_search
+        epsilon: trọng số heuristic ban đầu
+        delta: mức giảm epsilon sau mỗi lần cải thiện xong
+
+    Thuộc tính:
+        epsilon: trọng số đang dùng
+        bound: cận trên tỉ lệ (chi phí đường tìm được / chi phí tối ưu), INF nếu chưa có đường
+        done: True nếu không thể cải thiện thêm (đã tối ưu hoặc đã duyệt hết trong max_depth)
+        expanded: tổng số lần mở rộng nút
+        peak_frontier: số nút lớn nhất từng có trong OPEN
+    """
+
+    def __init__(self, map_tiles, start_pos, bag, max_depth=20, object_index=None, epsilon=3.0, delta=0.5):
+        cmap = compile_map(map_tiles)
+        self.cmap = cmap
+        self.max_depth = max_depth
+        self.codec = codec = StateCodec(cmap)
+        self.fields = SearchFields(codec, cmap.distances,
+                                   object_index.distance_fields(cmap) if object_index is not None else None)
+        self.epsilon = epsilon
+        self.delta = delta
+        self.bound = INF
+        self.done = False
+        self.expanded = 0
+        self.peak_frontier = 0
+        self._proven = INF  # epsilon của lần ImprovePath chạy xong gần nhất
+
+        start = codec.start_state(start_pos, bag)
+        self.nodes = NodeStore(cmap.cols, codec.cell_of(start_pos))
+        self.g = {start: 0}
+        self.h = {start: self._heuristic(start)}
+        self.node = {start: 0}
+        self.open = []
+        self.open_set = set()
+        self.closed = set()
+        self.incons = set()
+        self.goal = None  # Trạng thái goal tốt nhất đã tìm được
+        if is_combo_goal(codec.decode(start)[1]):
+            self.goal = start
+        elif self.h[start] <= max_depth:
+            self.open.append((self.epsilon * self.h[start], 0, start))
+            self.open_set.add(start)
+
+    def _heuristic(self, state):
+        pos_cell, bag_code, objects = self.codec.decode(state)
+        if is_combo_goal(bag_code):
+            return 0
+        fields = self.fields
+        idx = fields.index[pos_cell]
+        if bag_code:
+            types = (bag_first(bag_code),)
+        else:
+            types = allowed_combo_objs(BAG_SIZE)
+        best = INF
+        for obj_type in types:
+            if objects & fields.type_bits[obj_type]:
+                best = min(best, fields.nearest(obj_type, objects)[idx])
+        return best
+
+    def _goal_cost(self):
+        return self.g[self.goal] if self.goal is not None else INF
+
+    def _improve_path(self, deadline):
+        """
+        ImprovePath của ARA*: mở rộng theo f = g + epsilon * h cho tới khi không còn nút nào có thể
+        cho đường tốt hơn goal hiện tại. Trả về False nếu hết giờ giữa chừng.
+        """
+        codec, cmap = self.codec, self.cmap
+        neighbors = cmap.neighbors
+        obj_slot, obj_vals = codec.obj_slot, codec.obj_vals
+        g_of, h_of, node_of = self.g, self.h, self.node
+        open_heap, open_set, closed, incons = self.open, self.open_set, self.closed, self.incons
+        epsilon, max_depth = self.epsilon, self.max_depth
+        count = 0
+        peak_frontier = self.peak_frontier
+        while open_heap:
+            if len(open_set) > peak_frontier:
+                self.peak_frontier = peak_frontier = len(open_set)
+            f, g, state = open_heap[0]
+            if state not in open_set or g != g_of[state]:
+                heapq.heappop(open_heap)  # Mục đã cũ (xóa lười)
+                continue
+            if self.goal is not None and self._goal_cost() <= f:
+                return True
+            count += 1
+            if deadline is not None and count % _CLOCK_EVERY == 0 and time.perf_counter() >= deadline:
+                return False
+            heapq.heappop(open_heap)
+            open_set.discard(state)
+            closed.add(state)
+            self.expanded += 1
+
+            pos_cell, bag_code, objects = codec.decode(state)
+            allowed = allowed_combo_objs(BAG_SIZE - bag_len(bag_code))
+            new_g = g + 1
+            for move_code, new_cell in neighbors[pos_cell]:
+                new_bag = bag_code
+                new_objects = objects
+                slot = obj_slot[new_cell]
+                if slot >= 0 and (objects >> slot) & 1:
+                    val = obj_vals[slot]
+                    # Cùng luật nhặt như _astar_find_combo
+                    if bag_code:
+                        if val != bag_first(bag_code):
+                            continue
+                    elif val not in allowed:
+                        continue
+                    new_bag = bag_push(bag_code, val)
+                    new_objects = objects & ~(1 << slot)
+
+                new_state = codec.encode(new_cell, new_bag, new_objects)
+                if new_g >= g_of.get(new_state, INF):
+                    continue
+                h = h_of.get(new_state)
+                if h is None:
+                    h = self._heuristic(new_state)
+                    h_of[new_state] = h
+                # Cận dưới đã vượt max_depth: không thể tới combo qua trạng thái này
+                if new_g + h > max_depth:
+                    continue
+                g_of[new_state] = new_g
+                node_of[new_state] = self.nodes.add(node_of[state], move_code, new_cell)
+                if h == 0:
+                    # Goal: không cần mở rộng tiếp, chỉ cập nhật đường tốt nhất
+                    if new_g < self._goal_cost():
+                        self.goal = new_state
+                    continue
+                if new_state in closed:
+                    incons.add(new_state)
+                else:
+                    open_set.add(new_state)
+                    heapq.heappush(open_heap, (new_g + epsilon * h, new_g, new_state))
+        return True
+
+    def _lower_bound(self):
+        # Cận dưới chi phí tối ưu: min g + h trên OPEN và INCONS (goal nếu không còn nút nào)
+        g_of, h_of = self.g, self.h
+        best = self._goal_cost()
+        for state in self.open_set:
+            best = min(best, g_of[state] + h_of[state])
+        for state in self.incons:
+            best = min(best, g_of[state] + h_of[state])
+        return best
+
+    def _update_bound(self, finished):
+        if finished:
+            self._proven = self.epsilon
+        cost = self._goal_cost()
+        if cost == INF:
+            self.bound = INF
+            self.done = not self.open_set and not self.incons
+            return
+        lower = self._lower_bound()
+        self.bound = min(self._proven, cost / lower) if lower > 0 else 1.0
+        self.done = self.bound <= 1.0
+
+    def search(self, deadline_ms=None):
+        """
+        Chạy (tiếp) ARA* tới khi tối ưu hoặc hết deadline_ms mili giây.
+
+        Trả về:
+            (path, bound): đường combo tốt nhất đã có ([] nếu chưa có) và cận tối ưu của nó
+        """
+        deadline = None if deadline_ms is None else time.perf_counter() + deadline_ms / 1000.0
+        while not self.done:
+            finished = self._improve_path(deadline)
+            self._update_bound(finished)
+            if not finished or self.done:
+                break
+            # Giảm epsilon, đưa INCONS trở lại OPEN và tính lại f với trọng số mới
+            self.epsilon = max(1.0, self.epsilon - self.delta)
+            self.open_set |= self.incons
+            self.incons = set()
+            self.closed = set()
+            g_of, h_of, epsilon = self.g, self.h, self.epsilon
+            self.open = [(g_of[s] + epsilon * h_of[s], g_of[s], s) for s in self.open_set]
+            heapq.heapify(self.open)
+        if self.goal is None:
+            return [], self.bound
+        return self.nodes.path(self.node[self.goal]), self.bound
+
+
+class AnytimeAStar:
+    """
+    Bộ tìm đường ARA* có trạng thái cho một người chơi: giữ các phiên tìm kiếm gần đây để lần gọi
+    sau với cùng truy vấn tiếp tục cải thiện đường combo.
+
+    Tham số khởi tạo:
+        max_depth: độ sâu tối đa khi tìm combo (như astar_search)
+        deadline_ms: thời hạn suy nghĩ của một lần gọi (None: chạy tới khi tối ưu)
+    """
+
+    def __init__(self, max_depth=20, deadline_ms=DEFAULT_DEADLINE_MS):
+        self.max_depth = max_depth
+        self.deadline_ms = deadline_ms
+        self.reset()
+
+    def reset(self):
+        """
+        Bỏ các phiên đang giữ (dùng khi Reset ván chơi hoặc đổi map).
+        """
+        self._sessions = {}
+
+    def plan(self, map_tiles, start_pos, bag, object_index=None):
+        """
+        Tìm đường cho AI theo ARA* có hạn thời gian:
+        1) Tìm combo trong max_depth bước, dừng sau deadline_ms mili giây với đường tốt nhất đã có
+           (gọi lại cùng vị trí, túi và vật phẩm trên map thì tiếp tục cải thiện).
+        2) Nếu không có đường combo, fallback như astar_search (nhặt vật gần nhất).
+
+        Trả về:
+            SearchResult (list (direction, (x, y)) kèm thống kê của lần gọi này); dòng ghi chú
+            "Bound" là cận tỉ lệ chi phí so với tối ưu của đường combo (1.0 là tối ưu), không có
+            nếu path là đường fallback
+        """
+        result = SearchResult()
+        if object_index is None:
+            object_index = ObjectIndex(map_tiles)
+        key = (start_pos, tuple(bag), object_index.signature)
+        session = self._sessions.get(key)
+        if session is None:
+            if len(self._sessions) >= _SESSIONS_SIZE:
+                self._sessions.pop(next(iter(self._sessions)))
+            session = AnytimeSession(map_tiles, start_pos, bag, self.max_depth, object_index)
+            self._sessions[key] = session
+        expanded, generated = session.expanded, len(session.nodes)
+        with result.phase("combo"):
+            combo_path, bound = session.search(self.deadline_ms)
+        # Phiên có thể được tiếp tục qua nhiều lần gọi: chỉ tính phần việc của lần gọi này
+        result.record(len(session.nodes) - generated, session.expanded - expanded,
+                      session.peak_frontier, len(session.g))
+        if combo_path:
+            result.notes.append(f"Bound: {bound:.2f}")
+            return result.finish(combo_path, "combo")
+
+        # Fallback: tìm nearest
+        if not bag:
+            target_vals = [0, 1, 2, 3, 4]
+        else:
+            last = bag[-1]
+            target_vals = [last] if object_index.has(last) else [0, 1, 2, 3, 4]
+        with result.phase("fallback"):
+            path = _astar_nearest_target(map_tiles, start_pos, target_vals, result)
+        return result.finish(path, "fallback")
@@ -1,93 +1,45 @@
-from collections import deque
+from map_handler import ObjectIndex, compile_map
+from search_state import StateCodec, NodeStore, TypeProjection, unpack_bag, bag_len, bag_first, bag_push
+from combo_rules import COMBO_RULES, BAG_SIZE, allowed_combo_objs, is_combo_goal
+from distance_field import nearest_target_path
+from search_result import SearchResult
 
 # --- CẤU TRÚC VÀ KHÁI NIỆM TRONG SEARCH ---
 # Backtracking with Forward Checking:
 # - Backtracking: Thuật toán tìm kiếm theo chiều sâu, thử từng khả năng và quay lui khi không thỏa
 # - Forward Checking: Kỹ thuật kiểm tra trước các ràng buộc để loại bỏ sớm các lựa chọn không khả thi
+# Trạng thái (pos, bag, objects) được nén thành một số nguyên (xem search_state.py)
 
-COMBO_RULES = {
-    0: (2, 200),
-    1: (3, 300),
-    2: (4, 400),
-    3: (5, 500),
-    4: (6, 600),
-}
-BAG_SIZE = 7
 
-# Các hướng di chuyển: tên và vector (dx, dy)
-DIRECTIONS = [
-    ("Up", (0, -1)),
-    ("Down", (0, 1)),
-    ("Left", (-1, 0)),
-    ("Right", (1, 0)),
-]
-
-
-def _allowed_combo_objs(empty_slots):
-    """
-    Dựa trên số ô trống trong túi, trả về danh sách obj có thể tạo combo:
-    - empty >=6: [0,1,2,3,4]
-    - empty ==5: [0,1,2,3]
-    - empty ==4: [0,1,2]
-    - empty ==3: [0,1]
-    - empty ==2: [0]
-    - else: []
-    """
-    if empty_slots >= 6:
-        return [0, 1, 2, 3, 4]
-    elif empty_slots == 5:
-        return [0, 1, 2, 3]
-    elif empty_slots == 4:
-        return [0, 1, 2]
-    elif empty_slots == 3:
-        return [0, 1]
-    elif empty_slots == 2:
-        return [0]
-    else:
-        return []
-
-
-def _check_combo_sim(bag, allowed_objs):
-    """
-    Kiểm tra xem bag (tuple) có chứa segment combo hợp lệ cho bất kỳ obj nào trong allowed_objs.
-    Trả về True ngay khi tìm thấy.
-    """
-    n = len(bag)
-    for obj in allowed_objs:
-        need, _ = COMBO_RULES[obj]
-        if n < need:
-            continue
-        # Duyệt các segment độ dài need
-        for i in range(n - need + 1):
-            if all(bag[i+j] == obj for j in range(need)):
-                return True
-    return False
-
-
-def _is_promising(map_tiles, pos, bag, objects, allowed_objs, target_obj=None):
+def _is_promising(codec, pos, bag_code, objects, target_obj=None):
     """
     Forward Checking: Kiểm tra xem trạng thái hiện tại có khả năng dẫn tới combo không.
     
     Tham số:
-        map_tiles: Bản đồ
-        pos: Vị trí hiện tại (x, y)
-        bag: Túi đồ hiện tại
-        objects: Các vị trí còn chứa object
-        allowed_objs: Các loại object được phép tạo combo
+        codec: Bộ mã hóa trạng thái (StateCodec) của lần tìm kiếm
+        pos: Chỉ số ô hiện tại
+        bag_code: Túi đồ hiện tại (đã nén)
+        objects: Bitmask các vật phẩm còn lại
         target_obj: Object đích cần nhặt (nếu có)
     
     Trả về:
         bool: True nếu trạng thái này có tiềm năng dẫn tới combo, False nếu không
     """
-    if _check_combo_sim(bag, allowed_objs):
+    if is_combo_goal(bag_code):
         return True  # Đã có combo
+    bag = unpack_bag(bag_code)
+    
+    obj_vals = codec.obj_vals
     
     # Nếu có target_obj, kiểm tra xem có thể tìm thấy đường đi đến một object loại target_obj nữa không
     if target_obj is not None:
         # Kiểm tra xem còn object loại target_obj trên bản đồ không
         found = False
-        for x, y in objects:
-            if map_tiles[y][x] == target_obj:
+        rest = objects
+        while rest:
+            low = rest & -rest
+            rest ^= low
+            if obj_vals[low.bit_length() - 1] == target_obj:
                 found = True
                 break
         
@@ -104,7 +56,13 @@ def _is_promising(map_tiles, pos, bag, objects, allowed_objs, target_obj=None):
         same_type_count = sum(1 for item in bag if item == obj_type)
         
         # Đếm số vật phẩm cùng loại còn lại trên bản đồ
-        map_same_type = sum(1 for x, y in objects if map_tiles[y][x] == obj_type)
+        map_same_type = 0
+        rest = objects
+        while rest:
+            low = rest & -rest
+            rest ^= low
+            if obj_vals[low.bit_length() - 1] == obj_type:
+                map_same_type += 1
         
         # Nếu tổng số vật phẩm hiện có và trên bản đồ không đủ để tạo combo
         if same_type_count + map_same_type < need:
@@ -113,76 +71,80 @@ def _is_promising(map_tiles, pos, bag, objects, allowed_objs, target_obj=None):
     return True  # Các trường hợp khác có thể có tiềm năng
 
 
-def _backtrack_find_combo(map_tiles, start_pos, bag, max_depth):
+def _backtrack_find_combo(map_tiles, start_pos, bag, max_depth, stats=None):
     """
     Sử dụng backtracking với forward checking để tìm đường tới trạng thái có combo.
     Trả về list of (direction, pos) nếu tìm được, ngược lại []
-    """
-    rows = len(map_tiles)
-    cols = len(map_tiles[0])
-
-    # Tập các vị trí còn chứa object
-    initial_objects = frozenset(
-        (x, y)
-        for y in range(rows)
-        for x in range(cols)
-        if isinstance(map_tiles[y][x], int)
-    )
-    
-    # Khởi tạo trạng thái đầu và đường đi
-    stack = [(start_pos, tuple(bag), initial_objects, [], 0)]
-    visited = set([(start_pos, tuple(bag), initial_objects)])
+    stats: SearchResult (nếu có) để cộng số nút sinh/mở rộng, kích thước stack và visited
+    """
+    # Map biên dịch: bảng ô kề đi được tính sẵn theo bố cục tường
+    cmap = compile_map(map_tiles)
+    cols = cmap.cols
+
+    # Bộ mã hóa trạng thái: tập vật phẩm ban đầu trở thành bitmask
+    codec = StateCodec(cmap)
+    obj_slot = codec.obj_slot
+    obj_vals = codec.obj_vals
+    start_state = codec.start_state(start_pos, bag)
+    # Chiếu trạng thái về loại vật phẩm liên quan: khóa visited gọn hơn,
+    # vật phẩm loại khác được coi là tường
+    projection = TypeProjection(cmap, codec, bag)
+    
+    # Khởi tạo trạng thái đầu; đường đi lưu bằng con trỏ cha trong NodeStore
+    nodes = NodeStore(cols, codec.cell_of(start_pos))
+    stack = [(start_state, 0, 0)]
+    visited = set([projection.key(start_state, codec.decode(start_state)[1])])
     
     best_path = None
+    expanded = peak_frontier = 0
     
     while stack:
-        pos, bag_tup, objects, path, depth = stack.pop()
+        if len(stack) > peak_frontier:
+            peak_frontier = len(stack)
+        state, node, depth = stack.pop()
         
         # Giới hạn độ sâu
         if depth > max_depth:
             continue
         
-        # Tính số ô trống trong túi
-        empty_slots = BAG_SIZE - len(bag_tup)
-        allowed = _allowed_combo_objs(empty_slots)
+        pos_cell, bag_code, objects = codec.decode(state)
         
-        # Kiểm tra goal: combo
-        if _check_combo_sim(bag_tup, allowed):
+        # Kiểm tra goal: combo (tra bảng theo túi đã nén)
+        if is_combo_goal(bag_code):
             # Nếu tìm thấy combo, trả về đường đi
-            return path
+            if stats is not None:
+                stats.record(len(nodes) - 1, expanded, peak_frontier, len(visited))
+            return nodes.path(node)
+        
+        # Tính số ô trống trong túi
+        empty_slots = BAG_SIZE - bag_len(bag_code)
+        allowed = allowed_combo_objs(empty_slots)
         
         # Forward Checking: Kiểm tra xem trạng thái hiện tại có tiềm năng dẫn tới combo không
-        target_obj = bag_tup[0] if bag_tup else None
-        if not _is_promising(map_tiles, pos, bag_tup, objects, allowed, target_obj):
+        target_obj = bag_first(bag_code)
+        if not _is_promising(codec, pos_cell, bag_code, objects, target_obj):
             continue
+        expanded += 1
         
-        # Mở rộng các bước kế tiếp
-        x0, y0 = pos
+        # Mặt nạ khóa visited của các trạng thái con (chỉ đổi khi nhặt món đầu tiên vào túi rỗng)
+        keep = projection.keep(bag_code)
         
-        # Xem xét tất cả các hướng di chuyển
-        for dir_name, (dx, dy) in DIRECTIONS:
-            nx, ny = x0 + dx, y0 + dy
-            
-            # Kiểm tra hợp lệ trong map và không phải wall
-            if not (0 <= nx < cols and 0 <= ny < rows):
-                continue
-            cell = map_tiles[ny][nx]
-            if isinstance(cell, str) and cell != ' ':
-                # wall hoặc chướng ngại khác
-                continue
-            
+        # Mở rộng các bước kế tiếp
+        # Xem xét tất cả các hướng di chuyển (ô tường và vật phẩm loại khác đã bị loại khỏi bảng ô kề)
+        for move_code, new_cell in projection.neighbors(bag_code)[pos_cell]:
             # Tạo state mới
-            new_bag = list(bag_tup)
+            new_bag = bag_code
             new_objects = objects
             
             # Nếu có object ở ô mới
-            if (nx, ny) in objects:
-                val = map_tiles[ny][nx]
+            slot = obj_slot[new_cell]
+            if slot >= 0 and (objects >> slot) & 1:
+                val = obj_vals[slot]
                 
                 # Forward checking: Kiểm tra điều kiện trước khi nhặt
-                if new_bag:
+                if bag_code:
                     # Nếu đã có vật phẩm trong túi, chỉ nhặt cùng loại
-                    candidate = new_bag[0]
+                    candidate = bag_first(bag_code)
                     if val != candidate:
                         continue  # Bỏ qua vì không được nhặt vật phẩm khác loại
                 else:
@@ -191,151 +153,72 @@ def _backtrack_find_combo(map_tiles, start_pos, bag, max_depth):
                         continue  # Bỏ qua vì loại vật phẩm không được phép
                 
                 # Thêm vật phẩm vào túi
-                new_bag.append(val)
-                if len(new_bag) > BAG_SIZE:
-                    new_bag.pop(0)
+                new_bag = bag_push(bag_code, val)
                 
-                # Loại bỏ vật phẩm khỏi bản đồ
-                new_objects = objects.difference({(nx, ny)})
+                # Loại bỏ vật phẩm khỏi bitmask objects
+                new_objects = objects & ~(1 << slot)
             
             # Tạo trạng thái mới và kiểm tra đã thăm chưa
-            new_state = ((nx, ny), tuple(new_bag), new_objects)
-            if new_state in visited:
+            new_state = codec.encode(new_cell, new_bag, new_objects)
+            key = new_state & (keep if new_bag == bag_code or bag_code else projection.keep(new_bag))
+            if key in visited:
                 continue
             
-            visited.add(new_state)
+            visited.add(key)
             stack.append((
-                (nx, ny),
-                tuple(new_bag),
-                new_objects,
-                path + [(dir_name, (nx, ny))],
+                new_state,
+                nodes.add(node, move_code, new_cell),
                 depth + 1
             ))
     
+    if stats is not None:
+        stats.record(len(nodes) - 1, expanded, peak_frontier, len(visited))
     return []  # Không tìm thấy đường đi đến combo
 
 
-def _calculate_manhattan_distance(pos1, pos2):
-    """
-    Tính khoảng cách Manhattan giữa hai điểm
-    """
-    return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
-
-
-def _reconstruct_path(came_from, current_pos):
-    """
-    Tạo lại đường đi từ điểm bắt đầu đến điểm hiện tại
-    """
-    path = []
-    while current_pos in came_from:
-        direction, prev_pos = came_from[current_pos]
-        path.append((direction, current_pos))
-        current_pos = prev_pos
-    
-    return path[::-1]  # Đảo ngược để có thứ tự từ đầu đến cuối
-
-
 def _backtrack_nearest_target(map_tiles, start_pos, target_vals):
     """
     Tìm đường ngắn nhất tới vật phẩm mục tiêu.
-    Kết hợp A* để tìm đường ngắn nhất với forward checking để loại sớm các đường đi không hợp lệ.
+    Forward checking: ô chứa vật phẩm khác loại bị loại ngay khi lan sóng khoảng cách
+    (xem distance_field.py), đường đi lấy bằng cách xuống dốc từ start_pos.
     """
-    rows = len(map_tiles)
-    cols = len(map_tiles[0])
-    
-    # Danh sách các điểm đến (vị trí các vật phẩm mục tiêu)
-    target_positions = []
-    for y in range(rows):
-        for x in range(cols):
-            if isinstance(map_tiles[y][x], int) and map_tiles[y][x] in target_vals:
-                target_positions.append((x, y))
-    
-    if not target_positions:
-        return []  # Không có vật phẩm mục tiêu nào
-    
-    # Sử dụng A* để tìm đường đi ngắn nhất
-    open_set = deque([(start_pos, 0)])  # (pos, cost)
-    came_from = {}  # Lưu lại đường đi
-    cost_so_far = {start_pos: 0}  # Chi phí đến mỗi điểm
-    
-    while open_set:
-        current_pos, current_cost = open_set.popleft()
-        
-        # Nếu đến đích (vật phẩm mục tiêu)
-        x, y = current_pos
-        if isinstance(map_tiles[y][x], int) and map_tiles[y][x] in target_vals:
-            return _reconstruct_path(came_from, current_pos)
-        
-        # Xét các hướng di chuyển
-        for dir_name, (dx, dy) in DIRECTIONS:
-            nx, ny = x + dx, y + dy
-            next_pos = (nx, ny)
-            
-            # Kiểm tra hợp lệ
-            if not (0 <= nx < cols and 0 <= ny < rows):
-                continue
-            
-            cell = map_tiles[ny][nx]
-            # Bỏ qua ô tường
-            if isinstance(cell, str) and cell != ' ':
-                continue
-            
-            # Forward checking: Kiểm tra nếu ô chứa vật phẩm không nằm trong target_vals
-            if isinstance(cell, int) and cell not in target_vals:
-                continue  # Bỏ qua vì không được nhặt vật phẩm khác loại
-            
-            # Tính toán chi phí mới
-            new_cost = current_cost + 1
-            
-            # Nếu vị trí mới chưa được thăm hoặc chi phí mới tốt hơn
-            if next_pos not in cost_so_far or new_cost < cost_so_far[next_pos]:
-                cost_so_far[next_pos] = new_cost
-                
-                # Sắp xếp theo khoảng cách Manhattan đến target gần nhất
-                priority = new_cost + min(_calculate_manhattan_distance(next_pos, target) for target in target_positions)
-                
-                # Thêm vào open_set theo thứ tự ưu tiên
-                # (Đơn giản hóa bằng cách dùng deque, không phải priority queue)
-                open_set.append((next_pos, new_cost))
-                
-                # Lưu lại đường đi
-                came_from[next_pos] = (dir_name, current_pos)
-    
-    return []  # Không tìm thấy đường đi
-
+    cmap = compile_map(map_tiles)
+    return nearest_target_path(cmap, start_pos, target_vals)
 
-def backtracking_with_forward_checking(map_tiles, start_pos, bag, max_depth=70):
+def backtracking_with_forward_checking(map_tiles, start_pos, bag, max_depth=70, object_index=None):
     """
     Tìm đường cho AI sử dụng backtracking với forward checking:
     1) Thử tìm combo trong max_depth bước.
     2) Nếu không tìm được, fallback:
        - Nếu bag rỗng: nhặt bất kỳ vật gần nhất
        - Nếu bag không rỗng: nhặt vật cùng loại với item vừa được thêm vào túi
+    object_index: ObjectIndex của game (nếu có) để tra nhanh vật phẩm còn trên map
+    Trả về SearchResult (list các bước kèm thống kê tìm kiếm)
     """
+    result = SearchResult()
     # 1) Tìm combo
-    combo_path = _backtrack_find_combo(map_tiles, start_pos, bag, max_depth)
+    with result.phase("combo"):
+        combo_path = _backtrack_find_combo(map_tiles, start_pos, bag, max_depth, result)
     if combo_path:
-        return combo_path
+        return result.finish(combo_path, "combo")
     
     # 2) Fallback: tìm nearest
-    rows = len(map_tiles)
-    cols = len(map_tiles[0])
-    
     # Xác định target_vals dựa trên túi
     if not bag:
         target_vals = [0, 1, 2, 3, 4]
     else:
         last = bag[-1]
-        # Kiểm tra xem map còn object cùng loại last hay không
-        exists_same = any(
-            isinstance(map_tiles[y][x], int) and map_tiles[y][x] == last
-            for y in range(rows)
-            for x in range(cols)
-        )
+        # Kiểm tra xem map còn object cùng loại last hay không (tra trong chỉ mục vật phẩm,
+        # dựng từ map nếu không được truyền vào)
+        if object_index is None:
+            object_index = ObjectIndex(map_tiles)
+        exists_same = object_index.has(last)
         if exists_same:
             target_vals = [last]
         else:
             # Nếu không còn, nhặt gần nhất bất kỳ
             target_vals = [0, 1, 2, 3, 4]
     
-    return _backtrack_nearest_target(map_tiles, start_pos, target_vals)
+    with result.phase("fallback"):
+        path = _backtrack_nearest_target(map_tiles, start_pos, target_vals)
+    return result.finish(path, "fallback")
@@ -0,0 +1,114 @@
+import heapq
+
+from map_handler import ObjectIndex, compile_map
+from search_state import StateCodec, NodeStore, DIRECTION_CODES, bag_len, bag_first
+from combo_rules import BAG_SIZE, allowed_combo_objs, is_combo_goal
+from distance_field import SearchFields
+from searchSimulatedAnnealing import _evaluate_state, _get_valid_neighbors
+from searchAStar import _astar_nearest_target
+from search_result import SearchResult
+
+# --- BEAM SEARCH TÌM COMBO VỚI KHỐI LƯỢNG CÔNG VIỆC CÓ CHẶN ---
+# Duyệt theo từng lớp độ sâu như BFS nhưng mỗi lớp chỉ giữ lại width trạng thái tốt nhất theo
+# _evaluate_state (searchSimulatedAnnealing.py), nên mỗi lần gọi mở rộng nhiều nhất
+# width * max_depth nút, dù map đông hay thưa. Đổi lại không đảm bảo tìm được combo hay đường
+# ngắn nhất. Sinh trạng thái con bằng _get_valid_neighbors (cùng luật nhặt như các planner khác);
+# trạng thái đã gặp ở lớp trước không được xét lại.
+
+# Số trạng thái giữ lại ở mỗi lớp mặc định
+DEFAULT_WIDTH = 32
+
+
+def _beam_find_combo(map_tiles, start_pos, bag, max_depth, width, object_index=None, stats=None):
+    """
+    Beam search tìm đường tới trạng thái có combo trong max_depth bước.
+
+    Tham số:
+        stats: SearchResult (nếu có) để cộng số nút sinh/mở rộng (mở rộng không quá
+               width * max_depth), số ứng viên lớn nhất của một lớp và số trạng thái đã vào beam
+
+    Trả về:
+        list (direction, pos) nếu tìm được, ngược lại []
+    """
+    cmap = compile_map(map_tiles)
+    codec = StateCodec(cmap)
+    cell_mask = codec.cell_mask
+    fields = SearchFields(codec, cmap.distances,
+                          object_index.distance_fields(cmap) if object_index is not None else None)
+
+    start_state = codec.start_state(start_pos, bag)
+    nodes = NodeStore(cmap.cols, codec.cell_of(start_pos))
+    if is_combo_goal(codec.decode(start_state)[1]):
+        return []
+
+    def score(state):
+        # Điểm của SA, ưu tiên loại đang gom trong túi
+        bag_code = codec.decode(state)[1]
+        return _evaluate_state(state, codec, fields, bag_first(bag_code) if bag_code else None)
+
+    # Lớp hiện tại: list (state, node); seen giữ các trạng thái đã vào beam (tối đa width mỗi lớp)
+    beam = [(start_state, 0)]
+    seen = {start_state}
+    expanded = peak_frontier = 0
+    path = []
+
+    for _ in range(max_depth):
+        candidates = {}
+        for state, node in beam:
+            expanded += 1
+            bag_code = codec.decode(state)[1]
+            allowed = allowed_combo_objs(BAG_SIZE - bag_len(bag_code))
+            for dir_name, new_state in _get_valid_neighbors(state, cmap, codec, allowed):
+                if new_state in seen or new_state in candidates:
+                    continue
+                new_node = nodes.add(node, DIRECTION_CODES[dir_name], new_state & cell_mask)
+                if is_combo_goal(codec.decode(new_state)[1]):
+                    path = nodes.path(new_node)
+                    break
+                candidates[new_state] = new_node
+            if path:
+                break
+        peak_frontier = max(peak_frontier, len(candidates))
+        if path or not candidates:
+            break
+
+        # Giữ width trạng thái có điểm cao nhất
+        best = heapq.nlargest(width, candidates, key=score)
+        beam = [(state, candidates[state]) for state in best]
+        seen.update(best)
+
+    if stats is not None:
+        stats.record(len(nodes) - 1, expanded, peak_frontier, len(seen))
+    return path
+
+
+def beam_search(map_tiles, start_pos, bag, max_depth=30, object_index=None, width=DEFAULT_WIDTH):
+    """
+    Tìm đường cho AI theo beam search (mỗi lần gọi mở rộng không quá width * max_depth nút):
+    1) Thử tìm combo trong max_depth bước.
+    2) Nếu không tìm được, fallback:
+       - Nếu bag rỗng: nhặt bất kỳ vật gần nhất
+       - Nếu bag không rỗng: nhặt vật cùng loại với item VỪA MỚI ĐƯỢC THÊM VÀO trong bag
+    object_index: ObjectIndex của game (nếu có) để tra nhanh vật phẩm còn trên map
+
+    Trả về:
+        SearchResult (list các bước kèm thống kê; expanded là số nút beam search đã mở rộng)
+    """
+    result = SearchResult()
+    # 1) Tìm combo
+    with result.phase("combo"):
+        combo_path = _beam_find_combo(map_tiles, start_pos, bag, max_depth, width, object_index, result)
+    if combo_path:
+        return result.finish(combo_path, "combo")
+
+    # 2) Fallback: tìm nearest
+    if not bag:
+        target_vals = [0, 1, 2, 3, 4]
+    else:
+        last = bag[-1]
+        if object_index is None:
+            object_index = ObjectIndex(map_tiles)
+        target_vals = [last] if object_index.has(last) else [0, 1, 2, 3, 4]
+    with result.phase("fallback"):
+        path = _astar_nearest_target(map_tiles, start_pos, target_vals, result)
+    return result.finish(path, "fallback")
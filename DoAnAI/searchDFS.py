@@ -1,10 +1,15 @@
 from collections import deque
 
+from map_handler import ObjectIndex, compile_map
+from search_state import StateCodec, NodeStore, TypeProjection, bag_len, bag_first, bag_push
+from combo_rules import BAG_SIZE, allowed_combo_objs, is_combo_goal
+from search_result import SearchResult
+
 # --- CẤU TRÚC VÀ KHÁI NIỆM ---
-# Mỗi trạng thái được mô tả bởi:
-#   - pos: vị trí người chơi (x, y)
-#   - bag: tuple các vật phẩm hiện có trong túi (giữ thứ tự theo hàng đợi)
-#   - objects: frozenset các vị trí (x, y) trên map còn chứa vật phẩm
+# Mỗi trạng thái được mô tả bởi (nén thành một số nguyên, xem search_state.py):
+#   - pos: chỉ số ô của người chơi
+#   - bag: túi nén 3 bit mỗi ô (giữ thứ tự theo hàng đợi)
+#   - objects: bitmask các vật phẩm còn trên map
 #
 # Không gian trạng thái ban đầu (S0):
 #   - pos = start_pos (từ game hiện tại)
@@ -16,195 +21,162 @@ from collections import deque
 #     tức là bag mới chứa segment liên tiếp đúng loại và đúng số lượng.
 #   - Nếu không tìm được combo trong max_depth, ta fallback sang nhặt vật gần nhất.
 
-COMBO_RULES = {
-    0: (2, 200),
-    1: (3, 300),
-    2: (4, 400),
-    3: (5, 500),
-    4: (6, 600),
-}
-BAG_SIZE = 7
-
-# Các hướng di chuyển: tên và vector (dx, dy)
-DIRECTIONS = [
-    ("Up", (0, -1)),
-    ("Down", (0, 1)),
-    ("Left", (-1, 0)),
-    ("Right", (1, 0)),
-]
 
-def _allowed_combo_objs(empty_slots):
-    """
-    Dựa trên số ô trống trong túi, trả về danh sách obj có thể tạo combo.
-    """
-    if empty_slots >= 6:
-        return [0, 1, 2, 3, 4]
-    elif empty_slots == 5:
-        return [0, 1, 2, 3]
-    elif empty_slots == 4:
-        return [0, 1, 2]
-    elif empty_slots == 3:
-        return [0, 1]
-    elif empty_slots == 2:
-        return [0]
-    else:
-        return []
-
-def _check_combo_sim(bag, allowed_objs):
-    """
-    Kiểm tra xem bag (tuple) có chứa segment combo hợp lệ cho bất kỳ obj nào trong allowed_objs.
-    Trả về True nếu tìm thấy.
-    """
-    n = len(bag)
-    for obj in allowed_objs:
-        need, _ = COMBO_RULES[obj]
-        if n < need:
-            continue
-        for i in range(n - need + 1):
-            if all(bag[i+j] == obj for j in range(need)):
-                return True
-    return False
-
-def _dfs_find_combo(map_tiles, start_pos, bag, max_depth):
+def _dfs_find_combo(map_tiles, start_pos, bag, max_depth, stats=None):
     """
     DFS giới hạn độ sâu max_depth để tìm đường tới trạng thái có combo.
     Trả về list of (direction, pos) nếu tìm được, ngược lại [].
+    stats: SearchResult (nếu có) để cộng số nút sinh/mở rộng, kích thước stack và visited
     """
-    rows = len(map_tiles)
-    cols = len(map_tiles[0])
-    
-    # Tập các vị trí còn chứa object
-    initial_objects = frozenset(
-        (x, y)
-        for y in range(rows)
-        for x in range(cols)
-        if isinstance(map_tiles[y][x], int)
-    )
+    # Map biên dịch: bảng ô kề đi được tính sẵn theo bố cục tường
+    cmap = compile_map(map_tiles)
+    cols = cmap.cols
     
-    start_state = (start_pos, tuple(bag), initial_objects)
+    # Bộ mã hóa trạng thái: tập vật phẩm ban đầu trở thành bitmask
+    codec = StateCodec(cmap)
+    obj_slot = codec.obj_slot
+    obj_vals = codec.obj_vals
+    start_state = codec.start_state(start_pos, bag)
+    # Chiếu trạng thái về loại vật phẩm liên quan: khóa visited gọn hơn,
+    # vật phẩm loại khác được coi là tường
+    projection = TypeProjection(cmap, codec, bag)
+    # Cây tìm kiếm lưu bằng con trỏ cha, path chỉ dựng lại khi tới goal
+    nodes = NodeStore(cols, codec.cell_of(start_pos))
+    depths = nodes.depth
     
-    # Stack dùng để DFS: mỗi phần tử là (state, path)
+    # Stack dùng để DFS: mỗi phần tử là (state, chỉ số nút)
     stack = []
-    stack.append((start_state, []))
+    stack.append((start_state, 0))
     
     visited = set()
-    visited.add(start_state)
+    visited.add(projection.key(start_state, codec.decode(start_state)[1]))
+    expanded = peak_frontier = 0
     
     while stack:
-        (pos, bag_tup, objects), path = stack.pop()
+        if len(stack) > peak_frontier:
+            peak_frontier = len(stack)
+        state, node = stack.pop()
         
         # Giới hạn độ sâu
-        if len(path) > max_depth:
+        if depths[node] > max_depth:
             continue
         
-        empty_slots = BAG_SIZE - len(bag_tup)
-        allowed = _allowed_combo_objs(empty_slots)
-        if _check_combo_sim(bag_tup, allowed):
-            return path  # Đã tìm được combo
+        pos_cell, bag_code, objects = codec.decode(state)
+        if is_combo_goal(bag_code):
+            if stats is not None:
+                stats.record(len(nodes) - 1, expanded, peak_frontier, len(visited))
+            return nodes.path(node)  # Đã tìm được combo
+        expanded += 1
+        empty_slots = BAG_SIZE - bag_len(bag_code)
+        allowed = allowed_combo_objs(empty_slots)
+        # Mặt nạ khóa visited của các trạng thái con (chỉ đổi khi nhặt món đầu tiên vào túi rỗng)
+        keep = projection.keep(bag_code)
         
-        x0, y0 = pos
-        for dir_name, (dx, dy) in DIRECTIONS:
-            nx, ny = x0 + dx, y0 + dy
-            
-            if not (0 <= nx < cols and 0 <= ny < rows):
-                continue
-            cell = map_tiles[ny][nx]
-            if isinstance(cell, str) and cell != ' ':
-                continue
-            
-            new_bag = list(bag_tup)
+        for move_code, new_cell in projection.neighbors(bag_code)[pos_cell]:
+            new_bag = bag_code
             new_objects = objects
             # Nếu có object ở ô mới
-            if (nx, ny) in objects:
-                val = map_tiles[ny][nx]
+            slot = obj_slot[new_cell]
+            if slot >= 0 and (objects >> slot) & 1:
+                val = obj_vals[slot]
                 # Nếu đã có vật trong túi, chỉ cho phép nhặt nếu nó cùng loại với phần tử đầu tiên (hoặc có thể dùng bag[-1] tùy chiến lược)
-                if new_bag:
-                    candidate = new_bag[0]
+                if bag_code:
+                    candidate = bag_first(bag_code)
                     if val != candidate:
                         continue
                 else:
                     if val not in allowed:
                         continue
-                new_bag.append(val)
-                if len(new_bag) > BAG_SIZE:
-                    new_bag.pop(0)
-                new_objects = objects.difference({(nx, ny)})
+                new_bag = bag_push(bag_code, val)
+                new_objects = objects & ~(1 << slot)
             
-            new_state = ((nx, ny), tuple(new_bag), new_objects)
-            if new_state in visited:
+            new_state = codec.encode(new_cell, new_bag, new_objects)
+            key = new_state & (keep if new_bag == bag_code or bag_code else projection.keep(new_bag))
+            if key in visited:
                 continue
-            visited.add(new_state)
-            stack.append((new_state, path + [(dir_name, (nx, ny))]))
+            visited.add(key)
+            stack.append((new_state, nodes.add(node, move_code, new_cell)))
     
+    if stats is not None:
+        stats.record(len(nodes) - 1, expanded, peak_frontier, len(visited))
     return []
 
-def _dfs_nearest_target(map_tiles, start_pos, target_vals):
+def _dfs_nearest_target(map_tiles, start_pos, target_vals, stats=None):
     """
     DFS để tìm đường (không tối ưu về độ dài) tới ô chứa giá trị trong target_vals.
     Đảm bảo không nhặt vật phẩm khác trên đường đi.
     Trả về path list hoặc [] nếu không tìm.
+    stats: SearchResult (nếu có) để cộng thống kê như _dfs_find_combo
     """
-    rows = len(map_tiles)
-    cols = len(map_tiles[0])
+    cmap = compile_map(map_tiles)
+    neighbors = cmap.neighbors
+    obj_type = cmap.obj_type
+    start_cell = cmap.cell_of(start_pos)
     
-    # Stack cho DFS: (position, path)
+    # Stack cho DFS: (ô, chỉ số nút)
+    nodes = NodeStore(cmap.cols, start_cell)
     stack = []
-    stack.append((start_pos, []))
-    visited = set([start_pos])
+    stack.append((start_cell, 0))
+    visited = set([start_cell])
+    expanded = peak_frontier = 0
     
     while stack:
-        (x0, y0), path = stack.pop()
-        cell = map_tiles[y0][x0]
-        if isinstance(cell, int) and cell in target_vals:
-            return path  # Đã tìm thấy ô mục tiêu
+        if len(stack) > peak_frontier:
+            peak_frontier = len(stack)
+        cur, node = stack.pop()
+        if obj_type[cur] in target_vals:
+            if stats is not None:
+                stats.record(len(nodes) - 1, expanded, peak_frontier, len(visited))
+            return nodes.path(node)  # Đã tìm thấy ô mục tiêu
+        expanded += 1
         
-        for dir_name, (dx, dy) in DIRECTIONS:
-            nx, ny = x0 + dx, y0 + dy
-            if not (0 <= nx < cols and 0 <= ny < rows):
-                continue
-            c = map_tiles[ny][nx]
-            if isinstance(c, str) and c != ' ':
-                continue
+        for move_code, ncell in neighbors[cur]:
             # Nếu ô có vật phẩm nhưng không thuộc target, không được nhặt
-            if isinstance(c, int) and c not in target_vals:
+            val = obj_type[ncell]
+            if val >= 0 and val not in target_vals:
                 continue
-            if (nx, ny) in visited:
+            if ncell in visited:
                 continue
-            visited.add((nx, ny))
-            stack.append(((nx, ny), path + [(dir_name, (nx, ny))]))
+            visited.add(ncell)
+            stack.append((ncell, nodes.add(node, move_code, ncell)))
     
+    if stats is not None:
+        stats.record(len(nodes) - 1, expanded, peak_frontier, len(visited))
     return []
 
-def dfs_search(map_tiles, start_pos, bag, max_depth=50):
+def dfs_search(map_tiles, start_pos, bag, max_depth=50, object_index=None):
     """
     Tìm đường cho AI theo DFS:
     1) Thử tìm combo trong max_depth bước.
     2) Nếu không tìm được, fallback:
        - Nếu bag rỗng: nhặt bất kỳ vật nào (0..4)
        - Nếu bag không rỗng: nhặt vật cùng loại với item VỪA MỚI ĐƯỢC THÊM vào trong bag.
+    object_index: ObjectIndex của game (nếu có) để tra nhanh vật phẩm còn trên map
+    Trả về SearchResult (list các bước kèm thống kê tìm kiếm)
     """
-    combo_path = _dfs_find_combo(map_tiles, start_pos, bag, max_depth)
+    result = SearchResult()
+    with result.phase("combo"):
+        combo_path = _dfs_find_combo(map_tiles, start_pos, bag, max_depth, result)
     if combo_path:
-        return combo_path
+        return result.finish(combo_path, "combo")
 
     # 2) Fallback: tìm nearest
-    rows = len(map_tiles)
-    cols = len(map_tiles[0])
     # Xác định target_vals dựa trên túi
     if not bag:
         target_vals = [0,1,2,3,4]
     else:
         last = bag[-1]
-        # Kiểm tra xem map còn object cùng loại last hay không
-        exists_same = any(
-            isinstance(map_tiles[y][x], int) and map_tiles[y][x] == last
-            for y in range(rows)
-            for x in range(cols)
-        )
+        # Kiểm tra xem map còn object cùng loại last hay không (tra trong chỉ mục vật phẩm,
+        # dựng từ map nếu không được truyền vào)
+        if object_index is None:
+            object_index = ObjectIndex(map_tiles)
+        exists_same = object_index.has(last)
         if exists_same:
             target_vals = [last]
         else:
             # Nếu không còn, nhặt gần nhất bất kỳ
             target_vals = [0,1,2,3,4]
     
-    return _dfs_nearest_target(map_tiles, start_pos, target_vals)
+    with result.phase("fallback"):
+        path = _dfs_nearest_target(map_tiles, start_pos, target_vals, result)
+    return result.finish(path, "fallback")
@@ -0,0 +1,388 @@
+import heapq
+
+from map_handler import ObjectIndex, OBJECT_TYPES, UNREACHABLE, compile_map
+from search_state import DIRECTION_NAMES
+from combo_rules import COMBO_RULES, BAG_SIZE
+from searchAStar import _astar_find_combo
+from search_result import SearchResult
+
+# --- TÌM ĐƯỜNG TĂNG DẦN (D* LITE) CHO CHẾ ĐỘ ĐẤU (battleAI.py) ---
+# Trong trận đấu, đường đi của một AI bị tính lại rất thường xuyên: vật phẩm mục tiêu bị AI khác
+# lấy mất, vật phẩm mới được thả xuống, hoặc AI đi hết đường. Giữa hai lần tính, map chỉ đổi ở
+# vài ô và AI chỉ đi thêm vài bước, nên IncrementalPlanner giữ lại kết quả giữa các lần gọi:
+#   - Giai đoạn nearest: D* Lite tìm ngược từ tập ô mục tiêu về vị trí AI. Cây tìm kiếm (g, rhs)
+#     được giữ lại; khi một ô đổi trạng thái (vật phẩm bị nhặt/được thả) chỉ các ô bị ảnh hưởng
+#     được sửa, khi AI di chuyển chỉ cần tăng km (không sắp xếp lại hàng đợi).
+#   - Giai đoạn combo: kế hoạch combo (A*) được giữ lại cùng nội dung các ô trên đường đi lúc lập
+#     kế hoạch; nếu phần đường còn lại không bị đổi thì dùng tiếp, chỉ tìm lại khi bị ảnh hưởng.
+#     (Không gian trạng thái combo gồm cả túi và tập vật phẩm nên không sửa cây A* tại chỗ.)
+#     Khi chưa có kế hoạch, một cận dưới số bước tới combo (tính từ trường khoảng cách theo loại
+#     của ObjectIndex) cho phép bỏ qua lần tìm A* chắc chắn thất bại trong max_depth bước.
+#
+# Chi phí: đi vào ô trống hoặc ô mục tiêu tốn 1, ô tường và ô chứa vật phẩm không phải mục tiêu
+# bị chặn (giống nearest_target_path trong distance_field.py).
+
+INF = float('inf')
+
+
+class DStarLite:
+    """
+    D* Lite tìm đường ngắn nhất từ vị trí người chơi tới ô mục tiêu gần nhất trên CompiledMap.
+
+    Thuộc tính:
+        cmap: map đã biên dịch (bảng ô kề theo bố cục tường)
+        goal: bytearray, 1 nếu ô là mục tiêu
+        blocked: bytearray, 1 nếu ô bị chặn (vật phẩm không phải mục tiêu)
+        g, rhs: giá trị của D* Lite theo chỉ số ô
+        start: ô hiện tại của người chơi
+        expanded: số lần mở rộng nút (thống kê)
+    """
+
+    def __init__(self, cmap, goals, blocked, start):
+        self.cmap = cmap
+        self.cols = cmap.cols
+        self.goal = bytearray(cmap.size)
+        self.blocked = bytearray(cmap.size)
+        for cell in goals:
+            self.goal[cell] = 1
+        for cell in blocked:
+            self.blocked[cell] = 1
+        self._xy = [(cell % cmap.cols, cell // cmap.cols) for cell in range(cmap.size)]
+        self.g = [INF] * cmap.size
+        self.rhs = [INF] * cmap.size
+        self.start = start
+        self.last = start
+        self.km = 0
+        self.expanded = 0
+        self._open = []
+        self._key = {}
+        for cell in goals:
+            self.rhs[cell] = 0
+            self._push(cell)
+
+    def _calculate_key(self, cell):
+        m = min(self.g[cell], self.rhs[cell])
+        sx, sy = self._xy[self.start]
+        x, y = self._xy[cell]
+        # Khoảng cách Manhattan tới ô người chơi: heuristic nhất quán trên lưới 4 hướng
+        return (m + abs(x - sx) + abs(y - sy) + self.km, m)
+
+    def _push(self, cell):
+        key = self._calculate_key(cell)
+        if self._key.get(cell) != key:
+            self._key[cell] = key
+            heapq.heappush(self._open, (key, cell))
+
+    def _update_vertex(self, cell):
+        if not self.goal[cell]:
+            best = INF
+            g, blocked = self.g, self.blocked
+            for _, ncell in self.cmap.neighbors[cell]:
+                if not blocked[ncell] and g[ncell] < best:
+                    best = g[ncell]
+            self.rhs[cell] = best + 1
+        if self.g[cell] != self.rhs[cell]:
+            self._push(cell)
+        else:
+            self._key.pop(cell, None)
+
+    def compute(self):
+        """
+        Cập nhật g cho tới khi ô người chơi nhất quán (ComputeShortestPath của D* Lite, bản tối ưu:
+        nút giảm g chỉ hạ rhs của ô kề, nút tăng g chỉ tính lại rhs các ô kề đang dựa vào nó).
+        """
+        g, rhs, goal, blocked = self.g, self.rhs, self.goal, self.blocked
+        neighbors = self.cmap.neighbors
+        heap, keys, xy = self._open, self._key, self._xy
+        heappush, heappop = heapq.heappush, heapq.heappop
+        update_vertex = self._update_vertex
+        start = self.start
+        sx, sy = xy[start]
+        km = self.km
+        while heap:
+            key, cell = heap[0]
+            if keys.get(cell) != key:
+                # Mục đã cũ trong heap (xóa lười)
+                heappop(heap)
+                continue
+            m = min(g[start], rhs[start])
+            if rhs[start] == g[start] and key >= (m + km, m):
+                break
+            self.expanded += 1
+            heappop(heap)
+            del keys[cell]
+            x, y = xy[cell]
+            m = min(g[cell], rhs[cell])
+            new_key = (m + abs(x - sx) + abs(y - sy) + km, m)
+            if key < new_key:
+                keys[cell] = new_key
+                heappush(heap, (new_key, cell))
+            elif g[cell] > rhs[cell]:
+                # Giảm g: ô kề chỉ có thể có rhs nhỏ hơn
+                g[cell] = value = rhs[cell]
+                if not blocked[cell]:
+                    value += 1
+                    for _, ncell in neighbors[cell]:
+                        if value < rhs[ncell] and not goal[ncell]:
+                            rhs[ncell] = value
+                            if g[ncell] != value:
+                                self._push(ncell)
+                            else:
+                                keys.pop(ncell, None)
+            else:
+                # Tăng g: tính lại rhs của chính ô này và các ô kề từng đi qua nó
+                old = g[cell] + 1
+                g[cell] = INF
+                update_vertex(cell)
+                if not blocked[cell]:
+                    for _, ncell in neighbors[cell]:
+                        if rhs[ncell] == old:
+                            update_vertex(ncell)
+
+    def move_start(self, start):
+        """
+        Người chơi đã đi tới ô start: chỉ cần cộng dồn km thay vì tính lại khóa trong hàng đợi.
+        """
+        if start == self.start:
+            return
+        self.start = start
+        (x, y), (lx, ly) = self._xy[start], self._xy[self.last]
+        self.km += abs(x - lx) + abs(y - ly)
+        self.last = start
+
+    def set_cell(self, cell, goal, blocked):
+        """
+        Đổi trạng thái một ô (thành mục tiêu / bị chặn / ô trống), sửa các ô bị ảnh hưởng.
+        """
+        if self.goal[cell] == goal and self.blocked[cell] == blocked:
+            return
+        self.goal[cell] = goal
+        self.blocked[cell] = blocked
+        if goal:
+            self.rhs[cell] = 0
+        self._update_vertex(cell)
+        for _, ncell in self.cmap.neighbors[cell]:
+            self._update_vertex(ncell)
+
+    def path(self, max_steps=None):
+        """
+        Đường đi từ ô người chơi tới mục tiêu gần nhất theo g (list (direction, (x, y))).
+        """
+        self.compute()
+        cell = self.start
+        cols = self.cols
+        g, goal, blocked = self.g, self.goal, self.blocked
+        path = []
+        if g[cell] == INF and self.rhs[cell] == INF:
+            return path
+        while not goal[cell]:
+            best = None
+            best_g = INF
+            for code, ncell in self.cmap.neighbors[cell]:
+                if not blocked[ncell] and g[ncell] < best_g:
+                    best, best_g = (code, ncell), g[ncell]
+            if best is None or len(path) >= self.cmap.size:
+                return []
+            code, cell = best
+            path.append((DIRECTION_NAMES[code], (cell % cols, cell // cols)))
+        if max_steps is not None and len(path) > max_steps:
+            return []
+        return path
+
+
+class IncrementalPlanner:
+    """
+    Bộ tìm đường có trạng thái cho một AI: giữ kế hoạch combo và cây D* Lite giữa các lần gọi.
+
+    Tham số khởi tạo:
+        max_depth: độ sâu tối đa khi tìm combo (như astar_search)
+
+    Thuộc tính:
+        repaired: số lần dùng lại kế hoạch combo còn hợp lệ
+        replanned: số lần phải tìm combo lại từ đầu
+        skipped: số lần bỏ qua tìm combo vì cận dưới số bước vượt max_depth
+    """
+
+    def __init__(self, max_depth=20):
+        self.max_depth = max_depth
+        self.repaired = 0
+        self.replanned = 0
+        self.skipped = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Bỏ toàn bộ trạng thái (dùng khi Reset ván chơi hoặc đổi map).
+        """
+        self._layout = None
+        self._combo = None
+        self._dstar = None
+        self._targets = None
+        self._objects = {}
+        self._gaps = {}
+
+    def _sorted_gaps(self, cmap, obj_type, object_index):
+        """
+        Khoảng cách từ mỗi vật phẩm loại obj_type tới vật phẩm cùng loại gần nhất khác, tăng dần
+        (chỉ tính lại khi tập vật phẩm loại đó thay đổi).
+        """
+        cells = frozenset(y * cmap.cols + x for x, y in object_index.positions[obj_type])
+        cached = self._gaps.get(obj_type)
+        if cached is not None and cached[0] == cells:
+            return cached[1]
+        dist = cmap.distances.dist
+        gaps = sorted(min((dist(a, b) for b in cells if b != a), default=UNREACHABLE) for a in cells)
+        self._gaps[obj_type] = (cells, gaps)
+        return gaps
+
+    def _combo_lower_bound(self, cmap, start_pos, bag, object_index):
+        """
+        Cận dưới số bước của mọi đường tới combo mà _astar_find_combo có thể tìm (INF nếu không thể).
+
+        Khi túi khác rỗng chỉ được nhặt thêm loại bag[0], combo mới phải nối vào đuôi túi; khi túi
+        rỗng, món đầu tiên quyết định loại. Nhặt k món loại t tốn ít nhất: khoảng cách tới món
+        loại t gần nhất cộng k - 1 khoảng cách nhỏ nhất giữa các món loại t với nhau.
+        """
+        if bag:
+            obj_type = bag[0]
+            run = 0
+            for item in reversed(bag):
+                if item != obj_type:
+                    break
+                run += 1
+            options = [(obj_type, max(1, COMBO_RULES[obj_type][0] - run))]
+        else:
+            options = [(obj_type, COMBO_RULES[obj_type][0]) for obj_type in OBJECT_TYPES]
+
+        fields = object_index.distance_fields(cmap)
+        cell = cmap.cell_of(start_pos)
+        best = INF
+        for obj_type, k in options:
+            # Combo chỉ được tính khi túi còn đủ ô trống sau khi nhặt k món
+            if COMBO_RULES[obj_type][0] > BAG_SIZE - len(bag) - k:
+                continue
+            if object_index.count(obj_type) < k:
+                continue
+            first = fields.dist(cell, obj_type)
+            if first == UNREACHABLE:
+                continue
+            best = min(best, first + sum(self._sorted_gaps(cmap, obj_type, object_index)[:k - 1]))
+        return best
+
+    def _remaining_combo(self, map_tiles, start_pos, bag):
+        """
+        Phần còn lại của kế hoạch combo trước đó nếu vẫn thực hiện được, ngược lại None.
+        """
+        if self._combo is None:
+            return None
+        path, states, contents = self._combo
+        try:
+            i = states.index((start_pos, tuple(bag)))
+        except ValueError:
+            return None
+        if i >= len(path):
+            return None
+        # Mọi ô còn lại trên đường phải giữ nguyên nội dung như lúc lập kế hoạch
+        for j in range(i, len(path)):
+            x, y = path[j][1]
+            if map_tiles[y][x] != contents[j]:
+                return None
+        return path[i:]
+
+    def _plan_combo(self, cmap, map_tiles, start_pos, bag, object_index, stats=None):
+        remaining = self._remaining_combo(map_tiles, start_pos, bag)
+        if remaining is not None:
+            self.repaired += 1
+            return remaining
+        self._combo = None
+        if self._combo_lower_bound(cmap, start_pos, bag, object_index) > self.max_depth:
+            self.skipped += 1
+            return []
+        self.replanned += 1
+        path = _astar_find_combo(map_tiles, start_pos, bag, self.max_depth, object_index, stats)
+        self._combo = None
+        if path:
+            # Lưu (vị trí, túi) trước mỗi bước và nội dung ô đích của mỗi bước
+            states = [(start_pos, tuple(bag))]
+            contents = []
+            current = list(bag)
+            for _, (x, y) in path:
+                tile = map_tiles[y][x]
+                contents.append(tile)
+                if isinstance(tile, int):
+                    current.append(tile)
+                states.append(((x, y), tuple(current)))
+            self._combo = (path, states, contents)
+        return path
+
+    def _plan_nearest(self, cmap, start_pos, target_vals, object_index, stats=None):
+        targets = frozenset(target_vals)
+        start = cmap.cell_of(start_pos)
+        objects = {}
+        for obj_type, cells in object_index.positions.items():
+            for x, y in cells:
+                objects[y * cmap.cols + x] = obj_type
+
+        dstar = self._dstar
+        if dstar is None or self._targets != targets:
+            # Tập mục tiêu đổi: dựng cây mới
+            goals = [cell for cell, obj_type in objects.items() if obj_type in targets]
+            blocked = [cell for cell, obj_type in objects.items() if obj_type not in targets]
+            dstar = DStarLite(cmap, goals, blocked, start)
+            self._dstar = dstar
+            self._targets = targets
+        else:
+            # Chỉ sửa các ô có vật phẩm bị nhặt đi hoặc được thả thêm
+            dstar.move_start(start)
+            old = self._objects
+            for cell in old.keys() | objects.keys():
+                obj_type = objects.get(cell)
+                if obj_type != old.get(cell):
+                    is_goal = obj_type is not None and obj_type in targets
+                    is_blocked = obj_type is not None and obj_type not in targets
+                    dstar.set_cell(cell, int(is_goal), int(is_blocked))
+        self._objects = objects
+        expanded = dstar.expanded
+        path = dstar.path()
+        if stats is not None:
+            # Chỉ tính các nút D* Lite mở rộng trong lần gọi này (cây được dùng lại giữa các lần gọi)
+            stats.record(expanded=dstar.expanded - expanded, frontier=len(dstar._key))
+        return path
+
+    def plan(self, map_tiles, start_pos, bag, object_index=None):
+        """
+        Tìm đường như astar_search (combo trước, không có thì nhặt vật gần nhất) nhưng dùng lại
+        kết quả của lần gọi trước.
+
+        Tham số:
+            map_tiles: Ma trận 2D chứa thông tin bản đồ
+            start_pos: vị trí (x, y) của AI
+            bag: túi hiện tại
+            object_index: ObjectIndex của game (dựng từ map nếu không có)
+
+        Trả về:
+            SearchResult (list các (direction, (x, y)) kèm thống kê và các bộ đếm của planner)
+        """
+        result = SearchResult()
+        cmap = compile_map(map_tiles)
+        if cmap.layout is not self._layout:
+            self.reset()
+            self._layout = cmap.layout
+        if object_index is None:
+            object_index = ObjectIndex(map_tiles)
+
+        # 1) Tìm combo (dùng lại kế hoạch cũ nếu vẫn hợp lệ)
+        with result.phase("combo"):
+            combo_path = self._plan_combo(cmap, map_tiles, start_pos, bag, object_index, result)
+        result.notes.append(f"Repaired: {self.repaired}  Replanned: {self.replanned}  Skipped: {self.skipped}")
+        if combo_path:
+            return result.finish(combo_path, "combo")
+
+        # 2) Fallback: nearest bằng D* Lite
+        if bag and object_index.has(bag[-1]):
+            target_vals = [bag[-1]]
+        else:
+            target_vals = [0, 1, 2, 3, 4]
+        with result.phase("fallback"):
+            path = self._plan_nearest(cmap, start_pos, target_vals, object_index, result)
+        return result.finish(path, "fallback")
@@ -0,0 +1,238 @@
+from map_handler import ObjectIndex, compile_map
+from search_state import StateCodec, bag_len, bag_first, bag_push, unpack_bag
+from combo_rules import COMBO_RULES, BAG_SIZE, allowed_combo_objs, is_combo_goal
+from distance_field import SearchFields
+from searchAStar import _astar_nearest_target
+from search_result import SearchResult
+
+# --- IDA* (ITERATIVE DEEPENING A*) TÌM COMBO VỚI BỘ NHỚ TUYẾN TÍNH THEO ĐỘ SÂU ---
+# A*/BFS giữ mọi trạng thái đã sinh trong best_g_scores/visited nên bộ nhớ tăng rất nhanh theo
+# max_depth. IDA* chỉ giữ đường đi hiện tại: mỗi vòng là một lần DFS cắt nhánh khi f = g + h vượt
+# ngưỡng, ngưỡng vòng sau là f nhỏ nhất đã bị cắt. Bảng chuyển vị (transposition table) nhỏ, có
+# giới hạn số mục, bỏ các trạng thái đã tới với g không lớn hơn trong cùng vòng.
+#
+# Trạng thái, luật nhặt và goal giống _astar_find_combo (searchAStar.py). Heuristic là cận dưới
+# số bước tới combo (chấp nhận được, nên đường tìm được là ngắn nhất trong max_depth):
+#   - túi khác rỗng: chỉ nhặt thêm loại t = bag[0], cần k = need(t) - (số t liên tiếp ở đuôi túi)
+#   - túi rỗng: món đầu tiên quyết định loại t, cần k = need(t)
+#   - combo chỉ được tính khi túi còn đủ ô trống sau khi nhặt k món
+#   - nhặt k món loại t tốn ít nhất: khoảng cách tới món loại t gần nhất cộng k - 1 khoảng cách
+#     nhỏ nhất từ một món loại t tới món cùng loại gần nhất khác (trong các món còn lại)
+
+INF = float('inf')
+
+# Số mục tối đa của bảng chuyển vị mặc định (0 để tắt)
+DEFAULT_TT_SIZE = 1 << 15
+
+
+class _ComboBound:
+    """
+    Heuristic cận dưới số bước tới combo cho các trạng thái của một lần tìm kiếm.
+    Các phần chỉ phụ thuộc túi hoặc tập vật phẩm một loại được ghi nhớ.
+    """
+
+    def __init__(self, codec, fields, distances):
+        self.codec = codec
+        self.fields = fields
+        self.dist = distances.dist
+        self._options = {}
+        self._gaps = {}
+
+    def options(self, bag_code):
+        """
+        Các lựa chọn (loại t, số món k cần nhặt thêm) còn có thể tạo combo với túi bag_code.
+        """
+        result = self._options.get(bag_code)
+        if result is not None:
+            return result
+        bag = unpack_bag(bag_code)
+        if bag:
+            obj_type = bag[0]
+            run = 0
+            for item in reversed(bag):
+                if item != obj_type:
+                    break
+                run += 1
+            candidates = [(obj_type, max(1, COMBO_RULES[obj_type][0] - run))]
+        else:
+            candidates = [(obj_type, COMBO_RULES[obj_type][0]) for obj_type in allowed_combo_objs(BAG_SIZE)]
+        result = [(obj_type, k) for obj_type, k in candidates
+                  if COMBO_RULES[obj_type][0] <= BAG_SIZE - len(bag) - k]
+        self._options[bag_code] = result
+        return result
+
+    def gaps(self, obj_type, bits):
+        """
+        Khoảng cách từ mỗi món loại obj_type còn lại (bits) tới món cùng loại gần nhất khác, tăng dần.
+        """
+        key = (obj_type, bits)
+        result = self._gaps.get(key)
+        if result is None:
+            obj_cells = self.codec.obj_cells
+            cells = []
+            rest = bits
+            while rest:
+                low = rest & -rest
+                rest ^= low
+                cells.append(obj_cells[low.bit_length() - 1])
+            dist = self.dist
+            result = sorted(min((dist(a, b) for b in cells if b != a), default=INF) for a in cells)
+            self._gaps[key] = result
+        return result
+
+    def __call__(self, pos_cell, bag_code, objects):
+        if is_combo_goal(bag_code):
+            return 0
+        fields = self.fields
+        idx = fields.index[pos_cell]
+        best = INF
+        for obj_type, k in self.options(bag_code):
+            bits = objects & fields.type_bits[obj_type]
+            if bin(bits).count("1") < k:
+                continue
+            h = fields.nearest(obj_type, objects)[idx]
+            if k > 1:
+                h += sum(self.gaps(obj_type, bits)[:k - 1])
+            if h < best:
+                best = h
+        return best
+
+
+def _idastar_find_combo(map_tiles, start_pos, bag, max_depth, object_index=None, tt_size=DEFAULT_TT_SIZE,
+                        stats=None):
+    """
+    IDA* tìm đường ngắn nhất (trong max_depth bước) tới trạng thái có combo.
+    Trả về list of (direction, pos) nếu tìm được, ngược lại []
+    stats: SearchResult (nếu có) để cộng số nút sinh/mở rộng qua mọi vòng; frontier là độ sâu
+    đường đi hiện tại, visited là đường đi cộng bảng chuyển vị
+    """
+    cmap = compile_map(map_tiles)
+    neighbors = cmap.neighbors
+    cols = cmap.cols
+    codec = StateCodec(cmap)
+    obj_slot = codec.obj_slot
+    obj_vals = codec.obj_vals
+    fields = SearchFields(codec, cmap.distances,
+                          object_index.distance_fields(cmap) if object_index is not None else None)
+    heuristic = _ComboBound(codec, fields, cmap.distances)
+
+    start_state = codec.start_state(start_pos, bag)
+    start_cell = codec.cell_of(start_pos)
+    start_h = heuristic(start_cell, codec.decode(start_state)[1], codec.full_mask)
+
+    # Đường đi hiện tại (bộ nhớ tuyến tính theo độ sâu)
+    path = []
+    on_path = {start_state}
+    table = {}
+    generated = expanded = peak_frontier = peak_visited = 0
+
+    def search(state, g, threshold):
+        """
+        DFS có ngưỡng: trả về 0 nếu tới goal, ngược lại f nhỏ nhất vượt ngưỡng (INF nếu hết nhánh).
+        """
+        nonlocal generated, expanded, peak_frontier, peak_visited
+        pos_cell, bag_code, objects = codec.decode(state)
+        if is_combo_goal(bag_code):
+            return 0
+        expanded += 1
+        if len(path) > peak_frontier:
+            peak_frontier = len(path)
+        if len(table) + len(on_path) > peak_visited:
+            peak_visited = len(table) + len(on_path)
+        allowed = allowed_combo_objs(BAG_SIZE - bag_len(bag_code))
+        new_g = g + 1
+
+        # Sinh các trạng thái con, thử con có h nhỏ trước
+        children = []
+        for move_code, new_cell in neighbors[pos_cell]:
+            new_bag = bag_code
+            new_objects = objects
+            slot = obj_slot[new_cell]
+            if slot >= 0 and (objects >> slot) & 1:
+                val = obj_vals[slot]
+                if bag_code:
+                    if val != bag_first(bag_code):
+                        continue
+                elif val not in allowed:
+                    continue
+                new_bag = bag_push(bag_code, val)
+                new_objects = objects & ~(1 << slot)
+            new_state = codec.encode(new_cell, new_bag, new_objects)
+            if new_state in on_path:
+                continue
+            h = heuristic(new_cell, new_bag, new_objects)
+            children.append((h, move_code, new_cell, new_state))
+        children.sort()
+        generated += len(children)
+
+        minimum = INF
+        for h, move_code, new_cell, new_state in children:
+            f = new_g + h
+            if f > threshold or f > max_depth:
+                if f < minimum:
+                    minimum = f
+                continue
+            # Bảng chuyển vị: đã tới trạng thái này với g không lớn hơn trong vòng này
+            if tt_size:
+                seen = table.get(new_state)
+                if seen is not None and seen <= new_g:
+                    continue
+                if seen is not None or len(table) < tt_size:
+                    table[new_state] = new_g
+            path.append((move_code, new_cell))
+            on_path.add(new_state)
+            result = search(new_state, new_g, threshold)
+            if result == 0:
+                return 0
+            on_path.discard(new_state)
+            path.pop()
+            if result < minimum:
+                minimum = result
+        return minimum
+
+    threshold = start_h
+    found = False
+    while threshold <= max_depth:
+        table.clear()
+        result = search(start_state, 0, threshold)
+        if result == 0:
+            found = True
+            break
+        if result == INF:
+            break
+        threshold = result
+    if stats is not None:
+        stats.record(generated, expanded, peak_frontier, peak_visited)
+    if not found:
+        return []
+    return [(("Up", "Down", "Left", "Right")[code], (cell % cols, cell // cols)) for code, cell in path]
+
+
+def idastar_search(map_tiles, start_pos, bag, max_depth=40, object_index=None):
+    """
+    Tìm đường cho AI theo IDA* (bộ nhớ tuyến tính theo độ sâu nên dùng được max_depth lớn):
+    1) Thử tìm combo trong max_depth bước.
+    2) Nếu không tìm được, fallback:
+       - Nếu bag rỗng: nhặt bất kỳ vật gần nhất
+       - Nếu bag không rỗng: nhặt vật cùng loại với item VỪA MỚI ĐƯỢC THÊM VÀO trong bag
+    object_index: ObjectIndex của game (nếu có) để tra nhanh vật phẩm còn trên map
+    Trả về SearchResult (list các bước kèm thống kê tìm kiếm)
+    """
+    result = SearchResult()
+    # 1) Tìm combo
+    with result.phase("combo"):
+        combo_path = _idastar_find_combo(map_tiles, start_pos, bag, max_depth, object_index, stats=result)
+    if combo_path:
+        return result.finish(combo_path, "combo")
+
+    # 2) Fallback: tìm nearest
+    if not bag:
+        target_vals = [0, 1, 2, 3, 4]
+    else:
+        last = bag[-1]
+        if object_index is None:
+            object_index = ObjectIndex(map_tiles)
+        target_vals = [last] if object_index.has(last) else [0, 1, 2, 3, 4]
+    with result.phase("fallback"):
+        path = _astar_nearest_target(map_tiles, start_pos, target_vals, result)
+    return result.finish(path, "fallback")
@@ -0,0 +1,212 @@
+import heapq
+from array import array
+
+from map_handler import ObjectIndex, compile_map
+from search_state import StateCodec, DIRECTION_NAMES, pack_bag, bag_len, bag_first, bag_push
+from combo_rules import BAG_SIZE, allowed_combo_objs, is_combo_goal
+from distance_field import SearchFields
+from searchAStar import _astar_nearest_target
+from searchIDAStar import _ComboBound
+from search_result import SearchResult
+
+# --- PLANNER MACRO: TÌM COMBO TRÊN ĐỒ THỊ VẬT PHẨM ---
+# Các tìm kiếm theo từng ô (BFS/A*) tốn phần lớn công sức đi lang thang trên sàn trống giữa các
+# vật phẩm, trong khi trạng thái chỉ thay đổi thực sự khi nhặt được vật phẩm. Ở đây mỗi bước của
+# tìm kiếm là một "macro": đi tới và nhặt một vật phẩm.
+#   - Đồ thị: các nút là vị trí người chơi và các vật phẩm; cạnh từ một ô tới vật phẩm là độ dài
+#     đường đi ngắn nhất thật, không đi qua vật phẩm còn lại nào khác (đi qua vật phẩm cùng loại là
+#     nhặt nó, tức là một thứ tự nhặt khác; khác loại thì bị cấm như _astar_find_combo). Cạnh phụ
+#     thuộc tập vật phẩm còn lại nên được tính lười bằng BFS và ghi nhớ theo (ô, tập vật phẩm).
+#   - Tìm kiếm: A* trên trạng thái (ô, túi, tập vật phẩm) theo tổng số bước, cùng luật nhặt và
+#     goal như _astar_find_combo, heuristic là cận dưới số bước tới combo của IDA*
+#     (searchIDAStar._ComboBound), nên đường tìm được là ngắn nhất trong max_depth bước.
+#   - Thứ tự nhặt thắng cuộc được trải lại thành từng bước đơn vị theo cây BFS của mỗi cạnh.
+
+
+class _ObjectGraph:
+    """
+    Cạnh của đồ thị vật phẩm cho một lần tìm kiếm, tính lười theo (ô xuất phát, tập vật phẩm còn lại).
+    """
+
+    def __init__(self, cmap, codec):
+        self.neighbors = cmap.neighbors
+        self.size = cmap.size
+        self.obj_slot = codec.obj_slot
+        self._memo = {}
+
+    def _bfs(self, source, objects):
+        neighbors = self.neighbors
+        obj_slot = self.obj_slot
+        # parent[ô] = ô trước * 4 + mã hướng; -1 nếu chưa tới
+        parent = array("i", [-1]) * self.size
+        parent[source] = source * 4
+        edges = []
+        frontier = [source]
+        d = 0
+        while frontier:
+            d += 1
+            next_frontier = []
+            for cell in frontier:
+                for code, ncell in neighbors[cell]:
+                    if parent[ncell] >= 0:
+                        continue
+                    parent[ncell] = cell * 4 + code
+                    slot = obj_slot[ncell]
+                    if slot >= 0 and (objects >> slot) & 1:
+                        # Tới vật phẩm thì dừng (nhặt nó), không đi qua
+                        edges.append((slot, d))
+                        continue
+                    next_frontier.append(ncell)
+            frontier = next_frontier
+
+        # Đang đứng trên vật phẩm còn lại: bước ra một ô trống rồi quay lại để nhặt
+        back = None
+        slot = obj_slot[source]
+        if slot >= 0 and (objects >> slot) & 1:
+            for code, ncell in neighbors[source]:
+                nslot = obj_slot[ncell]
+                if nslot < 0 or not (objects >> nslot) & 1:
+                    back = (code, ncell)
+                    edges.append((slot, 2))
+                    break
+        return edges, parent, back
+
+    def edges(self, source, objects):
+        """
+        Các cạnh (slot vật phẩm, số bước) từ ô source khi còn các vật phẩm objects.
+        """
+        key = (source, objects)
+        entry = self._memo.get(key)
+        if entry is None:
+            entry = self._bfs(source, objects)
+            self._memo[key] = entry
+        return entry[0]
+
+    def path(self, source, objects, target):
+        """
+        Các bước (mã hướng, ô) từ ô source tới ô target theo cây BFS của cạnh tương ứng.
+        """
+        _, parent, back = self._memo[(source, objects)]
+        if target == source:
+            code, ncell = back
+            return [(code, ncell), (code ^ 1, source)]
+        steps = []
+        cell = target
+        while cell != source:
+            prev, code = divmod(parent[cell], 4)
+            steps.append((code, cell))
+            cell = prev
+        steps.reverse()
+        return steps
+
+
+def _macro_find_combo(map_tiles, start_pos, bag, max_depth, object_index=None, stats=None):
+    """
+    A* trên thứ tự nhặt vật phẩm tìm đường ngắn nhất (trong max_depth bước) tới trạng thái có combo.
+
+    Tham số:
+        stats: SearchResult (nếu có) để cộng số trạng thái macro sinh/mở rộng, kích thước open_set
+               và bảng g
+
+    Trả về:
+        list (direction, pos) nếu tìm được, ngược lại []
+    """
+    cmap = compile_map(map_tiles)
+    cols = cmap.cols
+    codec = StateCodec(cmap)
+    obj_cells = codec.obj_cells
+    obj_vals = codec.obj_vals
+    fields = SearchFields(codec, cmap.distances,
+                          object_index.distance_fields(cmap) if object_index is not None else None)
+    heuristic = _ComboBound(codec, fields, cmap.distances)
+    graph = _ObjectGraph(cmap, codec)
+
+    start = (codec.cell_of(start_pos), pack_bag(bag), codec.full_mask)
+    start_h = heuristic(*start)
+    if start_h > max_depth:
+        return []
+    best_g = {start: 0}
+    parent = {start: None}
+    open_set = [(start_h, 0, start)]
+    generated = expanded = peak_frontier = 0
+
+    while open_set:
+        if len(open_set) > peak_frontier:
+            peak_frontier = len(open_set)
+        f, g, state = heapq.heappop(open_set)
+        if g > best_g[state]:
+            continue
+        cell, bag_code, objects = state
+
+        # Kiểm tra goal khi lấy ra khỏi hàng đợi (đường ngắn nhất)
+        if is_combo_goal(bag_code):
+            if stats is not None:
+                stats.record(generated, expanded, peak_frontier, len(best_g))
+            macros = []
+            while parent[state] is not None:
+                prev = parent[state]
+                macros.append((prev, state[0]))
+                state = prev
+            path = []
+            for (source, _, prev_objects), target in reversed(macros):
+                for code, step_cell in graph.path(source, prev_objects, target):
+                    path.append((DIRECTION_NAMES[code], (step_cell % cols, step_cell // cols)))
+            return path
+
+        expanded += 1
+        allowed = allowed_combo_objs(BAG_SIZE - bag_len(bag_code))
+        for slot, d in graph.edges(cell, objects):
+            val = obj_vals[slot]
+            # Cùng luật nhặt như _astar_find_combo
+            if bag_code:
+                if val != bag_first(bag_code):
+                    continue
+            elif val not in allowed:
+                continue
+            new_g = g + d
+            if new_g > max_depth:
+                continue
+            new_state = (obj_cells[slot], bag_push(bag_code, val), objects & ~(1 << slot))
+            if new_g >= best_g.get(new_state, max_depth + 1):
+                continue
+            h = heuristic(*new_state)
+            if new_g + h > max_depth:
+                continue
+            best_g[new_state] = new_g
+            parent[new_state] = state
+            heapq.heappush(open_set, (new_g + h, new_g, new_state))
+            generated += 1
+
+    if stats is not None:
+        stats.record(generated, expanded, peak_frontier, len(best_g))
+    return []
+
+
+def macro_search(map_tiles, start_pos, bag, max_depth=40, object_index=None):
+    """
+    Tìm đường cho AI bằng planner macro trên đồ thị vật phẩm:
+    1) Thử tìm combo trong max_depth bước (tìm trên thứ tự nhặt, không phải từng bước đi).
+    2) Nếu không tìm được, fallback:
+       - Nếu bag rỗng: nhặt bất kỳ vật gần nhất
+       - Nếu bag không rỗng: nhặt vật cùng loại với item VỪA MỚI ĐƯỢC THÊM VÀO trong bag
+    object_index: ObjectIndex của game (nếu có) để tra nhanh vật phẩm còn trên map
+    Trả về SearchResult (list các bước kèm thống kê tìm kiếm)
+    """
+    result = SearchResult()
+    # 1) Tìm combo
+    with result.phase("combo"):
+        combo_path = _macro_find_combo(map_tiles, start_pos, bag, max_depth, object_index, result)
+    if combo_path:
+        return result.finish(combo_path, "combo")
+
+    # 2) Fallback: tìm nearest
+    if not bag:
+        target_vals = [0, 1, 2, 3, 4]
+    else:
+        last = bag[-1]
+        if object_index is None:
+            object_index = ObjectIndex(map_tiles)
+        target_vals = [last] if object_index.has(last) else [0, 1, 2, 3, 4]
+    with result.phase("fallback"):
+        path = _astar_nearest_target(map_tiles, start_pos, target_vals, result)
+    return result.finish(path, "fallback")
@@ -1,60 +1,31 @@
 import heapq
-from collections import deque
+
+from map_handler import OBJECT_TYPES, compile_map
+from jump_point import jps_nearest_path
+from search_result import SearchResult
 #Thuật toán này ko theo logic nhặt vật phẩm theo combo mà chỉ lấy vật phẩm bất kì gần nhất mà thôi
 #Biểu thị cho một người chơi không thành thạo quy tắc chơi game
 
-def search_only_nearest(map_data, start_pos):
+def search_only_nearest(map_data, start_pos, bag=None, object_index=None):
     """
     Tìm con đường đến vật phẩm gần nhất trên bản đồ.
     
     Parameters:
     - map_data: Bản đồ 2D với các ô chứa thông tin
     - start_pos: Tuple (x, y) vị trí bắt đầu của AI
+    - bag, object_index: không dùng (nhận vào để gọi được như các *_search khác, xem planner_registry.py)
     
     Returns:
-    - Danh sách các bước [(direction, (x, y)), ...] để đi đến vật phẩm gần nhất
+    - SearchResult: các bước [(direction, (x, y)), ...] để đi đến vật phẩm gần nhất, kèm thống kê
     """
-    # Hướng di chuyển: phải, xuống, trái, lên
-    directions = [(1, 0, "Right"), (0, 1, "Down"), (-1, 0, "Left"), (0, -1, "Up")]
-    
-    # Vị trí bắt đầu
-    x_start, y_start = start_pos
-    
-    # Kiểm tra nếu đang đứng trên vật phẩm
-    if isinstance(map_data[y_start][x_start], int):
-        return []  # Trả về danh sách rỗng vì đã ở trên vật phẩm
-    
-    # Sử dụng BFS tìm đường đến vật phẩm gần nhất
-    queue = deque([(x_start, y_start, [])])  # (x, y, path)
-    visited = set([(x_start, y_start)])
-    
-    while queue:
-        x, y, path = queue.popleft()
-        
-        # Duyệt qua 4 hướng di chuyển
-        for dx, dy, direction in directions:
-            nx, ny = x + dx, y + dy
-            
-            # Kiểm tra xem có thể di chuyển vào ô mới không
-            if (0 <= ny < len(map_data) and 0 <= nx < len(map_data[0]) and 
-                map_data[ny][nx] != "T" and map_data[ny][nx] != "W" and 
-                map_data[ny][nx] != "X" and map_data[ny][nx] != "B" and
-                map_data[ny][nx] != "H" and map_data[ny][nx] != "G" and
-                (nx, ny) not in visited):
-                
-                # Tạo đường đi mới
-                new_path = path + [(direction, (nx, ny))]
-                
-                # Nếu tìm thấy vật phẩm, trả về đường đi
-                if isinstance(map_data[ny][nx], int):
-                    return new_path
-                
-                # Nếu chưa tìm thấy, thêm vào hàng đợi để duyệt tiếp
-                visited.add((nx, ny))
-                queue.append((nx, ny, new_path))
-    
-    # Nếu không tìm thấy vật phẩm nào, trả về đường đi rỗng
-    return []
+    result = SearchResult()
+    cmap = compile_map(map_data)
+    
+    # Đang đứng trên vật phẩm thì không cần đi; mọi vật phẩm đều là mục tiêu nên không ô nào
+    # bị chặn ngoài tường. Jump Point Search chỉ dừng ở các điểm nhảy (xem jump_point.py)
+    with result.phase("nearest"):
+        path = jps_nearest_path(cmap, start_pos, OBJECT_TYPES, result)
+    return result.finish(path, "fallback")
 
 def search_only_nearest_with_astar(map_data, start_pos):
     """
@@ -67,25 +38,31 @@ def search_only_nearest_with_astar(map_data, start_pos):
     Returns:
     - Danh sách các bước [(direction, (x, y)), ...] để đi đến vật phẩm gần nhất
     """
-    # Hướng di chuyển: phải, xuống, trái, lên
-    directions = [(1, 0, "right"), (0, 1, "down"), (-1, 0, "left"), (0, -1, "up")]
+    # Hướng di chuyển: phải, xuống, trái, lên (mã hướng theo map biên dịch)
+    directions = [(3, "right"), (1, "down"), (2, "left"), (0, "up")]
+    
+    cmap = compile_map(map_data)
+    step = cmap.step
+    obj_type = cmap.obj_type
+    cols = cmap.cols
     
     # Vị trí bắt đầu
     x_start, y_start = start_pos
     
     # Kiểm tra nếu đang đứng trên vật phẩm
-    if isinstance(map_data[y_start][x_start], int):
+    if obj_type[cmap.cell_of(start_pos)] >= 0:
         return []  # Trả về danh sách rỗng vì đã ở trên vật phẩm
     
+    # Vị trí các vật phẩm chỉ cần lấy một lần từ map biên dịch
+    object_positions = [cmap.pos_of(c) for c in range(cmap.size) if obj_type[c] >= 0]
+    
     # Heuristic function: Manhattan distance
     def heuristic(pos):
         # Tìm vị trí gần nhất của vật phẩm
         min_dist = float('inf')
-        for y in range(len(map_data)):
-            for x in range(len(map_data[0])):
-                if isinstance(map_data[y][x], int):
-                    dist = abs(pos[0] - x) + abs(pos[1] - y)
-                    min_dist = min(min_dist, dist)
+        for x, y in object_positions:
+            dist = abs(pos[0] - x) + abs(pos[1] - y)
+            min_dist = min(min_dist, dist)
         return min_dist if min_dist != float('inf') else 0
     
     # A* algorithm
@@ -99,21 +76,20 @@ def search_only_nearest_with_astar(map_data, start_pos):
         _, g_score, x, y, path = heapq.heappop(open_set)
         
         # Check all four directions
-        for dx, dy, direction in directions:
-            nx, ny = x + dx, y + dy
+        for code, direction in directions:
+            ncell = step[(y * cols + x) * 4 + code]
+            if ncell < 0:
+                continue  # Wall or outside the map
+            nx, ny = ncell % cols, ncell // cols
             
             # Check if the new position is valid
-            if (0 <= ny < len(map_data) and 0 <= nx < len(map_data[0]) and 
-                map_data[ny][nx] != "T" and map_data[ny][nx] != "W" and 
-                map_data[ny][nx] != "X" and map_data[ny][nx] != "B" and
-                map_data[ny][nx] != "H" and map_data[ny][nx] != "G" and
-                (nx, ny) not in visited):
+            if (nx, ny) not in visited:
                 
                 # Create new path
                 new_path = path + [(direction, (nx, ny))]
                 
                 # If found an item, return the path
-                if isinstance(map_data[ny][nx], int):
+                if obj_type[ncell] >= 0:
                     return new_path
                 
                 # Mark as visited
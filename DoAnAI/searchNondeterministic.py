@@ -1,125 +1,76 @@
 import random
 from collections import defaultdict
 import heapq
-from typing import List, Tuple, FrozenSet, Dict, Set
+from typing import List, Tuple, Dict, Set
 
-# Quy tắc combo và kích thước túi
-COMBO_RULES = {
-    0: (2, 200),
-    1: (3, 300),
-    2: (4, 400),
-    3: (5, 500),
-    4: (6, 600),
-}
-BAG_SIZE = 7
+from map_handler import CompiledMap, ObjectIndex, UNREACHABLE, compile_map
+from search_state import StateCodec, NodeStore, DIRECTION_NAMES, DIRECTION_CODES, unpack_bag, bag_push
+from combo_rules import COMBO_RULES, BAG_SIZE, allowed_combo_objs, is_combo_goal
+from distance_field import SearchFields, nearest_target_path
+from search_result import SearchResult
 
-# Các hướng di chuyển: tên và vector (dx, dy)
-DIRECTIONS = [
-    ("Up", (0, -1)),
-    ("Down", (0, 1)),
-    ("Left", (-1, 0)),
-    ("Right", (1, 0)),
-]
 
-def _allowed_combo_objs(empty_slots: int) -> List[int]:
-    if empty_slots >= 6:
-        return [0, 1, 2, 3, 4]
-    elif empty_slots == 5:
-        return [0, 1, 2, 3]
-    elif empty_slots == 4:
-        return [0, 1, 2]
-    elif empty_slots == 3:
-        return [0, 1]
-    elif empty_slots == 2:
-        return [0]
-    return []
-
-def _check_combo_sim(bag: Tuple[int, ...], allowed_objs: List[int]) -> bool:
-    n = len(bag)
-    for obj in allowed_objs:
-        need, _ = COMBO_RULES[obj]
-        if n < need:
-            continue
-        for i in range(n - need + 1):
-            if all(bag[i + j] == obj for j in range(need)):
-                return True
-    return False
-
-def _calculate_manhattan_distance(pos1: Tuple[int, int], pos2: Tuple[int, int]) -> int:
-    return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
-
-def _heuristic(state: Tuple[Tuple[int, int], Tuple[int, ...], FrozenSet[Tuple[int, int]]], 
-              map_tiles: List[List[int | str]], 
+def _heuristic(state: int, 
+              codec: StateCodec, 
+              fields: SearchFields,
               target_type: int | None) -> float:
-    pos, bag_tup, objects = state
-    empty_slots = BAG_SIZE - len(bag_tup)
-    allowed_objs = _allowed_combo_objs(empty_slots)
-    
-    if _check_combo_sim(bag_tup, allowed_objs):
+    pos_cell, bag_code, objects = codec.decode(state)
+    if is_combo_goal(bag_code):
         return 0.0 
+    bag_tup = unpack_bag(bag_code)
     
+    # Penalty, khoảng cách nhỏ nhất tới từng loại: tra trường khoảng cách theo loại tại ô hiện tại
+    # (trường của tập vật phẩm còn lại được SearchFields suy ra tăng dần khi nhặt vật phẩm)
+    idx = fields.index[pos_cell]
+    type_bits = fields.type_bits
+    obj_type = bag_tup[0] if bag_tup else None
     penalty = 0.0
     if target_type is not None:
-        for obj_pos in objects:
-            if map_tiles[obj_pos[1]][obj_pos[0]] != target_type:
-                dist = _calculate_manhattan_distance(pos, obj_pos)
-                if dist < 3:
-                    penalty += 10.0 / (dist + 1)
+        for other, bits in type_bits.items():
+            if other != target_type and objects & bits:
+                penalty += fields.penalty(other, objects)[idx]
     
     if bag_tup:
-        obj_type = bag_tup[0]
         count = sum(1 for x in bag_tup if x == obj_type)
         need, _ = COMBO_RULES[obj_type]
-        remaining_same_type = sum(1 for obj_pos in objects if map_tiles[obj_pos[1]][obj_pos[0]] == obj_type)
+        remaining_same_type = bin(objects & type_bits[obj_type]).count("1")
         
         if count + remaining_same_type >= need:
+            min_same = fields.nearest(obj_type, objects)[idx] if remaining_same_type else float('inf')
             progress = count / need
-            min_dist = float('inf')
-            for obj_pos in objects:
-                if map_tiles[obj_pos[1]][obj_pos[0]] == obj_type:
-                    dist = _calculate_manhattan_distance(pos, obj_pos)
-                    min_dist = min(min_dist, dist)
-            return (1 - progress) * min_dist + (need - count) + penalty
+            return (1 - progress) * min_same + (need - count) + penalty
     
-    min_dist = float('inf')
-    for obj_pos in objects:
-        if target_type is None or map_tiles[obj_pos[1]][obj_pos[0]] == target_type:
-            dist = _calculate_manhattan_distance(pos, obj_pos)
-            min_dist = min(min_dist, dist)
-    return (min_dist if min_dist != float('inf') else 100.0) + penalty
+    if target_type is not None:
+        min_dist = fields.nearest(target_type, objects)[idx] if objects & type_bits[target_type] else UNREACHABLE
+    else:
+        min_dist = min((fields.nearest(t, objects)[idx] for t, bits in type_bits.items() if objects & bits),
+                       default=UNREACHABLE)
+    return (min_dist if min_dist != UNREACHABLE else 100.0) + penalty
 
-def _get_valid_neighbors(state: Tuple[Tuple[int, int], Tuple[int, ...], FrozenSet[Tuple[int, int]]], 
-                        map_tiles: List[List[int | str]], 
+def _get_valid_neighbors(state: int, 
+                        cmap: CompiledMap, 
+                        codec: StateCodec,
                         allowed_objs: List[int] = None, 
-                        target_type: int | None = None) -> List[Tuple[str, Tuple[Tuple[int, int], Tuple[int, ...], FrozenSet[Tuple[int, int]]], bool]]:
-    pos, bag_tup, objects = state
-    rows, cols = len(map_tiles), len(map_tiles[0])
-    x0, y0 = pos
+                        target_type: int | None = None) -> List[Tuple[str, int, bool]]:
+    pos_cell, bag_code, objects = codec.decode(state)
     neighbors = []
     
-    for dir_name, (dx, dy) in DIRECTIONS:
-        nx, ny = x0 + dx, y0 + dy
-        if not (0 <= nx < cols and 0 <= ny < rows):
-            continue
-        cell = map_tiles[ny][nx]
-        if isinstance(cell, str) and cell != ' ':
-            continue
-        
-        new_state = ((nx, ny), bag_tup, objects)
+    for move_code, new_cell in cmap.neighbors[pos_cell]:
+        dir_name = DIRECTION_NAMES[move_code]
+        new_state = codec.encode(new_cell, bag_code, objects)
         neighbors.append((dir_name, new_state, False))
         
-        if (nx, ny) in objects:
-            val = map_tiles[ny][nx]
-            if bag_tup and target_type is not None and val != target_type:
+        slot = codec.obj_slot[new_cell]
+        if slot >= 0 and (objects >> slot) & 1:
+            val = codec.obj_vals[slot]
+            if bag_code and target_type is not None and val != target_type:
                 continue
             if allowed_objs and val not in allowed_objs:
                 continue
             
-            new_bag = list(bag_tup) + [val]
-            if len(new_bag) > BAG_SIZE:
-                new_bag.pop(0)
-            new_objects = objects.difference({(nx, ny)})
-            new_state = ((nx, ny), tuple(new_bag), new_objects)
+            new_bag = bag_push(bag_code, val)
+            new_objects = objects & ~(1 << slot)
+            new_state = codec.encode(new_cell, new_bag, new_objects)
             neighbors.append((dir_name, new_state, True))
     
     return neighbors
@@ -127,51 +78,65 @@ def _get_valid_neighbors(state: Tuple[Tuple[int, int], Tuple[int, ...], FrozenSe
 def _ao_star_find_combo(map_tiles: List[List[int | str]], 
                        start_pos: Tuple[int, int], 
                        bag: List[int], 
-                       max_depth: int) -> List[Tuple[str, Tuple[int, int]]]:
-    initial_objects = frozenset(
-        (x, y) for y in range(len(map_tiles)) for x in range(len(map_tiles[0]))
-        if isinstance(map_tiles[y][x], int)
-    )
-    start_state = (start_pos, tuple(bag), initial_objects)
+                       max_depth: int,
+                       object_index: ObjectIndex | None = None,
+                       stats: SearchResult | None = None) -> List[Tuple[str, Tuple[int, int]]]:
+    # stats: SearchResult (nếu có) để cộng số nút sinh/mở rộng, kích thước open_set và graph
+    cmap = compile_map(map_tiles)
+    codec = StateCodec(cmap)
+    fields = SearchFields(codec, cmap.distances,
+                          object_index.distance_fields(cmap) if object_index is not None else None)
+    start_state = codec.start_state(start_pos, bag)
     target_type = bag[-1] if bag else None
     
-    graph: Dict[Tuple, Dict] = {start_state: {'cost': float('inf'), 'solved': False, 'connectors': [], 'path': []}}
-    graph[start_state]['cost'] = _heuristic(start_state, map_tiles, target_type)
+    # 'node' trỏ vào NodeStore: đường đi tới trạng thái được lưu bằng con trỏ cha
+    nodes = NodeStore(codec.cols, codec.cell_of(start_pos))
+    graph: Dict[int, Dict] = {start_state: {'cost': float('inf'), 'solved': False, 'connectors': [], 'node': 0}}
+    graph[start_state]['cost'] = _heuristic(start_state, codec, fields, target_type)
     
     open_set = [(graph[start_state]['cost'], 0, start_state)]
     heapq.heapify(open_set)
+    expanded = peak_frontier = 0
     
     while open_set:
+        if len(open_set) > peak_frontier:
+            peak_frontier = len(open_set)
         _, depth, state = heapq.heappop(open_set)
         if depth >= max_depth or graph[state]['solved']:
             continue
         
-        pos, bag_tup, objects = state
+        bag_code = codec.decode(state)[1]
+        bag_tup = unpack_bag(bag_code)
         empty_slots = BAG_SIZE - len(bag_tup)
-        allowed_objs = _allowed_combo_objs(empty_slots)
+        allowed_objs = allowed_combo_objs(empty_slots)
         
-        if _check_combo_sim(bag_tup, allowed_objs):
+        if is_combo_goal(bag_code):
             graph[state]['solved'] = True
             graph[state]['cost'] = depth
-            return graph[state]['path']
+            if stats is not None:
+                stats.record(len(graph) - 1, expanded, peak_frontier, len(graph))
+            return nodes.path(graph[state]['node'])
+        expanded += 1
         
         current_target = target_type if bag_tup and bag_tup[0] == target_type else (bag_tup[0] if bag_tup else None)
-        neighbors = _get_valid_neighbors(state, map_tiles, allowed_objs, current_target)
+        neighbors = _get_valid_neighbors(state, cmap, codec, allowed_objs, current_target)
         for dir_name, next_state, picked in neighbors:
+            next_cell = next_state & codec.cell_mask
+            move_code = DIRECTION_CODES[dir_name]
             if next_state not in graph:
                 graph[next_state] = {
                     'cost': float('inf'),
                     'solved': False,
                     'connectors': [],
-                    'path': graph[state]['path'] + [(dir_name, next_state[0])]
+                    'node': nodes.add(graph[state]['node'], move_code, next_cell)
                 }
             graph[next_state]['connectors'].append((state, dir_name, picked))
             
-            h = _heuristic(next_state, map_tiles, current_target)
+            h = _heuristic(next_state, codec, fields, current_target)
             new_cost = depth + 1 + h
             if new_cost < graph[next_state]['cost']:
                 graph[next_state]['cost'] = new_cost
-                graph[next_state]['path'] = graph[state]['path'] + [(dir_name, next_state[0])]
+                graph[next_state]['node'] = nodes.add(graph[state]['node'], move_code, next_cell)
                 heapq.heappush(open_set, (new_cost, depth + 1, next_state))
         
         to_update = {state}
@@ -180,121 +145,59 @@ def _ao_star_find_combo(map_tiles: List[List[int | str]],
             if graph[current]['solved']:
                 continue
             min_cost = float('inf')
-            best_path = graph[current]['path']
+            best_link = None
             for parent, dir_name, _ in graph[current]['connectors']:
                 parent_cost = graph[parent]['cost']
                 if parent_cost < float('inf'):
                     new_cost = parent_cost + 1
                     if new_cost < min_cost:
                         min_cost = new_cost
-                        best_path = graph[parent]['path'] + [(dir_name, current[0])]
+                        best_link = (parent, dir_name)
             if min_cost < graph[current]['cost']:
+                parent, dir_name = best_link
                 graph[current]['cost'] = min_cost
-                graph[current]['path'] = best_path
+                graph[current]['node'] = nodes.add(graph[parent]['node'], DIRECTION_CODES[dir_name],
+                                                   current & codec.cell_mask)
                 for parent, _, _ in graph[current]['connectors']:
                     to_update.add(parent)
     
+    if stats is not None:
+        stats.record(len(graph) - 1, expanded, peak_frontier, len(graph))
     return []
 
 def _ao_star_nearest_target(map_tiles: List[List[int | str]], 
                            start_pos: Tuple[int, int], 
                            target_vals: List[int], 
-                           max_depth: int = 50) -> List[Tuple[str, Tuple[int, int]]]:
-    rows, cols = len(map_tiles), len(map_tiles[0])
-    target_positions = [
-        (x, y) for y in range(rows) for x in range(cols)
-        if isinstance(map_tiles[y][x], int) and map_tiles[y][x] in target_vals
-    ]
-    if not target_positions:
-        return []
-    
-    graph: Dict[Tuple[int, int], Dict] = {
-        start_pos: {'cost': float('inf'), 'solved': False, 'connectors': [], 'path': []}
-    }
-    min_dist = min(_calculate_manhattan_distance(start_pos, tp) for tp in target_positions)
-    graph[start_pos]['cost'] = min_dist
-    
-    open_set = [(min_dist, 0, start_pos)]
-    heapq.heapify(open_set)
-    
-    while open_set:
-        _, depth, pos = heapq.heappop(open_set)
-        if depth >= max_depth or graph[pos]['solved']:
-            continue
-        
-        cell = map_tiles[pos[1]][pos[0]]
-        if isinstance(cell, int) and cell in target_vals:
-            graph[pos]['solved'] = True
-            graph[pos]['cost'] = depth
-            return graph[pos]['path']
-        
-        for dir_name, (dx, dy) in DIRECTIONS:
-            nx, ny = pos[0] + dx, pos[1] + dy
-            if not (0 <= nx < cols and 0 <= ny < rows):
-                continue
-            c = map_tiles[ny][nx]
-            if isinstance(c, str) and c != ' ':
-                continue
-            if isinstance(c, int) and c not in target_vals:
-                continue
-            
-            new_pos = (nx, ny)
-            if new_pos not in graph:
-                graph[new_pos] = {
-                    'cost': float('inf'),
-                    'solved': False,
-                    'connectors': [],
-                    'path': graph[pos]['path'] + [(dir_name, new_pos)]
-                }
-            graph[new_pos]['connectors'].append((pos, dir_name, False))
-            
-            new_dist = min(_calculate_manhattan_distance(new_pos, tp) for tp in target_positions)
-            random_factor = random.uniform(0.9, 1.1)
-            new_cost = depth + 1 + new_dist * random_factor
-            if new_cost < graph[new_pos]['cost']:
-                graph[new_pos]['cost'] = new_cost
-                graph[new_pos]['path'] = graph[pos]['path'] + [(dir_name, new_pos)]
-                heapq.heappush(open_set, (new_cost, depth + 1, new_pos))
-        
-        to_update = {pos}
-        while to_update:
-            current = to_update.pop()
-            if graph[current]['solved']:
-                continue
-            min_cost = float('inf')
-            best_path = graph[current]['path']
-            for parent, dir_name, _ in graph[current]['connectors']:
-                parent_cost = graph[parent]['cost']
-                if parent_cost < float('inf'):
-                    new_cost = parent_cost + 1
-                    if new_cost < min_cost:
-                        min_cost = new_cost
-                        best_path = graph[parent]['path'] + [(dir_name, current)]
-            if min_cost < graph[current]['cost']:
-                graph[current]['cost'] = min_cost
-                graph[current]['path'] = best_path
-                for parent, _, _ in graph[current]['connectors']:
-                    to_update.add(parent)
-    
-    return []
+                           rng: random.Random | None = None) -> List[Tuple[str, Tuple[int, int]]]:
+    # Trường khoảng cách tới mục tiêu gần nhất (lan sóng NumPy, xem distance_field.py);
+    # giữa các bước đi tốt như nhau thì chọn ngẫu nhiên bằng rng (tính không tất định của thuật
+    # toán; truyền random.Random có seed để tái lập đường đi, mặc định module random).
+    # Không giới hạn độ dài đường đi: trên map lớn mục tiêu gần nhất có thể xa hơn max_depth bước,
+    # giới hạn đó chỉ làm AI đứng yên dù map còn vật phẩm
+    cmap = compile_map(map_tiles)
+    return nearest_target_path(cmap, start_pos, target_vals, rng=rng if rng is not None else random)
 
 def nondeterministic_search(map_tiles: List[List[int | str]], 
                           start_pos: Tuple[int, int], 
                           bag: List[int], 
-                          max_depth: int = 50) -> List[Tuple[str, Tuple[int, int]]]:
-    combo_path = _ao_star_find_combo(map_tiles, start_pos, bag, max_depth)
+                          max_depth: int = 50,
+                          object_index: ObjectIndex | None = None,
+                          rng: random.Random | None = None) -> SearchResult:
+    result = SearchResult()
+    with result.phase("combo"):
+        combo_path = _ao_star_find_combo(map_tiles, start_pos, bag, max_depth, object_index, result)
     if combo_path:
-        return combo_path
+        return result.finish(combo_path, "combo")
     
-    rows, cols = len(map_tiles), len(map_tiles[0])
     if not bag:
         target_vals = [0, 1, 2, 3, 4]
     else:
         last = bag[-1]
-        exists_same = any(
-            isinstance(map_tiles[y][x], int) and map_tiles[y][x] == last
-            for y in range(rows) for x in range(cols)
-        )
+        if object_index is None:
+            object_index = ObjectIndex(map_tiles)
+        exists_same = object_index.has(last)
         target_vals = [last] if exists_same else [0, 1, 2, 3, 4]
     
-    return _ao_star_nearest_target(map_tiles, start_pos, target_vals)
\ No newline at end of file
+    with result.phase("fallback"):
+        path = _ao_star_nearest_target(map_tiles, start_pos, target_vals, rng=rng)
+    return result.finish(path, "fallback")
\ No newline at end of file
@@ -6,6 +6,10 @@ import math
 from collections import deque
 import time
 
+from map_handler import ObjectIndex, compile_map, UNREACHABLE
+from combo_rules import COMBO_RULES, BAG_SIZE
+from search_result import SearchResult
+
 # Định nghĩa các hướng di chuyển
 DIRECTIONS = [
     ("Up", (0, -1)),
@@ -14,35 +18,26 @@ DIRECTIONS = [
     ("Right", (1, 0)),
 ]
 
-# Quy tắc combo và kích thước túi
-COMBO_RULES = {
-    0: (2, 200),
-    1: (3, 300),
-    2: (4, 400),
-    3: (5, 500),
-    4: (6, 600),
-}
-BAG_SIZE = 7
-
 # Tên file để lưu Q-table
 Q_TABLE_FILE = "qtable17_path.pkl"
 
 # Thu nhỏ không gian trạng thái
-def get_state_key(pos, map_tiles, last_item_type):
+def get_state_key(pos, map_tiles, last_item_type, object_index=None, cmap=None):
     """
     Tạo khóa trạng thái dựa trên thông tin tương đối thay vì tọa độ chính xác
     - Hướng tương đối đến vật phẩm mục tiêu gần nhất
     - Loại vật phẩm cuối cùng trong túi
+    object_index, cmap: chuyển tiếp cho find_nearest_object
     """
     # Xác định vật phẩm mục tiêu
     target_type = last_item_type if last_item_type >= 0 else None
     
     # Tìm vật phẩm mục tiêu gần nhất
-    target_pos, distance = find_nearest_object(map_tiles, pos, target_type)
+    target_pos, distance = find_nearest_object(map_tiles, pos, target_type, object_index, cmap)
     
     # Nếu không tìm thấy, tìm vật phẩm bất kỳ
     if target_pos is None:
-        target_pos, distance = find_nearest_object(map_tiles, pos)
+        target_pos, distance = find_nearest_object(map_tiles, pos, None, object_index, cmap)
         if target_pos is None:
             # Không còn vật phẩm nào trên bản đồ
             return (-1, -1, last_item_type)
@@ -79,23 +74,18 @@ def get_state_key(pos, map_tiles, last_item_type):
     
     return (direction, distance_level, last_item_type)
 
-def get_available_actions(map_tiles, pos):
+def get_available_actions(cmap, pos):
     """
     Xác định các hành động hợp lệ từ vị trí hiện tại
-    """
-    rows = len(map_tiles)
-    cols = len(map_tiles[0])
-    valid_actions = []
     
-    for i, (direction, (dx, dy)) in enumerate(DIRECTIONS):
-        nx, ny = pos[0] + dx, pos[1] + dy
-        # Kiểm tra vị trí mới có nằm trong bản đồ không
-        if 0 <= nx < cols and 0 <= ny < rows:
-            # Kiểm tra không phải là tường
-            if not (isinstance(map_tiles[ny][nx], str) and map_tiles[ny][nx] != ' '):
-                valid_actions.append(i)
+    Tham số:
+        cmap: Map đã biên dịch (map_handler.compile_map), bảng ô kề đã loại sẵn tường
+        pos: Vị trí hiện tại (x, y)
     
-    return valid_actions
+    Trả về:
+        Danh sách chỉ số hành động (theo DIRECTIONS)
+    """
+    return [code for code, _ in cmap.neighbors[cmap.cell_of(pos)]]
 
 def calculate_manhattan_distance(pos1, pos2):
     """
@@ -103,96 +93,62 @@ def calculate_manhattan_distance(pos1, pos2):
     """
     return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
 
-def get_distance_with_obstacles(map_tiles, pos1, pos2):
+def get_distance_with_obstacles(map_tiles, pos1, pos2, cmap=None):
     """
     Tính khoảng cách giữa hai điểm có xét đến vật cản
-    - Nếu có đường đi trực tiếp: trả về khoảng cách Manhattan
-    - Nếu có vật cản: trả về khoảng cách Manhattan + phạt dựa trên số lượng vật cản
-    - Sử dụng hàm phạt phi tuyến để đánh giá tốt hơn
+    - Tra bảng khoảng cách đường đi thật của bố cục map (số bước đi vòng qua tường)
+    - Trả về float('inf') nếu pos2 là None hoặc hai điểm không thông nhau
+    - cmap: map đã biên dịch (nếu đã có sẵn) để khỏi biên dịch lại
     """
     if pos2 is None:
         return float('inf')
     
-    # Tính khoảng cách Manhattan
-    manhattan_dist = calculate_manhattan_distance(pos1, pos2)
-    
-    # Kiểm tra đường đi thẳng
-    if has_clear_path(map_tiles, pos1, pos2):
-        return manhattan_dist
-    
-    # Nếu có vật cản, đếm số lượng vật cản trên đường đi
-    obstacles = 0
-    x1, y1 = pos1
-    x2, y2 = pos2
-    
-    # Đếm vật cản theo đường đi Manhattan
-    if x1 != x2 and y1 != y2:
-        # Đường đi chéo, kiểm tra cả 2 đường đi có thể
-        path1_obstacles = 0
-        path2_obstacles = 0
-        
-        # Đường đi 1: đi ngang trước, dọc sau
-        for x in range(min(x1, x2), max(x1, x2) + 1):
-            if isinstance(map_tiles[y1][x], str) and map_tiles[y1][x] != ' ':
-                path1_obstacles += 1
-        for y in range(min(y1, y2), max(y1, y2) + 1):
-            if isinstance(map_tiles[y][x2], str) and map_tiles[y][x2] != ' ':
-                path1_obstacles += 1
-                
-        # Đường đi 2: đi dọc trước, ngang sau
-        for y in range(min(y1, y2), max(y1, y2) + 1):
-            if isinstance(map_tiles[y][x1], str) and map_tiles[y][x1] != ' ':
-                path2_obstacles += 1
-        for x in range(min(x1, x2), max(x1, x2) + 1):
-            if isinstance(map_tiles[y2][x], str) and map_tiles[y2][x] != ' ':
-                path2_obstacles += 1
-                
-        obstacles = min(path1_obstacles, path2_obstacles)
-    else:
-        # Đường đi thẳng ngang hoặc dọc
-        if x1 == x2:  # Đường dọc
-            for y in range(min(y1, y2), max(y1, y2) + 1):
-                if isinstance(map_tiles[y][x1], str) and map_tiles[y][x1] != ' ':
-                    obstacles += 1
-        else:  # Đường ngang
-            for x in range(min(x1, x2), max(x1, x2) + 1):
-                if isinstance(map_tiles[y1][x], str) and map_tiles[y1][x] != ' ':
-                    obstacles += 1
-    
-    # Phạt phi tuyến dựa trên số lượng vật cản
-    # obstacles * (1 + 0.2 * obstacles) tạo ra phạt tăng dần theo số lượng vật cản
-    # ví dụ: 1 vật cản = 1*1.2 = 1.2, 2 vật cản = 2*1.4 = 2.8, 3 vật cản = 3*1.6 = 4.8
-    penalty = obstacles * (1 + 0.2 * obstacles)
-    result = manhattan_dist + penalty
-    
-    return result
+    if cmap is None:
+        cmap = compile_map(map_tiles)
+    
+    distance = cmap.dist(cmap.cell_of(pos1), cmap.cell_of(pos2))
+    if distance == UNREACHABLE:
+        return float('inf')
+    return distance
 
-def find_nearest_object(map_tiles, pos, target_type=None):
+def find_nearest_object(map_tiles, pos, target_type=None, object_index=None, cmap=None):
     """
     Tìm vật phẩm gần nhất có loại target_type, xét đến vật cản
     Nếu target_type là None, tìm vật phẩm bất kỳ gần nhất
     Trả về (vị trí, khoảng cách) hoặc (None, float('inf')) nếu không tìm thấy
+    object_index, cmap: chỉ mục vật phẩm và map đã biên dịch (nếu đã có sẵn) để khỏi quét lại map
     """
-    rows = len(map_tiles)
-    cols = len(map_tiles[0])
+    if cmap is None:
+        cmap = compile_map(map_tiles)
+    distances = cmap.distances
     min_distance = float('inf')
     nearest_pos = None
     
-    # Thu thập tất cả các vật phẩm phù hợp
-    candidates = []
-    for y in range(rows):
-        for x in range(cols):
-            cell = map_tiles[y][x]
-            if isinstance(cell, int):
-                if target_type is None or cell == target_type:
-                    candidates.append((x, y))
-    
-    # Tính khoảng cách có xét đến vật cản đến từng vật phẩm
-    for candidate_pos in candidates:
-        distance = get_distance_with_obstacles(map_tiles, pos, candidate_pos)
-        if distance < min_distance:
+    # Khoảng cách đường đi thật từ pos tới mọi ô nằm trên một hàng của bảng khoảng cách
+    row = distances.row(cmap.cell_of(pos))
+    if row is None:
+        return nearest_pos, min_distance
+    index = distances.index
+    
+    # Thu thập các vật phẩm phù hợp
+    if object_index is not None:
+        candidates = object_index.positions_of(target_type)
+    else:
+        obj_type = cmap.obj_type
+        candidates = [cmap.pos_of(cell) for cell in range(cmap.size)
+                      if obj_type[cell] >= 0 and (target_type is None or obj_type[cell] == target_type)]
+    
+    # Chọn vật phẩm gần nhất (hòa thì ưu tiên theo thứ tự hàng, cột trên map)
+    best_key = None
+    for x, y in candidates:
+        distance = row[index[y * cmap.cols + x]]
+        if distance == UNREACHABLE:
+            continue
+        key = (distance, y, x)
+        if best_key is None or key < best_key:
+            best_key = key
             min_distance = distance
-            nearest_pos = candidate_pos
+            nearest_pos = (x, y)
     
     return nearest_pos, min_distance
 
@@ -229,7 +185,7 @@ def moving_towards_target(pos, new_pos, target_pos, map_tiles):
     return new_distance < current_distance
 
 class QLearningAgent:
-    def __init__(self, alpha=0.2, gamma=0.9, epsilon=0.3, epsilon_decay=0.995, min_epsilon=0.1):
+    def __init__(self, alpha=0.2, gamma=0.9, epsilon=0.3, epsilon_decay=0.995, min_epsilon=0.1, rng=None):
         """
         Khởi tạo agent Q-learning với các tham số cải tiến
         
@@ -239,7 +195,9 @@ class QLearningAgent:
         - epsilon: Xác suất khám phá (exploration rate) - tăng để khám phá nhiều hơn
         - epsilon_decay: Tỷ lệ giảm epsilon - giảm nhanh hơn
         - min_epsilon: Giá trị tối thiểu của epsilon
+        - rng: random.Random cho khởi tạo Q-value và khám phá (mặc định module random)
         """
+        self.rng = rng if rng is not None else random
         self.alpha = alpha
         self.gamma = gamma
         self.epsilon = epsilon
@@ -258,17 +216,17 @@ class QLearningAgent:
         """
         if (state, action) not in self.q_table:
             # Khởi tạo giá trị Q ban đầu thấp hơn 0
-            self.q_table[(state, action)] = random.uniform(-0.1, 0.1)
+            self.q_table[(state, action)] = self.rng.uniform(-0.1, 0.1)
         return self.q_table[(state, action)]
     
     def choose_action(self, state, valid_actions):
         """
         Chọn hành động dựa trên chính sách epsilon-greedy
         """
-        if random.random() < self.epsilon:
+        if self.rng.random() < self.epsilon:
             # Khám phá: chọn hành động ngẫu nhiên
             self.explored_actions += 1
-            return random.choice(valid_actions)
+            return self.rng.choice(valid_actions)
         else:
             # Khai thác: chọn hành động có giá trị Q cao nhất
             q_values = [self.get_q_value(state, action) for action in valid_actions]
@@ -276,7 +234,7 @@ class QLearningAgent:
             # Nếu có nhiều hành động có cùng giá trị Q tối đa, chọn ngẫu nhiên một trong số đó
             best_actions = [action for action, q in zip(valid_actions, q_values) if q == max_q]
             self.exploited_actions += 1
-            return random.choice(best_actions)
+            return self.rng.choice(best_actions)
     
     def update_q_value(self, state, action, reward, next_state, next_valid_actions):
         """
@@ -332,7 +290,7 @@ class QLearningAgent:
             'current_epsilon': self.epsilon
         }
 
-def get_reward(map_tiles, pos, new_pos, cell_type, bag, target_type, last_distance):
+def get_reward(map_tiles, pos, new_pos, cell_type, bag, target_type, last_distance, object_index=None, cmap=None):
     """
     Tính toán reward dựa trên hành động của agent
     """
@@ -340,11 +298,11 @@ def get_reward(map_tiles, pos, new_pos, cell_type, bag, target_type, last_distan
     reward = -0.1
     
     # Tìm vật phẩm mục tiêu và khoảng cách
-    target_pos, new_distance = find_nearest_object(map_tiles, new_pos, target_type)
+    target_pos, new_distance = find_nearest_object(map_tiles, new_pos, target_type, object_index, cmap)
     
     # Nếu không tìm thấy vật phẩm cùng loại, tìm vật phẩm bất kỳ
     if target_pos is None:
-        target_pos, new_distance = find_nearest_object(map_tiles, new_pos)
+        target_pos, new_distance = find_nearest_object(map_tiles, new_pos, None, object_index, cmap)
     
     # Phần thưởng cho việc tiến gần hơn đến vật phẩm
     if target_pos and last_distance > new_distance:
@@ -381,11 +339,15 @@ def get_reward(map_tiles, pos, new_pos, cell_type, bag, target_type, last_distan
     
     return reward, new_distance
 
-def train_agent(map_tiles, num_episodes=1000, max_steps=500, save_interval=1000):
+def train_agent(map_tiles, num_episodes=1000, max_steps=500, save_interval=1000, rng=None):
     """
     Huấn luyện agent Q-learning với random map định kỳ
+    rng: random.Random dùng cho mọi lựa chọn ngẫu nhiên (đặt vật phẩm, vị trí xuất phát, khám phá);
+         cùng seed cho cùng quá trình huấn luyện. Mặc định module random
     """
-    agent = QLearningAgent()
+    if rng is None:
+        rng = random
+    agent = QLearningAgent(rng=rng)
     total_rewards = []
     avg_rewards = []
     
@@ -414,17 +376,22 @@ def train_agent(map_tiles, num_episodes=1000, max_steps=500, save_interval=1000)
             
             # Random vật phẩm mới vào bản đồ
             from map_handler import place_random_objects
-            place_random_objects(current_map, len(current_map))
+            place_random_objects(current_map, len(current_map), rng=rng)
             print(f"*** Random lại vật phẩm cho episode {episode} ***")
         else:
             # Tạo bản sao của map hiện tại để sử dụng
             current_map = [row[:] for row in map_tiles]
         
+        # Biên dịch bố cục map một lần cho cả episode (tường không thay đổi khi nhặt vật phẩm)
+        cmap = compile_map(current_map)
+        # Chỉ mục vật phẩm của episode, cập nhật khi nhặt vật phẩm
+        object_index = ObjectIndex(current_map)
+        
         # Khởi tạo vị trí người chơi ngẫu nhiên
-        player_pos = (random.randint(0, len(current_map[0])-1), random.randint(0, len(current_map)-1))
+        player_pos = (rng.randint(0, len(current_map[0])-1), rng.randint(0, len(current_map)-1))
         # Đảm bảo vị trí bắt đầu là ô trống
         while isinstance(current_map[player_pos[1]][player_pos[0]], str) and current_map[player_pos[1]][player_pos[0]] != ' ':
-            player_pos = (random.randint(0, len(current_map[0])-1), random.randint(0, len(current_map)-1))
+            player_pos = (rng.randint(0, len(current_map[0])-1), rng.randint(0, len(current_map)-1))
         
         bag = []
         episode_reward = 0
@@ -432,31 +399,31 @@ def train_agent(map_tiles, num_episodes=1000, max_steps=500, save_interval=1000)
         
         # Khởi tạo target_type và last_distance
         target_type = None
-        target_pos, last_distance = find_nearest_object(current_map, player_pos, target_type)
+        target_pos, last_distance = find_nearest_object(current_map, player_pos, target_type, object_index, cmap)
         
         # Tạo một số cặp (state, action) mẫu để theo dõi
         if episode == 0:
             for _ in range(5):
-                sample_state = get_state_key(player_pos, current_map, -1)
-                valid_actions = get_available_actions(current_map, player_pos)
+                sample_state = get_state_key(player_pos, current_map, -1, object_index, cmap)
+                valid_actions = get_available_actions(cmap, player_pos)
                 if valid_actions:
-                    sample_action = random.choice(valid_actions)
+                    sample_action = rng.choice(valid_actions)
                     sample_states.append(sample_state)
                     sample_actions.append(sample_action)
         
         for step in range(max_steps):
             # Kiểm tra nếu không còn vật phẩm nào trên bản đồ
-            if not any(isinstance(current_map[y][x], int) for y in range(len(current_map)) for x in range(len(current_map[0]))):
+            if not object_index.has():
                 # Reward bổ sung khi hoàn thành tất cả vật phẩm
                 episode_reward += 50
                 break
             
             # Xác định trạng thái hiện tại
             last_item_type = bag[-1] if bag else -1  # -1 nếu túi rỗng
-            state = get_state_key(player_pos, current_map, last_item_type)
+            state = get_state_key(player_pos, current_map, last_item_type, object_index, cmap)
             
             # Xác định các hành động hợp lệ từ vị trí hiện tại
-            valid_actions = get_available_actions(current_map, player_pos)
+            valid_actions = get_available_actions(cmap, player_pos)
             
             if not valid_actions:
                 break
@@ -477,7 +444,8 @@ def train_agent(map_tiles, num_episodes=1000, max_steps=500, save_interval=1000)
                 target_type = bag[-1]
             
             # Tính toán reward
-            reward, new_distance = get_reward(current_map, player_pos, new_pos, new_cell, bag, target_type, last_distance)
+            reward, new_distance = get_reward(current_map, player_pos, new_pos, new_cell, bag, target_type, last_distance,
+                                              object_index, cmap)
             last_distance = new_distance
             
             # Cập nhật túi nếu nhặt vật phẩm
@@ -488,6 +456,7 @@ def train_agent(map_tiles, num_episodes=1000, max_steps=500, save_interval=1000)
                     if len(bag) > BAG_SIZE:
                         bag.pop(0)
                     current_map[y][x] = ' '  # Xóa vật phẩm khỏi bản đồ
+                    object_index.remove((x, y), new_cell)
                     
                     # Kiểm tra combo
                     for obj in range(5):  # Các loại vật phẩm từ 0 đến 4
@@ -503,8 +472,8 @@ def train_agent(map_tiles, num_episodes=1000, max_steps=500, save_interval=1000)
             # Xác định trạng thái mới
             player_pos = new_pos
             last_item_type = bag[-1] if bag else -1
-            next_state = get_state_key(player_pos, current_map, last_item_type)
-            next_valid_actions = get_available_actions(current_map, player_pos)
+            next_state = get_state_key(player_pos, current_map, last_item_type, object_index, cmap)
+            next_valid_actions = get_available_actions(cmap, player_pos)
             
             # Cập nhật Q-value
             agent.update_q_value(state, action, reward, next_state, next_valid_actions)
@@ -644,72 +613,7 @@ def is_valid_move(map_tiles, pos, action, target_type):
     
     return True
 
-def has_clear_path(map_tiles, pos1, pos2):
-    """
-    Kiểm tra xem có đường đi trực tiếp không bị chắn bởi tường hay không
-    Trả về True nếu có đường thẳng không bị chắn, False nếu có vật cản
-    """
-    if pos2 is None:
-        return False
-        
-    x1, y1 = pos1
-    x2, y2 = pos2
-    
-    # Nếu hai điểm trùng nhau
-    if x1 == x2 and y1 == y2:
-        return True
-    
-    # Kiểm tra ngay nếu hai điểm ở cạnh nhau
-    if abs(x1 - x2) + abs(y1 - y2) == 1:
-        # Nếu hai điểm kề nhau, không cần kiểm tra thêm
-        return True
-    
-    # Trường hợp di chuyển theo hàng ngang
-    if y1 == y2:
-        start_x, end_x = min(x1, x2), max(x1, x2)
-        for x in range(start_x + 1, end_x):
-            if isinstance(map_tiles[y1][x], str) and map_tiles[y1][x] != ' ':
-                return False
-        return True
-    
-    # Trường hợp di chuyển theo hàng dọc
-    if x1 == x2:
-        start_y, end_y = min(y1, y2), max(y1, y2)
-        for y in range(start_y + 1, end_y):
-            if isinstance(map_tiles[y][x1], str) and map_tiles[y][x1] != ' ':
-                return False
-        return True
-    
-    # Nếu hai điểm không nằm trên một đường thẳng, đường đi sẽ là đường gấp khúc
-    # Cần di chuyển theo hàng ngang rồi dọc hoặc ngược lại
-    # Kiểm tra nếu đi theo hàng ngang trước
-    has_horizontal_first = True
-    for x in range(min(x1, x2) + 1, max(x1, x2)):
-        if isinstance(map_tiles[y1][x], str) and map_tiles[y1][x] != ' ':
-            has_horizontal_first = False
-            break
-    
-    for y in range(min(y1, y2) + 1, max(y1, y2)):
-        if isinstance(map_tiles[y][x2], str) and map_tiles[y][x2] != ' ':
-            has_horizontal_first = False
-            break
-    
-    # Kiểm tra nếu đi theo hàng dọc trước
-    has_vertical_first = True
-    for y in range(min(y1, y2) + 1, max(y1, y2)):
-        if isinstance(map_tiles[y][x1], str) and map_tiles[y][x1] != ' ':
-            has_vertical_first = False
-            break
-    
-    for x in range(min(x1, x2) + 1, max(x1, x2)):
-        if isinstance(map_tiles[y2][x], str) and map_tiles[y2][x] != ' ':
-            has_vertical_first = False
-            break
-    
-    # Nếu có ít nhất một đường đi không bị chắn
-    return has_horizontal_first or has_vertical_first
-
-def qlearning_search(map_tiles, start_pos, bag):
+def qlearning_search(map_tiles, start_pos, bag, object_index=None, rng=None):
     """
     Sử dụng thuần túy Q-learning để tìm đường đi
     
@@ -718,8 +622,21 @@ def qlearning_search(map_tiles, start_pos, bag):
        Nếu không còn vật phẩm cùng loại: Nhặt vật phẩm gần nhất bất kỳ
     
     CẢI TIẾN: Đảm bảo không đi qua vật phẩm khác loại khi túi không rỗng
+    
+    Trả về SearchResult: mỗi bước đi là một trạng thái được mở rộng, mỗi hành động hợp lệ được
+    tra Q-value là một nút sinh ra; goal luôn là "fallback" (Q-learning chỉ đi tới vật phẩm gần nhất)
+    rng: random.Random của game (nếu có) để chọn giữa các hành động ngang nhau, cùng seed cho cùng đường đi
     """
-    agent = QLearningAgent()
+    if rng is None:
+        rng = random
+    result = SearchResult()
+    agent = QLearningAgent(rng=rng)
+    
+    # Bố cục map chỉ cần biên dịch một lần cho cả lần tìm đường
+    cmap = compile_map(map_tiles)
+    # Chỉ mục vật phẩm của game (dựng từ map nếu không được truyền vào)
+    if object_index is None:
+        object_index = ObjectIndex(map_tiles)
     
     # Hiển thị thông tin Q-table
     q_table_size = len(agent.q_table)
@@ -739,12 +656,13 @@ def qlearning_search(map_tiles, start_pos, bag):
         target_type = bag[-1]  # Loại vật phẩm cuối cùng trong túi
     
     # Tìm vị trí vật phẩm mục tiêu để ghi nhận
-    target_pos, _ = find_nearest_object(map_tiles, start_pos, target_type)
+    target_pos, _ = find_nearest_object(map_tiles, start_pos, target_type, object_index, cmap)
     if target_pos is None:
-        target_pos, _ = find_nearest_object(map_tiles, start_pos)
+        target_pos, _ = find_nearest_object(map_tiles, start_pos, None, object_index, cmap)
     
     max_steps = 100  # Giới hạn số bước
     last_distance = float('inf')
+    start_time = time.perf_counter()
     
     for step in range(max_steps):
         # Kiểm tra nếu đã đến vật phẩm mục tiêu
@@ -758,10 +676,10 @@ def qlearning_search(map_tiles, start_pos, bag):
         
         # Xác định trạng thái
         last_item_type = bag[-1] if bag else -1
-        state = get_state_key(current_pos, map_tiles, last_item_type)
+        state = get_state_key(current_pos, map_tiles, last_item_type, object_index, cmap)
         
         # Xác định các hành động hợp lệ
-        all_valid_actions = get_available_actions(map_tiles, current_pos)
+        all_valid_actions = get_available_actions(cmap, current_pos)
         
         if not all_valid_actions:
             break
@@ -777,11 +695,11 @@ def qlearning_search(map_tiles, start_pos, bag):
         if not valid_actions:
             if target_type is not None:
                 # Thử tìm vật phẩm cùng loại ở vị trí khác
-                new_target_pos, _ = find_nearest_object(map_tiles, current_pos, target_type)
+                new_target_pos, _ = find_nearest_object(map_tiles, current_pos, target_type, object_index, cmap)
                 if new_target_pos is None:
                     # Nếu không tìm thấy vật phẩm cùng loại, chuyển sang nhặt bất kỳ
                     target_type = None
-                    target_pos, _ = find_nearest_object(map_tiles, current_pos)
+                    target_pos, _ = find_nearest_object(map_tiles, current_pos, None, object_index, cmap)
                     # Sử dụng lại tất cả hành động
                     valid_actions = all_valid_actions
                 else:
@@ -795,6 +713,7 @@ def qlearning_search(map_tiles, start_pos, bag):
                 break
         
         # Tìm hành động tốt nhất theo Q-table (chỉ từ các hành động hợp lệ)
+        result.record(generated=len(valid_actions), expanded=1, frontier=1)
         q_values = []
         for action in valid_actions:
             q_pair = (state, action)
@@ -819,14 +738,14 @@ def qlearning_search(map_tiles, start_pos, bag):
                 new_pos_to_check = (new_x, new_y)
                 
                 # Sử dụng khoảng cách có xét đến vật cản
-                dist = get_distance_with_obstacles(map_tiles, new_pos_to_check, target_pos)
+                dist = get_distance_with_obstacles(map_tiles, new_pos_to_check, target_pos, cmap)
                 if dist < min_distance:
                     min_distance = dist
                     best_action = action
         
         if best_action is None:
             # Nếu không tìm được hành động tốt nhất từ các heuristic, sử dụng Q-value
-            best_action = random.choice(best_actions) if best_actions else None
+            best_action = rng.choice(best_actions) if best_actions else None
             if best_action is None:
                 break
         
@@ -845,7 +764,7 @@ def qlearning_search(map_tiles, start_pos, bag):
                 break
             
             # Chọn hành động thay thế
-            alt_action = random.choice(alternative_actions)
+            alt_action = rng.choice(alternative_actions)
             direction, (dx, dy) = DIRECTIONS[alt_action]
             next_pos = (current_pos[0] + dx, current_pos[1] + dy)
             
@@ -863,7 +782,7 @@ def qlearning_search(map_tiles, start_pos, bag):
             if not alternative_actions:
                 break  # Không còn hành động thay thế
             
-            alt_action = random.choice(alternative_actions)
+            alt_action = rng.choice(alternative_actions)
             direction, (dx, dy) = DIRECTIONS[alt_action]
             next_pos = (current_pos[0] + dx, current_pos[1] + dy)
             
@@ -897,15 +816,15 @@ def qlearning_search(map_tiles, start_pos, bag):
         
         # Tính khoảng cách mới đến mục tiêu
         if target_pos:
-            new_distance = get_distance_with_obstacles(map_tiles, next_pos, target_pos)
+            new_distance = get_distance_with_obstacles(map_tiles, next_pos, target_pos, cmap)
             if new_distance >= last_distance and len(path) > 10:
                 # Nếu không tiến gần hơn sau 10 bước, có thể bị lặp
                 # Tìm lại vật phẩm mục tiêu
                 if target_type is not None:
-                    target_pos, _ = find_nearest_object(map_tiles, next_pos, target_type)
+                    target_pos, _ = find_nearest_object(map_tiles, next_pos, target_type, object_index, cmap)
                 if target_pos is None:
-                    target_pos, _ = find_nearest_object(map_tiles, next_pos)
-                last_distance = get_distance_with_obstacles(map_tiles, next_pos, target_pos) if target_pos else float('inf')
+                    target_pos, _ = find_nearest_object(map_tiles, next_pos, None, object_index, cmap)
+                last_distance = get_distance_with_obstacles(map_tiles, next_pos, target_pos, cmap) if target_pos else float('inf')
             else:
                 last_distance = new_distance
         
@@ -915,13 +834,20 @@ def qlearning_search(map_tiles, start_pos, bag):
     # In thống kê chỉ về Q-table hits
     print(f"Tìm đường xong: {len(path)} bước | Q-table hits: {q_hits}")
     
-    return path
+    result.timings["policy"] = time.perf_counter() - start_time
+    result.record(visited=len(visited))
+    result.notes.append(f"Q-table hits: {q_hits}")
+    return result.finish(path, "fallback")
 
 def main():
     """
     Hàm main để huấn luyện và kiểm tra thuật toán Q-learning
     """
     from map_handler import load_map_from_file, place_random_objects
+    from seeding import parse_seed
+    
+    # Seed (--seed) cho cả việc đặt vật phẩm lẫn huấn luyện
+    rng = random.Random(parse_seed())
     
     # Tải map mặc định
     GRID_SIZE = 25
@@ -929,18 +855,18 @@ def main():
     map_tiles = load_map_from_file(map_file, GRID_SIZE)
     
     # Khởi tạo ngẫu nhiên các vật phẩm
-    place_random_objects(map_tiles, GRID_SIZE)
+    place_random_objects(map_tiles, GRID_SIZE, rng=rng)
     
     # Huấn luyện agent
     print("Bắt đầu huấn luyện Q-learning...")
-    agent, rewards, avg_rewards = train_agent(map_tiles, num_episodes=5000, max_steps=500, save_interval=1000)
+    agent, rewards, avg_rewards = train_agent(map_tiles, num_episodes=5000, max_steps=500, save_interval=1000, rng=rng)
     
     # Kiểm tra thuật toán
     start_pos = (GRID_SIZE // 2, GRID_SIZE // 2)
     bag = []
     
     print("\nKiểm tra tìm đường với túi rỗng:")
-    path = qlearning_search(map_tiles, start_pos, bag)
+    path = qlearning_search(map_tiles, start_pos, bag, rng=rng)
     print(f"Tìm thấy đường đi với {len(path)} bước")
     
     # Mô phỏng nhặt vật phẩm đầu tiên
@@ -954,7 +880,7 @@ def main():
             map_tiles[y][x] = " "
     
     print("\nKiểm tra tìm đường với túi có vật phẩm:")
-    path = qlearning_search(map_tiles, last_pos, bag)
+    path = qlearning_search(map_tiles, last_pos, bag, rng=rng)
     print(f"Tìm thấy đường đi với {len(path)} bước")
 
 if __name__ == "__main__":
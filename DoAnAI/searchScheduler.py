@@ -0,0 +1,311 @@
+import heapq
+import time
+
+from map_handler import ObjectIndex, OBJECT_TYPES, UNREACHABLE, compile_map
+from search_state import StateCodec, DIRECTION_NAMES
+from combo_rules import COMBO_RULES, collect
+from searchAStar import _astar_nearest_target
+from searchMacro import _ObjectGraph
+from search_result import SearchResult
+
+# --- LẬP LỊCH NHẶT CHO CẢ VÁN (NHIỀU COMBO) ---
+# Các planner khác đều tham lam: tìm một combo (hoặc vật gần nhất), đi hết rồi tìm lại. Ở đây ta
+# chọn thứ tự của TẤT CẢ các combo còn làm được trên map để điểm trên mỗi bước là lớn nhất:
+#   - mỗi "đơn vị" là một combo của một loại; số đơn vị mỗi loại tính theo số vật phẩm còn lại
+#     (cộng phần đuôi túi cùng loại đang có)
+#   - các thứ tự đơn vị được duyệt như một cây tiền tố (DFS): mỗi nút thêm một combo vào cuối,
+#     túi được mô phỏng đúng như front-end (combo_rules.collect: tràn túi, xóa combo) để biết combo
+#     cần nhặt thêm bao nhiêu món và được bao nhiêu điểm; combo không đủ vật phẩm thì cắt nhánh
+#   - chi phí của một tiền tố là DP theo (vật phẩm kết thúc, tập vật phẩm đã dùng), dùng chung cho
+#     mọi thứ tự cùng tiền tố và chỉ giữ STATE_BEAM trạng thái rẻ nhất; mỗi combo là một khối
+#     Held-Karp (đường ngắn nhất qua k vật phẩm cùng loại) chỉ trong k + INTRA_SPARE vật phẩm gần
+#     ô vào nhất, khoảng cách lấy từ bảng DistanceTable của bố cục
+#   - con của một nút được thử theo điểm / số bước giảm dần: con đầu tiên luôn được đi tiếp nên
+#     lịch tham lam luôn có; các nhánh khác chỉ được thử khi chưa hết ngân sách (max_nodes nút,
+#     time_budget_ms mili giây), nên thời gian lập lịch có chặn dù map nhiều vật phẩm
+#   - chọn lịch đầy đủ (lá của cây) có điểm / số bước lớn nhất, rồi trải lại thành từng bước bằng BFS tránh các vật
+#     phẩm còn lại (searchMacro._ObjectGraph); nếu một chặng bị vật phẩm khác chặn thì lịch dừng ở đó
+# Lịch được giữ lại kèm (vị trí, túi, ObjectIndex.signature) trước mỗi bước: lần gọi sau nếu trạng
+# thái game vẫn nằm trên lịch thì chỉ trả phần còn lại, chỉ lập lịch lại khi map thay đổi khác dự kiến.
+
+INF = float('inf')
+
+# Ngân sách mỗi lần lập lịch: số nút của cây thứ tự combo và thời gian (mili giây)
+MAX_NODES = 2000
+TIME_BUDGET_MS = 100
+# Số trạng thái DP rẻ nhất được giữ sau mỗi combo
+STATE_BEAM = 32
+# Số vật phẩm dự phòng ngoài k vật phẩm của một combo được Held-Karp xét (các vật phẩm gần nhất)
+INTRA_SPARE = 2
+
+
+class GameScheduler:
+    """
+    Planner lập lịch nhặt nhiều combo cho cả ván, có giữ lịch giữa các lần gọi.
+
+    Tham số khởi tạo:
+        max_nodes: số nút tối đa của cây thứ tự combo mỗi lần lập lịch
+        time_budget_ms: thời gian tối đa để thử thêm thứ tự ngoài lịch tham lam
+
+    Thuộc tính:
+        planned: số lần phải lập lịch mới
+        reused: số lần trả tiếp phần còn lại của lịch cũ
+        combos, points, steps: số combo, tổng điểm và số bước của lịch hiện tại
+    """
+
+    def __init__(self, max_nodes=MAX_NODES, time_budget_ms=TIME_BUDGET_MS):
+        self.max_nodes = max_nodes
+        self.time_budget_ms = time_budget_ms
+        self.planned = 0
+        self.reused = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Bỏ lịch đang giữ (dùng khi đổi map hoặc Reset game).
+        """
+        self._path = []
+        self._index = {}
+        self.combos = 0
+        self.points = 0
+        self.steps = 0
+
+    def summary_text(self):
+        return f"Schedule: {self.combos} combo, {self.points} pts / {self.steps} steps"
+
+    def plan(self, map_tiles, start_pos, bag, object_index=None):
+        """
+        Đường đi theo lịch nhiều combo từ trạng thái hiện tại.
+
+        Tham số:
+            map_tiles: bản đồ hiện tại
+            start_pos: vị trí (x, y) của người chơi
+            bag: túi hiện tại
+            object_index: ObjectIndex của game (dựng từ map nếu không có)
+
+        Trả về:
+            SearchResult: toàn bộ phần còn lại của lịch (goal "combo"); nếu không còn combo nào làm
+            được thì là đường tới vật phẩm gần nhất như astar_search (goal "fallback")
+        """
+        result = SearchResult()
+        if object_index is None:
+            object_index = ObjectIndex(map_tiles)
+        i = self._index.get((start_pos, tuple(bag), object_index.signature))
+        if i is not None:
+            self.reused += 1
+            result.notes.append(self.summary_text())
+            return result.finish(self._path[i:], "combo")
+
+        self.planned += 1
+        self.reset()
+        cmap = compile_map(map_tiles)
+        codec = StateCodec(cmap)
+        with result.phase("schedule"):
+            sequence = self._schedule(cmap, codec, start_pos, bag, result)
+        if sequence:
+            with result.phase("realize"):
+                self._realize(cmap, codec, start_pos, bag, object_index.signature, sequence)
+        result.notes.append(self.summary_text())
+        if self._path:
+            return result.finish(self._path, "combo")
+
+        # Không còn combo nào: fallback tìm nearest
+        if not bag:
+            target_vals = [0, 1, 2, 3, 4]
+        else:
+            last = bag[-1]
+            target_vals = [last] if object_index.has(last) else [0, 1, 2, 3, 4]
+        with result.phase("fallback"):
+            path = _astar_nearest_target(map_tiles, start_pos, target_vals, result)
+        return result.finish(path, "fallback")
+
+    def _schedule(self, cmap, codec, start_pos, bag, stats=None):
+        """
+        Chọn thứ tự các combo và các vật phẩm của từng combo; trả về list slot vật phẩm theo thứ tự nhặt.
+        stats: SearchResult (nếu có): mỗi tiền tố thứ tự combo là một nút mở rộng, mỗi trạng thái DP
+        là một nút sinh ra; frontier là số trạng thái DP lớn nhất của một bước, visited là số khối
+        Held-Karp đã ghi nhớ
+        """
+        obj_cells = codec.obj_cells
+        type_slots = {obj_type: [] for obj_type in OBJECT_TYPES}
+        for slot, val in enumerate(codec.obj_vals):
+            type_slots[val].append(slot)
+
+        # Số combo mỗi loại còn có thể làm (đuôi túi cùng loại được tính vào combo đầu tiên)
+        units = {}
+        for obj_type, slots in type_slots.items():
+            need = COMBO_RULES[obj_type][0]
+            run = 0
+            for item in reversed(bag):
+                if item != obj_type:
+                    break
+                run += 1
+            units[obj_type] = (len(slots) + min(run, need - 1)) // need
+        if not any(units.values()):
+            return []
+
+        # Khoảng cách từ một nút (vật phẩm hoặc ô xuất phát) tới các vật phẩm, tra từ DistanceTable
+        # khi nút được dùng lần đầu
+        start_node = len(obj_cells)
+        cells = list(obj_cells) + [codec.cell_of(start_pos)]
+        distances = cmap.distances
+        obj_index = [distances.index[cell] for cell in obj_cells]
+        rows = {}
+
+        def dist_row(node):
+            row = rows.get(node)
+            if row is None:
+                drow = distances.row(cells[node])
+                row = [drow[idx] for idx in obj_index] if drow is not None else [UNREACHABLE] * start_node
+                rows[node] = row
+            return row
+
+        blocks = {}
+
+        def block(node, obj_type, avail, k):
+            # Một combo từ nút node: Held-Karp qua k vật phẩm trong k + INTRA_SPARE vật phẩm gần node
+            # nhất của loại obj_type còn trong avail; list (slot cuối, tập slot, chi phí, thứ tự),
+            # mỗi slot cuối một phần tử
+            key = (node, obj_type, avail & type_masks[obj_type], k)
+            result = blocks.get(key)
+            if result is not None:
+                return result
+            row = dist_row(node)
+            near = sorted((row[slot], slot) for slot in type_slots[obj_type]
+                          if (avail >> slot) & 1 and row[slot] != UNREACHABLE)
+            slots = [slot for _, slot in near[:k + INTRA_SPARE]]
+            layer = {(1 << slot, slot): (row[slot], (slot,)) for slot in slots}
+            for _ in range(k - 1):
+                next_layer = {}
+                for (mask, end), (cost, seq) in layer.items():
+                    end_row = dist_row(end)
+                    for slot in slots:
+                        d = end_row[slot]
+                        if (mask >> slot) & 1 or d == UNREACHABLE:
+                            continue
+                        new_key = (mask | (1 << slot), slot)
+                        if cost + d < next_layer.get(new_key, (INF,))[0]:
+                            next_layer[new_key] = (cost + d, seq + (slot,))
+                layer = next_layer
+            # Mỗi vật phẩm kết thúc chỉ giữ tập rẻ nhất
+            by_end = {}
+            for (mask, end), (cost, seq) in layer.items():
+                if cost < by_end.get(end, (INF,))[0]:
+                    by_end[end] = (cost, mask, seq)
+            result = [(end, mask, cost, seq) for end, (cost, mask, seq) in by_end.items()]
+            blocks[key] = result
+            return result
+
+        # Số món cần nhặt và điểm của một combo loại obj_type từ túi bag (mô phỏng như front-end)
+        picks_memo = {}
+
+        def picks(bag_tuple, obj_type):
+            key = (bag_tuple, obj_type)
+            result = picks_memo.get(key)
+            if result is None:
+                current, k, points = bag_tuple, 0, 0
+                while not points and k < COMBO_RULES[obj_type][0]:
+                    current, points = collect(current, obj_type)
+                    k += 1
+                result = (k, current, points)
+                picks_memo[key] = result
+            return result
+
+        type_masks = {obj_type: sum(1 << slot for slot in slots) for obj_type, slots in type_slots.items()}
+        deadline = time.perf_counter() + self.time_budget_ms / 1000.0
+        counters = {"generated": 0, "expanded": 0, "peak": 0}
+        best = [0.0, None]  # điểm / bước và chuỗi slot của lịch đầy đủ tốt nhất
+
+        def extend(states, current, obj_type):
+            # Thêm một combo loại obj_type vào mọi trạng thái DP (nút kết thúc, tập vật phẩm đã dùng)
+            k, next_bag, gained = picks(current, obj_type)
+            if len(states) > 1 and time.perf_counter() >= deadline:
+                # Hết thời gian: lịch tham lam làm nốt chỉ từ trạng thái rẻ nhất
+                states = dict([min(states.items(), key=lambda item: item[1][0])])
+            new_states = {}
+            for (node, used), (cost, chain) in states.items():
+                for end, mask, block_cost, seq in block(node, obj_type, ~used, k):
+                    key = (end, used | mask)
+                    total = cost + block_cost
+                    if total < new_states.get(key, (INF,))[0]:
+                        new_states[key] = (total, (chain, seq))
+            counters["generated"] += len(new_states)
+            counters["peak"] = max(counters["peak"], len(new_states))
+            if len(new_states) > STATE_BEAM:
+                new_states = dict(heapq.nsmallest(STATE_BEAM, new_states.items(), key=lambda item: item[1][0]))
+            return new_states, next_bag, gained
+
+        def search(states, current, counts, points):
+            # Duyệt cây các thứ tự combo (mỗi nút là một tiền tố, trạng thái DP dùng chung cho mọi
+            # thứ tự cùng tiền tố); nhánh con đầu tiên luôn là lựa chọn tham lam nên lịch tham lam
+            # luôn được làm xong, các nhánh còn lại chỉ được thử khi còn ngân sách
+            counters["expanded"] += 1
+            children = []
+            for obj_type, count in counts.items():
+                if not count:
+                    continue
+                new_states, next_bag, gained = extend(states, current, obj_type)
+                if not new_states or not gained:
+                    continue
+                cost = min(entry[0] for entry in new_states.values())
+                rate = (points + gained) / cost if cost else INF
+                children.append((rate, obj_type, new_states, next_bag, points + gained))
+            if not children:
+                # Lá: không thêm được combo nào nữa, so lịch đầy đủ này với lịch tốt nhất
+                if points:
+                    cost, chain = min(states.values(), key=lambda entry: entry[0])
+                    rate = points / cost if cost else INF
+                    if rate > best[0]:
+                        best[0], best[1] = rate, chain
+                return
+            children.sort(key=lambda child: -child[0])
+            for i, (_, obj_type, new_states, next_bag, new_points) in enumerate(children):
+                if i and (counters["expanded"] >= self.max_nodes or time.perf_counter() >= deadline):
+                    return
+                counts[obj_type] -= 1
+                search(new_states, next_bag, counts, new_points)
+                counts[obj_type] += 1
+
+        search({(start_node, 0): (0, None)}, tuple(bag), units, 0)
+        generated, expanded, peak_frontier = counters["generated"], counters["expanded"], counters["peak"]
+        best_seq = best[1]
+
+        if stats is not None:
+            stats.record(generated, expanded, peak_frontier, len(blocks))
+        if best_seq is None:
+            return []
+        sequence = []
+        while best_seq is not None:
+            best_seq, seq = best_seq
+            sequence[:0] = seq
+        return sequence
+
+    def _realize(self, cmap, codec, start_pos, bag, signature, sequence):
+        """
+        Trải thứ tự nhặt thành từng bước (BFS tránh vật phẩm còn lại) và ghi lại trạng thái trước mỗi bước.
+        """
+        cols = cmap.cols
+        graph = _ObjectGraph(cmap, codec)
+        cell = codec.cell_of(start_pos)
+        objects = codec.full_mask
+        pos = start_pos
+        current = tuple(bag)
+        path = []
+        for slot in sequence:
+            if all(edge_slot != slot for edge_slot, _ in graph.edges(cell, objects)):
+                break  # Chặng bị vật phẩm khác chặn: lịch dừng ở đây
+            target = codec.obj_cells[slot]
+            for code, step_cell in graph.path(cell, objects, target):
+                self._index[(pos, current, signature)] = len(path)
+                pos = (step_cell % cols, step_cell // cols)
+                path.append((DIRECTION_NAMES[code], pos))
+            val = codec.obj_vals[slot]
+            current, gained = collect(current, val)
+            signature ^= hash((pos, val))
+            objects &= ~(1 << slot)
+            cell = target
+            if gained:
+                self.combos += 1
+                self.points += gained
+        self._path = path
+        self.steps = len(path)
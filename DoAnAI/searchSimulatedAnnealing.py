@@ -1,12 +1,17 @@
 import random
 import math
-from collections import deque
+
+from map_handler import ObjectIndex, compile_map
+from search_state import StateCodec, NodeStore, DIRECTION_NAMES, DIRECTION_CODES, unpack_bag, bag_len, bag_first, bag_push
+from combo_rules import COMBO_RULES, BAG_SIZE, allowed_combo_objs, is_combo_goal
+from distance_field import SearchFields, nearest_target_path
+from search_result import SearchResult
 
 # --- CẤU TRÚC VÀ KHÁI NIỆM TRONG SIMULATED ANNEALING ---
-# Mỗi trạng thái được mô tả bởi:
-#   - pos: vị trí người chơi (x, y)
-#   - bag: tuple các vật phẩm hiện có trong túi (giữ thứ tự theo hàng đợi)
-#   - objects: frozenset các vị trí (x, y) trên map còn chứa vật phẩm
+# Mỗi trạng thái được mô tả bởi (nén thành một số nguyên, xem search_state.py):
+#   - pos: chỉ số ô của người chơi
+#   - bag: túi nén 3 bit mỗi ô (giữ thứ tự theo hàng đợi)
+#   - objects: bitmask các vật phẩm còn trên map
 #
 # Không gian trạng thái ban đầu (S0):
 #   - pos = start_pos (từ game hiện tại)
@@ -18,90 +23,25 @@ from collections import deque
 #     tức là bag mới chứa segment liên tiếp đúng loại và đúng số lượng.
 #   - Nếu không tìm được combo trong max_depth, ta fallback sang nhặt vật gần nhất.
 
-# Quy tắc combo và kích thước túi
-COMBO_RULES = {
-    0: (2, 200),
-    1: (3, 300),
-    2: (4, 400),
-    3: (5, 500),
-    4: (6, 600),
-}
-BAG_SIZE = 7
-
-# Các hướng di chuyển: tên và vector (dx, dy)
-DIRECTIONS = [
-    ("Up", (0, -1)),
-    ("Down", (0, 1)),
-    ("Left", (-1, 0)),
-    ("Right", (1, 0)),
-]
-
-
-def _allowed_combo_objs(empty_slots):
-    """
-    Dựa trên số ô trống trong túi, trả về danh sách obj có thể tạo combo:
-    - empty >=6: [0,1,2,3,4]
-    - empty ==5: [0,1,2,3]
-    - empty ==4: [0,1,2]
-    - empty ==3: [0,1]
-    - empty ==2: [0]
-    - else: []
-    """
-    if empty_slots >= 6:
-        return [0,1,2,3,4]
-    elif empty_slots == 5:
-        return [0,1,2,3]
-    elif empty_slots == 4:
-        return [0,1,2]
-    elif empty_slots == 3:
-        return [0,1]
-    elif empty_slots == 2:
-        return [0]
-    else:
-        return []
-
 
-def _check_combo_sim(bag, allowed_objs):
-    """
-    Kiểm tra xem bag (tuple) có chứa segment combo hợp lệ cho bất kỳ obj nào trong allowed_objs.
-    Trả về True ngay khi tìm thấy.
-    """
-    n = len(bag)
-    for obj in allowed_objs:
-        need, _ = COMBO_RULES[obj]
-        if n < need:
-            continue
-        # Duyệt các segment độ dài need
-        for i in range(n - need + 1):
-            if all(bag[i+j] == obj for j in range(need)):
-                return True
-    return False
-
-
-def _calculate_manhattan_distance(pos1, pos2):
-    """
-    Tính khoảng cách Manhattan giữa hai điểm
-    """
-    return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
-
-
-def _evaluate_state(state, map_tiles, target_obj=None, prioritize_combo=True):
+def _evaluate_state(state, codec, fields, target_obj=None, prioritize_combo=True):
     """
     Đánh giá trạng thái hiện tại dựa trên:
     1. Khả năng tạo combo (ưu tiên cao nhất)
-    2. Khoảng cách đến vật phẩm mục tiêu gần nhất
+    2. Khoảng cách đường đi thật đến vật phẩm mục tiêu gần nhất (tra trường khoảng cách
+       theo loại của SearchFields)
     
     Returns:
     - Điểm số: Càng cao càng tốt
     """
-    pos, bag_tup, objects = state
+    pos_cell, bag_code, objects = codec.decode(state)
+    idx = fields.index[pos_cell]
+    type_bits = fields.type_bits
+    bag_tup = unpack_bag(bag_code)
     score = 0
     
-    # Kiểm tra combo
-    empty_slots = BAG_SIZE - len(bag_tup)
-    allowed_objs = _allowed_combo_objs(empty_slots)
-    
-    if _check_combo_sim(bag_tup, allowed_objs):
+    # Kiểm tra combo (tra bảng theo túi đã nén)
+    if is_combo_goal(bag_code):
         # Nếu đã có combo, cho điểm cao nhất
         return 2000  # Tăng điểm thưởng khi tìm thấy combo
     
@@ -123,60 +63,46 @@ def _evaluate_state(state, map_tiles, target_obj=None, prioritize_combo=True):
     if objects:  # Nếu còn vật phẩm trên bản đồ
         if target_obj is not None:
             # Tìm vật phẩm mục tiêu gần nhất
-            target_positions = []
-            for obj_pos in objects:
-                x, y = obj_pos
-                if map_tiles[y][x] == target_obj:
-                    target_positions.append(obj_pos)
-            
-            if target_positions:
-                min_dist = min(_calculate_manhattan_distance(pos, obj_pos) for obj_pos in target_positions)
+            if objects & type_bits[target_obj]:
+                min_dist = fields.nearest(target_obj, objects)[idx]
                 score -= min_dist * 5  # Giảm hệ số phạt từ 10 xuống 5
             else:
                 # Không còn vật phẩm mục tiêu, điểm trừ lớn
                 score -= 500  # Giảm mức phạt
         else:
             # Không chỉ định vật phẩm mục tiêu, lấy vật phẩm gần nhất
-            min_dist = min(_calculate_manhattan_distance(pos, obj_pos) for obj_pos in objects)
+            min_dist = min(fields.nearest(obj_type, objects)[idx]
+                           for obj_type, bits in type_bits.items() if objects & bits)
             score -= min_dist * 5  # Giảm hệ số phạt từ 10 xuống 5
     
     return score
 
 
-def _get_valid_neighbors(state, map_tiles, allowed_objs=None):
+def _get_valid_neighbors(state, cmap, codec, allowed_objs=None):
     """
     Trả về danh sách các trạng thái kề với state hiện tại
     """
-    pos, bag_tup, objects = state
-    rows = len(map_tiles)
-    cols = len(map_tiles[0])
-    x0, y0 = pos
+    pos_cell, bag_code, objects = codec.decode(state)
     
     neighbors = []
     
-    for dir_name, (dx, dy) in DIRECTIONS:
-        nx, ny = x0 + dx, y0 + dy
-        
-        # Kiểm tra hợp lệ trong map và không phải wall
-        if not (0 <= nx < cols and 0 <= ny < rows):
-            continue
-        cell = map_tiles[ny][nx]
-        if isinstance(cell, str) and cell != ' ':
-            # wall hoặc chướng ngại khác
-            continue
+    # Các ô kề không phải wall đã được tính sẵn trong map biên dịch
+    for move_code, new_cell in cmap.neighbors[pos_cell]:
+        dir_name = DIRECTION_NAMES[move_code]
         
         # Tạo state mới
-        new_bag = list(bag_tup)
+        new_bag = bag_code
         new_objects = objects
         
         # Nếu có object ở ô mới
-        if (nx, ny) in objects:
-            val = map_tiles[ny][nx]
+        slot = codec.obj_slot[new_cell]
+        if slot >= 0 and (objects >> slot) & 1:
+            val = codec.obj_vals[slot]
             
             # Kiểm tra các điều kiện về vật phẩm
-            if new_bag:
+            if bag_code:
                 # Nếu đã có ít nhất một vật phẩm, chỉ cho phép nhặt vật phẩm cùng loại
-                candidate = new_bag[0]
+                candidate = bag_first(bag_code)
                 if val != candidate:
                     continue  # Bỏ qua bước này
             else:
@@ -185,20 +111,18 @@ def _get_valid_neighbors(state, map_tiles, allowed_objs=None):
                     continue
             
             # Thêm vật phẩm vào túi
-            new_bag.append(val)
-            if len(new_bag) > BAG_SIZE:
-                new_bag.pop(0)
+            new_bag = bag_push(bag_code, val)
             
-            # Loại bỏ vị trí này khỏi tập objects
-            new_objects = objects.difference({(nx, ny)})
+            # Loại bỏ vật phẩm này khỏi bitmask objects
+            new_objects = objects & ~(1 << slot)
         
-        new_state = ((nx, ny), tuple(new_bag), new_objects)
+        new_state = codec.encode(new_cell, new_bag, new_objects)
         neighbors.append((dir_name, new_state))
     
     return neighbors
 
 
-def _simulated_annealing_find_combo(map_tiles, start_pos, bag, max_depth):
+def _simulated_annealing_find_combo(map_tiles, start_pos, bag, max_depth, object_index=None, stats=None, rng=None):
     """
     Sử dụng thuật toán Simulated Annealing để tìm đường đi tạo combo.
     
@@ -207,23 +131,25 @@ def _simulated_annealing_find_combo(map_tiles, start_pos, bag, max_depth):
     - start_pos: Vị trí bắt đầu (x, y)
     - bag: Danh sách các vật phẩm trong túi
     - max_depth: Độ sâu tối đa được phép
+    - object_index: ObjectIndex của game (nếu có), dùng lại trường khoảng cách theo loại của nó
+    - stats: SearchResult (nếu có) để cộng số bước thử / chấp nhận; goal của nó được đặt "combo"
+      khi thực sự tìm thấy combo
+    - rng: random.Random cho các lựa chọn ngẫu nhiên (mặc định module random)
     
     Trả về:
     - Danh sách các bước đi [(direction, (x, y)), ...]
     """
-    rows = len(map_tiles)
-    cols = len(map_tiles[0])
-    
-    # Tập các vị trí còn chứa object
-    initial_objects = frozenset(
-        (x, y)
-        for y in range(rows)
-        for x in range(cols)
-        if isinstance(map_tiles[y][x], int)
-    )
+    if rng is None:
+        rng = random
+    # Bộ mã hóa trạng thái: tập vật phẩm ban đầu trở thành bitmask
+    cmap = compile_map(map_tiles)
+    distances = cmap.distances
+    codec = StateCodec(cmap)
+    fields = SearchFields(codec, distances,
+                          object_index.distance_fields(cmap) if object_index is not None else None)
     
     # Trạng thái ban đầu
-    current_state = (start_pos, tuple(bag), initial_objects)
+    current_state = codec.start_state(start_pos, bag)
     
     # Tham số cho Simulated Annealing
     initial_temp = 200  # Tăng nhiệt độ ban đầu cho phép khám phá nhiều hơn
@@ -235,44 +161,50 @@ def _simulated_annealing_find_combo(map_tiles, start_pos, bag, max_depth):
     
     # Biến lưu trữ trạng thái tốt nhất
     best_state = current_state
-    best_score = _evaluate_state(current_state, map_tiles)
+    best_score = _evaluate_state(current_state, codec, fields)
     
-    # Lưu vết đường đi
-    state_path = {current_state: []}
+    # Lưu vết đường đi: trạng thái -> nút trong NodeStore (con trỏ cha)
+    nodes = NodeStore(codec.cols, codec.cell_of(start_pos))
+    state_node = {current_state: 0}
     
     temp = initial_temp
     iteration = 0
     
     while temp > min_temp and iteration < max_depth:
         # Lấy các trạng thái kề hợp lệ
-        empty_slots = BAG_SIZE - len(current_state[1])
-        allowed_objs = _allowed_combo_objs(empty_slots)
+        empty_slots = BAG_SIZE - bag_len(codec.decode(current_state)[1])
+        allowed_objs = allowed_combo_objs(empty_slots)
         
-        neighbors = _get_valid_neighbors(current_state, map_tiles, allowed_objs)
+        neighbors = _get_valid_neighbors(current_state, cmap, codec, allowed_objs)
         
         if not neighbors:
             break  # Không có bước đi hợp lệ
         
         # Chọn ngẫu nhiên một trạng thái kề
-        dir_name, next_state = random.choice(neighbors)
+        dir_name, next_state = rng.choice(neighbors)
+        next_cell = next_state & codec.cell_mask
         
         # Đánh giá trạng thái hiện tại và trạng thái kề
-        current_score = _evaluate_state(current_state, map_tiles)
-        next_score = _evaluate_state(next_state, map_tiles)
+        current_score = _evaluate_state(current_state, codec, fields)
+        next_score = _evaluate_state(next_state, codec, fields)
         
         # Kiểm tra nếu đã tìm thấy combo
         if next_score >= 2000:  # Điểm cao được cho khi có combo
             # Cập nhật đường đi
-            state_path[next_state] = state_path[current_state] + [(dir_name, next_state[0])]
-            return state_path[next_state]
+            state_node[next_state] = nodes.add(state_node[current_state], DIRECTION_CODES[dir_name], next_cell)
+            if stats is not None:
+                # Mỗi vòng lặp mở rộng trạng thái hiện tại; frontier chỉ có một trạng thái
+                stats.record(len(nodes) - 1, iteration + 1, 1, len(state_node))
+                stats.goal = "combo"
+            return nodes.path(state_node[next_state])
         
         # Tính delta score
         delta = next_score - current_score
         
         # Quyết định chấp nhận trạng thái mới hay không
-        if delta > 0 or random.random() < math.exp(delta / temp):
+        if delta > 0 or rng.random() < math.exp(delta / temp):
             # Cập nhật đường đi
-            state_path[next_state] = state_path[current_state] + [(dir_name, next_state[0])]
+            state_node[next_state] = nodes.add(state_node[current_state], DIRECTION_CODES[dir_name], next_cell)
             
             # Chuyển sang trạng thái mới
             current_state = next_state
@@ -289,87 +221,61 @@ def _simulated_annealing_find_combo(map_tiles, start_pos, bag, max_depth):
         iteration += 1
         
         # Hạn chế độ sâu của đường đi
-        if len(state_path[current_state]) >= max_depth:
+        if nodes.depth[state_node[current_state]] >= max_depth:
             break
     
     # Nếu không tìm thấy combo, trả về đường đi tới trạng thái tốt nhất
-    return state_path[best_state]
+    if stats is not None:
+        stats.record(len(nodes) - 1, iteration, 1, len(state_node))
+    return nodes.path(state_node[best_state])
 
 
 def _bfs_nearest_target(map_tiles, start_pos, target_vals):
     """
-    BFS để tìm đường ngắn nhất tới ô chứa giá trị trong target_vals.
+    Đường ngắn nhất tới ô chứa giá trị trong target_vals.
     Trả về path list hoặc [] nếu không tìm.
     Đảm bảo không nhặt vật phẩm khác trên đường đi.
+    (Lan sóng từ mọi mục tiêu bằng NumPy rồi xuống dốc từ start_pos, xem distance_field.py)
     """
-    rows = len(map_tiles)
-    cols = len(map_tiles[0])
-    queue = deque([(start_pos, [])])
-    visited = {start_pos}
-
-    while queue:
-        (x0, y0), path = queue.popleft()
-        # Nếu ô này chứa target
-        cell = map_tiles[y0][x0]
-        if isinstance(cell, int) and cell in target_vals:
-            return path  # path dẫn tới (x0,y0)
+    cmap = compile_map(map_tiles)
+    return nearest_target_path(cmap, start_pos, target_vals)
 
-        for dir_name, (dx, dy) in DIRECTIONS:
-            nx, ny = x0 + dx, y0 + dy
-            if not (0 <= nx < cols and 0 <= ny < rows):
-                continue
-            
-            c = map_tiles[ny][nx]
-            # Bỏ qua ô là tường
-            if isinstance(c, str) and c != ' ':
-                continue
-            
-            # Bỏ qua ô chứa vật phẩm KHÔNG nằm trong target_vals
-            # không cho phép nhặt vật phẩm khác
-            if isinstance(c, int) and c not in target_vals:
-                continue
-                
-            if (nx, ny) in visited:
-                continue
-                
-            visited.add((nx, ny))
-            queue.append(((nx, ny), path + [(dir_name, (nx, ny))]))
-
-    return []
-
-
-def simulated_annealing_search(map_tiles, start_pos, bag, max_depth=50):  # Tăng max_depth
+def simulated_annealing_search(map_tiles, start_pos, bag, max_depth=50, object_index=None, rng=None):  # Tăng max_depth
     """
     Tìm đường cho AI sử dụng Simulated Annealing:
     1) Thử tìm combo trong max_depth bước.
     2) Nếu không tìm được, fallback:
        - Nếu bag rỗng: nhặt bất kỳ vật gần nhất
        - Nếu bag không rỗng: nhặt vật cùng loại với item VỪA MỚI ĐƯỢC THÊM VÀO trong bag
+    object_index: ObjectIndex của game (nếu có) để tra nhanh vật phẩm còn trên map
+    rng: random.Random của game (nếu có) để cùng seed cho cùng đường đi
+    Trả về SearchResult (list các bước kèm thống kê tìm kiếm); goal là "partial" nếu đường đi chỉ
+    dẫn tới trạng thái tốt nhất tìm được mà chưa có combo
     """
+    result = SearchResult()
     # 1) Tìm combo
-    combo_path = _simulated_annealing_find_combo(map_tiles, start_pos, bag, max_depth)
+    with result.phase("combo"):
+        combo_path = _simulated_annealing_find_combo(map_tiles, start_pos, bag, max_depth, object_index, result, rng)
     if combo_path:
-        return combo_path
+        return result.finish(combo_path, result.goal or "partial")
 
     # 2) Fallback: tìm nearest
-    rows = len(map_tiles)
-    cols = len(map_tiles[0])
-    
     # Xác định target_vals dựa trên túi
     if not bag:
         target_vals = [0, 1, 2, 3, 4]
     else:
         last = bag[-1]
-        # Kiểm tra xem map còn object cùng loại last hay không
-        exists_same = any(
-            isinstance(map_tiles[y][x], int) and map_tiles[y][x] == last
-            for y in range(rows)
-            for x in range(cols)
-        )
+        # Kiểm tra xem map còn object cùng loại last hay không (tra trong chỉ mục vật phẩm,
+        # dựng từ map nếu không được truyền vào)
+        if object_index is None:
+            object_index = ObjectIndex(map_tiles)
+        exists_same = object_index.has(last)
         if exists_same:
             target_vals = [last]
         else:
             # Nếu không còn, nhặt gần nhất bất kỳ
             target_vals = [0, 1, 2, 3, 4]
 
-    return _bfs_nearest_target(map_tiles, start_pos, target_vals)
+    with result.phase("fallback"):
+        path = _bfs_nearest_target(map_tiles, start_pos, target_vals)
+    return result.finish(path, "fallback")
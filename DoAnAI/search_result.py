@@ -0,0 +1,81 @@
+import time
+from contextlib import contextmanager
+
+# --- KẾT QUẢ TÌM KIẾM KÈM THỐNG KÊ ---
+# Trước đây các *_search chỉ trả về list đường đi, front-end chỉ đo được thời gian của cả lần gọi.
+# SearchResult vẫn là list (direction, (x, y)) như cũ (các vòng lặp đi theo path, planner_cache,
+# cắt path[i:] ... không phải đổi gì), kèm thêm số liệu để biết vì sao một planner chậm:
+#   - generated / expanded: số nút đã sinh ra (đưa vào frontier) / đã lấy ra mở rộng
+#   - peak_frontier / peak_visited: kích thước lớn nhất của hàng đợi (stack, heap) / tập đã thăm
+#   - goal: "combo" nếu đường đi dẫn tới combo, "fallback" nếu là đường tới vật phẩm gần nhất
+#   - timings: thời gian của từng pha (tìm combo, fallback...), theo thứ tự chạy
+# Các hàm _*_find_combo nhận tham số stats=None và cộng số liệu của mình vào đó khi được truyền vào.
+
+
+class SearchResult(list):
+    """
+    Đường đi do planner trả về, kèm thống kê tìm kiếm.
+
+    Thuộc tính:
+        generated: số nút đã sinh
+        expanded: số nút đã mở rộng
+        peak_frontier: kích thước lớn nhất của frontier
+        peak_visited: kích thước lớn nhất của tập đã thăm / bảng g
+        goal: "combo", "fallback", "partial" (Simulated Annealing trả về đường tới trạng thái tốt
+              nhất chưa có combo) hoặc None (không có đường đi)
+        timings: dict tên pha -> thời gian (s)
+        notes: các dòng thông tin riêng của planner (cận ARA*, lịch nhiều combo...)
+    """
+
+    def __init__(self, path=(), goal=None):
+        super().__init__(path)
+        self.generated = 0
+        self.expanded = 0
+        self.peak_frontier = 0
+        self.peak_visited = 0
+        self.goal = goal if self else None
+        self.timings = {}
+        self.notes = []
+
+    def record(self, generated=0, expanded=0, frontier=0, visited=0):
+        """
+        Cộng số liệu của một lần tìm kiếm (số nút cộng dồn, kích thước lấy lớn nhất).
+        """
+        self.generated += generated
+        self.expanded += expanded
+        self.peak_frontier = max(self.peak_frontier, frontier)
+        self.peak_visited = max(self.peak_visited, visited)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Đo thời gian một pha: with result.phase("combo"): ...
+        """
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def finish(self, path, goal):
+        """
+        Gán đường đi cuối cùng và loại goal (None nếu path rỗng); trả về chính kết quả.
+        """
+        self[:] = path
+        self.goal = goal if path else None
+        return self
+
+    def stats_lines(self):
+        """
+        Các dòng thống kê để hiện trên panel đường đi, cạnh thời gian suy nghĩ.
+        """
+        lines = [
+            f"Goal: {self.goal or 'none'}",
+            f"Generated: {self.generated}  Expanded: {self.expanded}",
+            f"Peak frontier: {self.peak_frontier}  visited: {self.peak_visited}",
+        ]
+        if self.timings:
+            lines.append("Phases: " + ", ".join(f"{name} {seconds * 1000:.1f} ms"
+                                                for name, seconds in self.timings.items()))
+        lines.extend(self.notes)
+        return lines
@@ -0,0 +1,318 @@
+# --- MÃ HÓA TRẠNG THÁI GỌN CHO CÁC THUẬT TOÁN TÌM COMBO ---
+# Thay vì lưu trạng thái dạng (pos, tuple(bag), frozenset(objects)), mỗi trạng thái
+# được nén vào MỘT số nguyên:
+#   - cell: chỉ số ô trên lưới (y * cols + x)
+#   - bag: túi được nén 3 bit mỗi ô (giá trị + 1, 0 nghĩa là ô trống),
+#          ô 0 là vật phẩm được nhặt sớm nhất (đầu hàng đợi)
+#   - objects: bitmask các vật phẩm còn trên map, mỗi vật phẩm ban đầu
+#          được gán một bit riêng (theo thứ tự quét map)
+#
+#   state = (objects << (CELL_BITS + BAG_BITS)) | (bag << CELL_BITS) | cell
+#
+# Nhờ vậy visited/heap chỉ chứa số nguyên nhỏ, việc nhặt vật phẩm chỉ là một phép xóa bit.
+#
+# NodeStore lưu cây tìm kiếm bằng con trỏ cha trong các mảng phẳng: mỗi nút chỉ tốn
+# (cha, mã hướng, ô, độ sâu), đường đi chỉ được dựng lại một lần khi tới goal.
+#
+# TypeProjection chiếu trạng thái về (ô, túi, vật phẩm thuộc các loại liên quan) để làm khóa
+# visited: khi túi đã có đồ chỉ được nhặt vật phẩm cùng loại bag[0], nên vật phẩm các loại
+# khác đứng yên như tường và các bit của chúng luôn giống trạng thái xuất phát.
+
+from array import array
+
+BAG_SIZE = 7
+SLOT_BITS = 3
+BAG_BITS = SLOT_BITS * BAG_SIZE
+BAG_MASK = (1 << BAG_BITS) - 1
+SLOT_MASK = (1 << SLOT_BITS) - 1
+
+# Thứ tự hướng trùng với DIRECTIONS trong các module search*, mã hướng = chỉ số trong list
+DIRECTION_NAMES = ("Up", "Down", "Left", "Right")
+DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTION_NAMES)}
+DIRECTIONS = [
+    ("Up", (0, -1)),
+    ("Down", (0, 1)),
+    ("Left", (-1, 0)),
+    ("Right", (1, 0)),
+]
+
+
+def pack_bag(bag):
+    """
+    Nén túi (list/tuple các giá trị 0..4) thành một số nguyên 3 bit mỗi ô.
+    """
+    code = 0
+    for i, val in enumerate(bag):
+        code |= (val + 1) << (SLOT_BITS * i)
+    return code
+
+
+def unpack_bag(code):
+    """
+    Giải nén túi về tuple theo đúng thứ tự hàng đợi.
+    """
+    bag = []
+    while code:
+        bag.append((code & SLOT_MASK) - 1)
+        code >>= SLOT_BITS
+    return tuple(bag)
+
+
+def bag_len(code):
+    """
+    Số vật phẩm trong túi đã nén.
+    """
+    return (code.bit_length() + SLOT_BITS - 1) // SLOT_BITS
+
+
+def bag_first(code):
+    """
+    Vật phẩm đầu hàng đợi (nhặt sớm nhất), None nếu túi rỗng.
+    """
+    return (code & SLOT_MASK) - 1 if code else None
+
+
+def bag_last(code):
+    """
+    Vật phẩm vừa được thêm vào gần nhất, None nếu túi rỗng.
+    """
+    if not code:
+        return None
+    return (code >> (SLOT_BITS * (bag_len(code) - 1))) - 1
+
+
+def bag_push(code, val):
+    """
+    Thêm val vào cuối túi; nếu vượt BAG_SIZE thì bỏ vật phẩm đầu hàng đợi.
+    """
+    n = bag_len(code)
+    if n >= BAG_SIZE:
+        code >>= SLOT_BITS
+        n = BAG_SIZE - 1
+    return code | ((val + 1) << (SLOT_BITS * n))
+
+
+class StateCodec:
+    """
+    Bộ mã hóa trạng thái cho một lần tìm kiếm trên một map đã biên dịch (map_handler.compile_map).
+
+    Thuộc tính:
+        cols, rows: kích thước map
+        cell_bits: số bit dành cho chỉ số ô
+        obj_slot: list theo chỉ số ô -> chỉ số bit của vật phẩm (-1 nếu không có)
+        obj_cells: list chỉ số ô của từng vật phẩm theo chỉ số bit
+        obj_vals: list loại vật phẩm theo chỉ số bit
+        obj_pos: list vị trí (x, y) của từng vật phẩm theo chỉ số bit
+        full_mask: bitmask tất cả vật phẩm ban đầu
+    """
+
+    __slots__ = ("cols", "rows", "cell_bits", "cell_mask", "obj_shift",
+                 "obj_slot", "obj_cells", "obj_vals", "obj_pos", "full_mask")
+
+    def __init__(self, cmap):
+        self.rows = cmap.rows
+        self.cols = cmap.cols
+        size = cmap.size
+        self.cell_bits = max(1, (size - 1).bit_length())
+        self.cell_mask = (1 << self.cell_bits) - 1
+        self.obj_shift = self.cell_bits + BAG_BITS
+
+        self.obj_slot = [-1] * size
+        self.obj_cells = []
+        self.obj_vals = []
+        self.obj_pos = []
+        for idx, val in enumerate(cmap.obj_type):
+            if val >= 0:
+                self.obj_slot[idx] = len(self.obj_cells)
+                self.obj_cells.append(idx)
+                self.obj_vals.append(val)
+                self.obj_pos.append((idx % self.cols, idx // self.cols))
+        self.full_mask = (1 << len(self.obj_cells)) - 1
+
+    def cell_of(self, pos):
+        x, y = pos
+        return y * self.cols + x
+
+    def pos_of(self, cell):
+        return (cell % self.cols, cell // self.cols)
+
+    def encode(self, cell, bag_code, objects):
+        return (objects << self.obj_shift) | (bag_code << self.cell_bits) | cell
+
+    def decode(self, state):
+        """
+        Trả về (cell, bag_code, objects) từ trạng thái đã nén.
+        """
+        return (state & self.cell_mask,
+                (state >> self.cell_bits) & BAG_MASK,
+                state >> self.obj_shift)
+
+    def start_state(self, start_pos, bag):
+        return self.encode(self.cell_of(start_pos), pack_bag(bag), self.full_mask)
+
+    def slots_of(self, objects):
+        """
+        Liệt kê chỉ số bit của các vật phẩm còn lại trong bitmask.
+        """
+        result = []
+        while objects:
+            low = objects & -objects
+            result.append(low.bit_length() - 1)
+            objects ^= low
+        return result
+
+    def cells_of(self, objects, obj_type=None):
+        """
+        Liệt kê chỉ số ô các vật phẩm còn lại trong bitmask (lọc theo loại nếu có).
+        """
+        obj_cells = self.obj_cells
+        if obj_type is None:
+            return [obj_cells[slot] for slot in self.slots_of(objects)]
+        obj_vals = self.obj_vals
+        return [obj_cells[slot] for slot in self.slots_of(objects) if obj_vals[slot] == obj_type]
+
+    def positions_of(self, objects, obj_type=None):
+        """
+        Liệt kê vị trí (x, y) các vật phẩm còn lại trong bitmask (lọc theo loại nếu có).
+        """
+        obj_pos = self.obj_pos
+        if obj_type is None:
+            return [obj_pos[slot] for slot in self.slots_of(objects)]
+        obj_vals = self.obj_vals
+        return [obj_pos[slot] for slot in self.slots_of(objects) if obj_vals[slot] == obj_type]
+
+
+class NodeStore:
+    """
+    Lưu các nút của cây tìm kiếm trong mảng phẳng thay cho việc copy list path ở mỗi nút.
+
+    Nút 0 là gốc (vị trí xuất phát). Mỗi nút con ghi lại chỉ số nút cha, mã hướng đi
+    (chỉ số trong DIRECTION_NAMES) và chỉ số ô đích; path(node) dựng lại
+    [(direction, (x, y)), ...] từ gốc tới nút đó.
+    """
+
+    __slots__ = ("cols", "parent", "move", "cell", "depth")
+
+    def __init__(self, cols, root_cell):
+        self.cols = cols
+        self.parent = array("i", [-1])
+        self.move = array("b", [-1])
+        self.cell = array("i", [root_cell])
+        self.depth = array("i", [0])
+
+    def __len__(self):
+        return len(self.parent)
+
+    def add(self, parent, move_code, cell):
+        """
+        Thêm nút con của parent và trả về chỉ số nút mới.
+        """
+        self.parent.append(parent)
+        self.move.append(move_code)
+        self.cell.append(cell)
+        self.depth.append(self.depth[parent] + 1)
+        return len(self.parent) - 1
+
+    def path(self, node):
+        """
+        Dựng lại đường đi từ gốc tới node dưới dạng [(direction, (x, y)), ...].
+        """
+        cols = self.cols
+        parent = self.parent
+        move = self.move
+        cell = self.cell
+        result = []
+        while node > 0:
+            c = cell[node]
+            result.append((DIRECTION_NAMES[move[node]], (c % cols, c // cols)))
+            node = parent[node]
+        result.reverse()
+        return result
+
+
+class TypeProjection:
+    """
+    Lớp trừu tượng trạng thái cho các thuật toán tìm combo khi chỉ một loại vật phẩm còn liên quan.
+
+    Luật nhặt: túi rỗng được nhặt bất kỳ loại nào, túi có đồ chỉ được nhặt loại bag[0]
+    (mọi vật phẩm nhặt thêm đều cùng loại với một phần tử đã có trong túi). Do đó:
+      - túi ban đầu có đồ: chỉ các loại trong túi ban đầu có thể bị nhặt
+      - túi ban đầu rỗng: sau lần nhặt đầu tiên (loại t) túi chỉ chứa t
+    Vật phẩm các loại còn lại không bao giờ bị nhặt, nên bỏ các bit đó khỏi khóa visited
+    không làm mất thông tin (goal vẫn kiểm tra chính xác trên túi), và khi chỉ còn một loại
+    liên quan thì ô chứa vật phẩm loại khác được coi là tường trong bảng ô kề.
+
+    Thuộc tính:
+        fixed_keep: mặt nạ giữ lại của khóa khi túi ban đầu có đồ (None nếu túi ban đầu rỗng)
+        type_keep: mặt nạ giữ lại theo loại bag[0] (dùng khi túi ban đầu rỗng)
+        single_type: loại liên quan duy nhất khi túi ban đầu chỉ có một loại (None nếu không)
+    """
+
+    __slots__ = ("cmap", "codec", "fixed_keep", "type_keep", "single_type", "_neighbors")
+
+    def __init__(self, cmap, codec, start_bag):
+        self.cmap = cmap
+        self.codec = codec
+        low_mask = (1 << codec.obj_shift) - 1
+        type_bits = {}
+        for slot, val in enumerate(codec.obj_vals):
+            type_bits[val] = type_bits.get(val, 0) | (1 << slot)
+        self.type_keep = {t: low_mask | (bits << codec.obj_shift) for t, bits in type_bits.items()}
+
+        start_types = set(start_bag)
+        if start_types:
+            kept = 0
+            for t in start_types:
+                kept |= type_bits.get(t, 0)
+            self.fixed_keep = low_mask | (kept << codec.obj_shift)
+        else:
+            self.fixed_keep = None
+        self.single_type = next(iter(start_types)) if len(start_types) == 1 else None
+        self._neighbors = {}
+
+    def keep(self, bag_code):
+        """
+        Mặt nạ cho khóa visited của các trạng thái có túi bag_code: khóa = state & keep(bag_code),
+        tức là bỏ các bit vật phẩm thuộc loại không còn liên quan (-1 nghĩa là giữ nguyên).
+        """
+        if self.fixed_keep is not None:
+            return self.fixed_keep
+        if not bag_code:
+            return -1
+        # Túi ban đầu rỗng: mọi vật phẩm trong túi cùng loại bag[0]
+        return self.type_keep[(bag_code & SLOT_MASK) - 1]
+
+    def key(self, state, bag_code):
+        """
+        Khóa visited của state (bag_code là túi của chính state đó).
+        """
+        return state & self.keep(bag_code)
+
+    def neighbors(self, bag_code):
+        """
+        Bảng ô kề cho bước mở rộng tiếp theo. Khi loại liên quan duy nhất đã xác định
+        (túi có đồ và chỉ gồm một loại từ đầu), ô chứa vật phẩm loại khác bị loại khỏi bảng
+        vì chúng không bao giờ bị nhặt; ngược lại trả về bảng ô kề đầy đủ của map.
+        """
+        if not bag_code:
+            return self.cmap.neighbors
+        if self.fixed_keep is not None:
+            target = self.single_type
+            if target is None:
+                return self.cmap.neighbors
+        else:
+            target = (bag_code & SLOT_MASK) - 1
+        table = self._neighbors.get(target)
+        if table is None:
+            # Chỉ sửa lại các ô kề với vật phẩm loại khác, phần còn lại dùng chung bảng của map
+            neighbors = self.cmap.neighbors
+            obj_type = self.cmap.obj_type
+            table = list(neighbors)
+            for cell, val in zip(self.codec.obj_cells, self.codec.obj_vals):
+                if val == target:
+                    continue
+                for _, ncell in neighbors[cell]:
+                    table[ncell] = tuple((code, c) for code, c in table[ncell]
+                                         if obj_type[c] < 0 or obj_type[c] == target)
+            self._neighbors[target] = table
+        return table
@@ -0,0 +1,32 @@
+import argparse
+
+# --- SEED CHO VÁN CHƠI TÁI LẬP ĐƯỢC ---
+# Mọi lựa chọn ngẫu nhiên của game (đặt vật phẩm, Simulated Annealing, bước đi ngẫu nhiên của
+# AND-OR, Q-learning) lấy từ một random.Random do front-end tạo và truyền xuống, thay vì module
+# random dùng chung. Các chương trình (main.py, menu.py, playAI5.py, battleAI.py, các bản cũ
+# playAI.py .. playAI4.py, searchQLearning.py, benchmark.py) nhận tùy chọn --seed N: cùng seed
+# thì cùng cách đặt bánh và cùng hành vi planner, nên có thể so sánh hai phiên bản của một
+# planner trên các ván giống hệt.
+# Không có --seed thì random.Random(None) lấy seed từ hệ điều hành như trước.
+
+
+def parse_seed(argv=None):
+    """
+    Đọc tùy chọn --seed từ dòng lệnh (bỏ qua các tham số khác).
+
+    Tham số:
+        argv: list tham số (mặc định sys.argv[1:])
+
+    Trả về:
+        seed (int) hoặc None nếu không có
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_known_args(argv)[0].seed
+
+
+def seed_args(seed):
+    """
+    Tham số dòng lệnh để chuyển seed sang chương trình con (menu.py mở main.py, playAI5.py, battleAI.py).
+    """
+    return [] if seed is None else ["--seed", str(seed)]
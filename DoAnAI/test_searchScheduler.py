@@ -0,0 +1,44 @@
+import os
+import random
+import time
+
+from map_handler import load_map_from_file, place_random_objects, ObjectIndex, start_position
+from searchScheduler import GameScheduler
+
+# Kiểm tra thời gian lập lịch của GameScheduler trên map đông vật phẩm (battleAI thả thêm bánh
+# khi còn dưới 20 món rồi lập lịch lại cho mọi AI, nên mỗi lần gọi phải xong nhanh)
+
+MAP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "map_design.txt")
+TIME_LIMIT = 5.0   # giây, rộng rãi cho máy chậm; ngân sách mặc định là TIME_BUDGET_MS
+
+
+def _crowded_game(drops, seed):
+    map_tiles = load_map_from_file(MAP_FILE)
+    object_index = ObjectIndex(map_tiles)
+    rng = random.Random(seed)
+    for _ in range(drops):
+        place_random_objects(map_tiles, object_index=object_index, rng=rng)
+    return map_tiles, object_index
+
+
+def test_schedule_many_objects_is_bounded():
+    for drops in (2, 4):
+        map_tiles, object_index = _crowded_game(drops, seed=3)
+        assert object_index.count() >= 40
+        scheduler = GameScheduler()
+        start = time.perf_counter()
+        path = scheduler.plan(map_tiles, start_position(map_tiles), [], object_index)
+        elapsed = time.perf_counter() - start
+        assert elapsed < TIME_LIMIT, f"{object_index.count()} vật phẩm: {elapsed:.2f} giây"
+        assert path and path.goal == "combo"
+        assert scheduler.combos > 0
+
+
+def test_schedule_is_walkable():
+    map_tiles, object_index = _crowded_game(2, seed=7)
+    x, y = start_position(map_tiles)
+    path = GameScheduler().plan(map_tiles, (x, y), [], object_index)
+    for _, (nx, ny) in path:
+        assert abs(nx - x) + abs(ny - y) == 1
+        assert map_tiles[ny][nx] == " " or isinstance(map_tiles[ny][nx], int)
+        x, y = nx, ny